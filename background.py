@@ -0,0 +1,143 @@
+"""
+Runs slow service calls off the Tk main loop.
+
+    runner = BackgroundRunner(root, on_busy=show_progress)
+    runner.submit("requests", lambda: RequestService.get_requests_page(...), show_page,
+                  label="Загрузка заявок...")
+
+Work runs on a daemon thread; its result (or exception) is passed to the
+callbacks on the Tk thread, which polls a queue with after(). Submitting
+under a key replaces the task still running under that key: the old task
+is cancelled (its SQL statements are interrupted) and its result dropped.
+on_busy(labels) is called on the Tk thread whenever the set of running
+tasks changes, with the labels of the labelled ones (empty when idle).
+The runner closes itself when its widget is destroyed.
+"""
+import queue
+import sqlite3
+import threading
+
+import database
+
+POLL_MS = 30  # How often the Tk thread checks for finished tasks
+
+class BackgroundTask:
+    def __init__(self, key, work, on_done, on_error, label=None, interruptible=True):
+        self.key = key
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.label = label
+        self.interruptible = interruptible
+        self.cancelled = threading.Event()
+        self.thread = None
+
+class BackgroundRunner:
+    def __init__(self, widget, poll_ms=POLL_MS, on_busy=None):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy
+        self._results = queue.Queue()
+        self._current = {}  # key -> latest BackgroundTask
+        self._poll_job = None
+        self._closed = False
+        widget.bind("<Destroy>", self._on_destroy, add="+")
+
+    def submit(self, key, work, on_done, on_error=None, label=None, interruptible=True):
+        """
+        Runs work() on a worker thread, then on_done(result) or on_error(exc)
+        on the Tk thread. label is shown by the progress indicator while the
+        task runs. Writes pass interruptible=False: cancelling such a task
+        only drops its result, the work itself runs to the end.
+        """
+        if self._closed:
+            return None
+        self._drop(key)
+        task = BackgroundTask(key, work, on_done, on_error, label, interruptible)
+        self._current[key] = task
+        task.thread = threading.Thread(target=self._run, args=(task,), name=f"background-{key}", daemon=True)
+        task.thread.start()
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
+        self._busy_changed()
+        return task
+
+    def cancel(self, key):
+        if self._drop(key):
+            self._busy_changed()
+
+    def cancel_all(self):
+        for key in list(self._current):
+            self._drop(key)
+        self._busy_changed()
+
+    def close(self):
+        """Cancels every task and stops polling; called when the widget is destroyed."""
+        self._closed = True
+        for key in list(self._current):
+            self._drop(key)
+        if self._poll_job is not None:
+            self.widget.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def busy(self, key=None):
+        return key in self._current if key is not None else bool(self._current)
+
+    def labels(self):
+        return [task.label for task in self._current.values() if task.label]
+
+    def _drop(self, key):
+        task = self._current.pop(key, None)
+        if task:
+            task.cancelled.set()
+        return task
+
+    def _busy_changed(self):
+        if self.on_busy and not self._closed:
+            self.on_busy(self.labels())
+
+    def _on_destroy(self, event):
+        # A toplevel's <Destroy> binding also fires for each of its children
+        if event.widget is self.widget:
+            self.close()
+
+    def _run(self, task):
+        try:
+            if task.interruptible:
+                with database.cancellable(task.cancelled):
+                    result = task.work()
+            else:
+                result = task.work()
+        except sqlite3.OperationalError as e:
+            if not task.cancelled.is_set():
+                self._results.put((task, None, e))
+        except Exception as e:
+            self._results.put((task, None, e))
+        else:
+            self._results.put((task, result, None))
+
+    def _poll(self):
+        self._poll_job = None
+        finished = []
+        while True:
+            try:
+                task, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self._current.get(task.key) is not task:
+                continue  # Replaced or cancelled while running
+            del self._current[task.key]
+            finished.append((task, result, error))
+        if finished:
+            self._busy_changed()
+        for task, result, error in finished:
+            if self._closed:
+                break  # An earlier callback closed the window
+            if error is None:
+                task.on_done(result)
+            elif task.on_error:
+                task.on_error(error)
+            else:
+                raise error
+        if self._current and not self._closed and self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
@@ -0,0 +1,711 @@
+"""
+Benchmarks for the hot service paths.
+
+Each bench_* function seeds a throwaway database at several sizes and reports
+the number of SQL statements and the wall time per call, so regressions such as
+N+1 queries show up as a count that grows with the table size.
+
+Run: python benchmark.py
+"""
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import database
+import services
+from database import ConnectionManager, init_db
+
+SPECIALIST_ID = 3  # seeded 'specialist' user
+
+
+def seed_requests(db_name, count):
+    """Creates a fresh database with `count` requests, each with one client,
+    one piece of equipment and one assigned specialist. Completed requests
+    get a completion date up to 300 hours after creation."""
+    init_db(db_name)
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    start = datetime(2024, 1, 1)
+    cursor.executemany(
+        "INSERT INTO clients (id, full_name, phone) VALUES (?, ?, ?)",
+        ((i, f"Client {i}", f"+7900{i:07d}") for i in range(1, count + 1))
+    )
+    cursor.executemany(
+        "INSERT INTO equipment (id, serial_number, model, type, client_id) VALUES (?, ?, ?, ?, ?)",
+        ((i, f"SN-{i:08d}", f"Model {i % 50}", f"Type {i % 7}", i) for i in range(1, count + 1))
+    )
+    cursor.executemany(
+        """
+        INSERT INTO requests (id, request_number, creation_date, problem_description, client_id, equipment_id, status_id, deadline_date, help_needed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        ((i, f"REQ-B-{i:08d}", (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+          f"Problem {i % 20}", i, i, 1 + i % 6,
+          (start + timedelta(minutes=i, days=7)).strftime("%Y-%m-%d %H:%M:%S"), 1 if i % 97 == 0 else 0)
+         for i in range(1, count + 1))
+    )
+    cursor.executemany(
+        "INSERT INTO request_specialists (request_id, specialist_id) VALUES (?, ?)",
+        ((i, SPECIALIST_ID) for i in range(1, count + 1))
+    )
+    cursor.executemany(
+        "UPDATE requests SET completion_date = ? WHERE id = ?",
+        (((start + timedelta(minutes=i, hours=1 + i % 300)).strftime("%Y-%m-%d %H:%M:%S"), i)
+         for i in range(1, count + 1) if 1 + i % 6 == 5)
+    )
+    cursor.executemany(
+        """
+        INSERT INTO request_status_history (request_id, status_id, changed_at, previous_status_id, previous_changed_at, previous_hours)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (row for i in range(1, count + 1) for row in status_walk(i, start))
+    )
+    for statement in database.STATISTICS_REBUILD:
+        cursor.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def status_walk(i, start):
+    """History rows for seeded request i: New -> Registered -> In Progress ->
+    its final status, 10 minutes, 30 minutes and 2 hours (or its completion
+    date) after creation."""
+    final = 1 + i % 6
+    created = start + timedelta(minutes=i)
+    steps = [(1, created)]
+    if final >= 2:
+        steps.append((2, created + timedelta(minutes=10)))
+    if final >= 3:
+        steps.append((3, created + timedelta(minutes=30)))
+    if final == 5:
+        steps.append((5, created + timedelta(hours=1 + i % 300)))
+    elif final > 3:
+        steps.append((final, created + timedelta(hours=2)))
+    previous = None
+    for status_id, at in steps:
+        if previous:
+            yield (i, status_id, at.strftime("%Y-%m-%d %H:%M:%S"), previous[0],
+                   previous[1].strftime("%Y-%m-%d %H:%M:%S"), (at - previous[1]).total_seconds() / 3600)
+        else:
+            yield (i, status_id, at.strftime("%Y-%m-%d %H:%M:%S"), None, None, None)
+        previous = (status_id, at)
+
+
+@contextmanager
+def count_queries():
+    """Counts (and records) SQL statements run on pooled service connections."""
+    counter = {"queries": 0, "statements": []}
+    manager = database.connection_manager
+
+    def trace(statement):
+        counter["queries"] += 1
+        counter["statements"].append(statement)
+
+    def traced_acquire(*args, **kwargs):
+        conn = ConnectionManager.acquire(manager, *args, **kwargs)
+        conn.set_trace_callback(trace)
+        return conn
+
+    manager.acquire = traced_acquire
+    try:
+        yield counter
+    finally:
+        del manager.acquire
+        # Drop the traced connections so later calls are not counted
+        database.close_all()
+
+
+@contextmanager
+def seeded_database(count):
+    """Points database.DB_NAME at a temporary database seeded with `count` requests."""
+    tmp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(tmp_dir, "bench.db")
+    previous = database.DB_NAME
+    seed_requests(db_name, count)
+    database.DB_NAME = db_name
+    try:
+        yield db_name
+    finally:
+        database.DB_NAME = previous
+        database.close_all(db_name)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_name + suffix):
+                os.remove(db_name + suffix)
+        os.rmdir(tmp_dir)
+
+
+def measure(func):
+    """Runs func once and returns (result, statement count, seconds)."""
+    with count_queries() as counter:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    return result, counter["queries"], elapsed
+
+
+def bench_get_requests(sizes=(1000, 10000, 50000)):
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            rows, queries, elapsed = measure(
+                lambda: services.RequestService.get_requests("Administrator", 1)
+            )
+        results.append({"size": size, "rows": len(rows), "queries": queries, "seconds": elapsed})
+    return results
+
+
+def bench_get_requests_page(sizes=(1000, 10000, 50000), page_size=50):
+    """Times the first page and a page deep in the listing."""
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            service = services.RequestService
+            first, queries, first_elapsed = measure(
+                lambda: service.get_requests_page("Administrator", 1, page_size=page_size)
+            )
+            # Jump close to the end through a cursor on an existing row
+            deep_row = service.get_requests_page("Administrator", 1, page_size=size - page_size).items[-1]
+            deep_token = services._encode_page_token("next", deep_row)
+            deep, _, deep_elapsed = measure(
+                lambda: service.get_requests_page("Administrator", 1, page_token=deep_token, page_size=page_size)
+            )
+        results.append({"size": size, "rows": len(first.items) + len(deep.items), "queries": queries,
+                        "first_page_seconds": first_elapsed, "deep_page_seconds": deep_elapsed})
+    return results
+
+
+def bench_get_request(sizes=(1000, 10000, 50000)):
+    """Times opening the detail view of the newest request."""
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            req, queries, elapsed = measure(lambda: services.RequestService.get_request(size))
+        results.append({"size": size, "found": req is not None, "queries": queries, "seconds": elapsed})
+    return results
+
+
+def stress_worker(db_name, worker_id, operations, busy_timeout_ms, seeded):
+    """One operator workstation: creates requests, moves statuses, adds comments."""
+    database.DB_NAME = db_name
+    database.BUSY_TIMEOUT_MS = busy_timeout_ms
+    service = services.RequestService
+    created = []
+    updates = 0
+    comments = 0
+    for i in range(operations):
+        req_number = service.create_request(
+            (f"Stress {worker_id}", f"+7800{worker_id:03d}{i:05d}"),
+            (f"SN-S-{worker_id}-{i}", "Stress Model", "Stress Type"),
+            f"Stress {worker_id}/{i}"
+        )
+        if req_number:
+            created.append(req_number)
+        if service.update_status(1 + (worker_id * operations + i) % seeded, services.STATUS_IN_PROGRESS):
+            updates += 1
+        service.add_comment(1 + i % seeded, 1, f"stress {worker_id}/{i}")
+        comments += 1
+    database.close_all()
+    return {"created": created, "updates": updates, "comments": comments}
+
+
+def run_stress(processes=4, operations=50, busy_timeout_ms=50, seeded=100):
+    """
+    Runs `processes` concurrent writers against one database and checks what
+    reached the file. `lost` counts acknowledged writes that are missing.
+    """
+    with seeded_database(seeded) as db_name:
+        started = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            results = pool.starmap(stress_worker, [
+                (db_name, worker_id, operations, busy_timeout_ms, seeded) for worker_id in range(processes)
+            ])
+        elapsed = time.perf_counter() - started
+        
+        created = [number for result in results for number in result["created"]]
+        conn = sqlite3.connect(db_name)
+        stored = {row[0] for row in conn.execute("SELECT request_number FROM requests WHERE request_number NOT LIKE 'REQ-B-%'")}
+        comment_count = conn.execute("SELECT count(*) FROM comments").fetchone()[0]
+        conn.close()
+    return {
+        "processes": processes,
+        "attempted": processes * operations,
+        "created": len(created),
+        "updates": sum(result["updates"] for result in results),
+        "comments": comment_count,
+        "lost": len(set(created) - stored) + (sum(result["comments"] for result in results) - comment_count),
+        "seconds": elapsed,
+    }
+
+
+def bench_concurrent_writers(process_counts=(2, 4, 8), operations=100):
+    return [run_stress(processes, operations) for processes in process_counts]
+
+
+def bench_statistics(sizes=(1000, 10000, 50000)):
+    """Times calculate_statistics against the materialized tables and a full rebuild."""
+    from stats_module import calculate_statistics, rebuild_statistics
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            stats, queries, elapsed = measure(calculate_statistics)
+            started = time.perf_counter()
+            rebuild_statistics()
+            rebuild_elapsed = time.perf_counter() - started
+        results.append({"size": size, "completed": stats["completed_count"], "queries": queries,
+                        "seconds": elapsed, "rebuild_seconds": rebuild_elapsed})
+    return results
+
+
+def bench_aggregate_statistics(sizes=(10000, 50000, 200000)):
+    """Times aggregate_statistics grouped by equipment type and by month."""
+    from stats_module import aggregate_statistics
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            groups, queries, elapsed = measure(lambda: aggregate_statistics(group_by=("equipment_type", "month")))
+            _, _, ranged = measure(lambda: aggregate_statistics(date_from="2024-01-10", date_to="2024-01-20"))
+        results.append({"size": size, "groups": len(groups), "queries": queries,
+                        "grouped_seconds": elapsed, "range_seconds": ranged})
+    return results
+
+
+def bench_duration_distribution(sizes=(100000, 1000000)):
+    """Times the percentile/histogram pass over synthetic duration columns."""
+    import random
+    from stats_module import HAS_NUMPY, duration_distribution
+    rng = random.Random(42)
+    results = []
+    for size in sizes:
+        hours = [rng.expovariate(1 / 40.0) for _ in range(size)]
+        if HAS_NUMPY:
+            import numpy as np
+            hours = np.array(hours)
+        started = time.perf_counter()
+        report = duration_distribution(hours)
+        elapsed = time.perf_counter() - started
+        results.append({"size": size, "numpy": HAS_NUMPY, "p90_hours": report["percentiles"][90], "seconds": elapsed})
+    return results
+
+
+def bench_duration_report(sizes=(10000, 50000)):
+    """Times duration_report end to end (load + per-type distributions)."""
+    from stats_module import duration_report
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            report, queries, elapsed = measure(duration_report)
+        results.append({"size": size, "completed": report["overall"]["count"], "queries": queries, "seconds": elapsed})
+    return results
+
+
+def bench_time_in_status(sizes=(10000, 100000, 300000)):
+    """Times time_in_status per status, per specialist and for a one-week period;
+    the seeded walk gives about 3 history rows per request."""
+    from stats_module import time_in_status
+    results = []
+    for size in sizes:
+        with seeded_database(size) as db_name:
+            conn = sqlite3.connect(db_name)
+            history_rows = conn.execute("SELECT count(*) FROM request_status_history").fetchone()[0]
+            conn.close()
+            _, queries, by_status = measure(lambda: time_in_status(now="2025-01-01 00:00:00"))
+            _, _, by_specialist = measure(lambda: time_in_status(("specialist", "status"), include_open=False))
+            _, _, week = measure(lambda: time_in_status(("status", "day"), date_from="2024-01-03", date_to="2024-01-10",
+                                                        include_open=False))
+            _, _, one_request = measure(lambda: time_in_status(request_id=size // 2))
+        results.append({"size": size, "history_rows": history_rows, "queries": queries,
+                        "by_status_seconds": by_status, "by_specialist_seconds": by_specialist,
+                        "week_seconds": week, "request_seconds": one_request})
+    return results
+
+
+def bench_overdue_sweep(sizes=(10000, 100000, 300000)):
+    """Times the first sweep (clearing a backlog) and an incremental sweep one
+    hour later, which should cost the same at every size."""
+    first = datetime(2024, 1, 8, 12)
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            backlog, _, backlog_elapsed = measure(lambda: services.RequestService.mark_overdue(first))
+            newly, queries, elapsed = measure(lambda: services.RequestService.mark_overdue(first + timedelta(hours=1)))
+        results.append({"size": size, "backlog": len(backlog), "backlog_seconds": backlog_elapsed,
+                        "newly_overdue": len(newly), "queries": queries, "seconds": elapsed})
+    return results
+
+
+def allocation_worker(db_name, count):
+    database.DB_NAME = db_name
+    numbers = [database.run_in_transaction(lambda conn: services.allocate_request_numbers(conn))[0]
+               for _ in range(count)]
+    database.close_all()
+    return numbers
+
+
+def bench_request_numbers(process_counts=(1, 4), per_process=1000):
+    """Request numbers per second, one write transaction per number, from
+    several processes at once; `duplicates` must stay 0."""
+    results = []
+    for processes in process_counts:
+        with seeded_database(10) as db_name:
+            started = time.perf_counter()
+            with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                numbers = [n for chunk in pool.starmap(allocation_worker, [(db_name, per_process)] * processes)
+                           for n in chunk]
+            elapsed = time.perf_counter() - started
+        results.append({"processes": processes, "numbers": len(numbers), "duplicates": len(numbers) - len(set(numbers)),
+                        "per_second": len(numbers) / elapsed})
+    return results
+
+
+def bulk_rows(count, existing):
+    """Request rows where every other client phone is already in the database."""
+    return [((f"Bulk {i}", f"+7900{1 + i % existing:07d}" if i % 2 else f"+7811{i:07d}"),
+             (f"SN-BULK-{i}", "Bulk Model", "Bulk Type"), f"Bulk problem {i % 20}")
+            for i in range(count)]
+
+
+def bench_create_requests_bulk(sizes=(100, 1000, 5000), existing=10000):
+    """create_request in a loop against one create_requests_bulk call."""
+    results = []
+    for size in sizes:
+        rows = bulk_rows(size, existing)
+        with seeded_database(existing):
+            started = time.perf_counter()
+            for client_data, equipment_data, problem in rows:
+                services.RequestService.create_request(client_data, equipment_data, problem)
+            loop_elapsed = time.perf_counter() - started
+        with seeded_database(existing):
+            started = time.perf_counter()
+            report = services.RequestService.create_requests_bulk(rows)
+            bulk_elapsed = time.perf_counter() - started
+        results.append({"size": size, "created": sum(1 for r in report if r.request_number),
+                        "loop_seconds": loop_elapsed, "bulk_seconds": bulk_elapsed,
+                        "speedup": loop_elapsed / bulk_elapsed})
+    return results
+
+
+def write_xlsx(path, header, lines):
+    """Writes ';'-separated lines as a minimal one-sheet workbook, streaming the
+    sheet XML into the zip; digit-only values become number cells."""
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    def cell(value):
+        if value.isdigit() and not value.startswith("0"):
+            return f"<c><v>{value}</v></c>"
+        return f'<c t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    relationships = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as book:
+        book.writestr("xl/workbook.xml", f'<workbook xmlns="{main}" xmlns:r="{relationships}">'
+                                         '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        book.writestr("xl/_rels/workbook.xml.rels",
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                      f'<Relationship Id="rId1" Type="{relationships}/worksheet" Target="worksheets/sheet1.xml"/>'
+                      '</Relationships>')
+        with book.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(f'<worksheet xmlns="{main}"><sheetData>'.encode())
+            for line in [header, *lines]:
+                sheet.write(("<row>" + "".join(cell(v) for v in line.split(";")) + "</row>").encode())
+            sheet.write(b"</sheetData></worksheet>")
+
+
+def write_dataset(base_dir, requests, users=None, source_format="csv"):
+    """Writes a synthetic import_БытСервис-style dataset: `users` employees and
+    clients (every third one a client), `requests` requests and one comment each."""
+    users = users or max(10, requests // 10)
+    masters = [i for i in range(1, users + 1) if i % 3]
+    clients = [i for i in range(1, users + 1) if i % 3 == 0]
+    files = {
+        ("Пользователи", "inputDataUsers.csv"): (
+            "userID;fio;phone;login;password;type",
+            (f"{i};User {i};+7800{i:07d};user{i};pass{i};{'Заказчик' if i % 3 == 0 else 'Мастер'}"
+             for i in range(1, users + 1))),
+        ("Заявки", "inputDataRequests.csv"): (
+            "requestID;startDate;homeTechType;homeTechModel;problemDescryption;requestStatus;completionDate;"
+            "repairParts;masterID;clientID",
+            (f"{i};2023-{1 + i % 12:02d}-{1 + i % 28:02d};Type {i % 7};Model {i % 50};Problem {i % 20};"
+             f"{'Готова к выдаче' if i % 4 == 0 else 'В процессе ремонта'};"
+             f"{f'2023-{1 + i % 12:02d}-{1 + i % 28:02d}' if i % 4 == 0 else 'null'};;"
+             f"{masters[i % len(masters)]};{clients[i % len(clients)]}"
+             for i in range(1, requests + 1))),
+        ("Комментарии", "inputDataComments.csv"): (
+            "commentID;message;masterID;requestID",
+            (f"{i};Comment {i};{masters[i % len(masters)]};{i}" for i in range(1, requests + 1))),
+    }
+    for (folder, name), (header, lines) in files.items():
+        os.makedirs(os.path.join(base_dir, folder), exist_ok=True)
+        path = os.path.join(base_dir, folder, name.replace(".csv", f".{source_format}"))
+        if source_format == "xlsx":
+            write_xlsx(path, header, lines)
+            continue
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(header + "\n")
+            for line in lines:
+                f.write(line + "\n")
+
+
+def bench_import(sizes=(10000, 100000)):
+    """Imports a synthetic dataset of each size with import_engine."""
+    import import_engine
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            base_dir = os.path.join(tmp_dir, "dataset")
+            write_dataset(base_dir, size)
+            db_name = os.path.join(tmp_dir, "import.db")
+            init_db(db_name)
+            started = time.perf_counter()
+            report = import_engine.ImportEngine(db_name).run(base_dir)
+            elapsed = time.perf_counter() - started
+            database.close_all(db_name)
+        results.append({"requests": report["requests"], "comments": report["comments"],
+                        "seconds": elapsed, "rows_per_second": (report["requests"] + report["comments"]) / elapsed})
+    return results
+
+
+def bench_dry_run(sizes=(100000, 500000)):
+    """Validates a synthetic dataset (users, requests and comments) without a database."""
+    import import_engine
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_dataset(tmp_dir, size)
+            started = time.perf_counter()
+            report = import_engine.dry_run(tmp_dir)
+            elapsed = time.perf_counter() - started
+        rows = report["users"] + report["clients"] + report["requests"] + report["comments"]
+        results.append({"requests": report["requests"], "rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed})
+    return results
+
+
+def bench_parse_workers(size=200000, worker_counts=(1, 2, 4)):
+    """Read + parse/validate throughput of the import pipeline (no database
+    writes) with the parse stage on 1..N processes; scales with free cores."""
+    import import_engine
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_dataset(tmp_dir, size)
+        path = import_engine.dataset_path(tmp_dir, "requests")
+        for workers in worker_counts:
+            engine = import_engine.ImportEngine(os.path.join(tmp_dir, "unused.db"), workers=workers)
+            started = time.perf_counter()
+            rows = sum(len(batch) for batch, _ in engine.parse_batches("requests", import_engine.open_source(path)))
+            elapsed = time.perf_counter() - started
+            results.append({"workers": workers, "cpus": os.cpu_count(), "rows": rows, "seconds": elapsed,
+                            "rows_per_second": rows / elapsed})
+    return results
+
+
+def bench_read_sources(size=100000):
+    """Reads the same synthetic requests file as csv, txt and xlsx; peak_mb is
+    the largest traced allocation during the pass and must not grow with size."""
+    import tracemalloc
+    import import_engine
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for source_format in import_engine.SOURCE_FORMATS:
+            base_dir = os.path.join(tmp_dir, source_format)
+            write_dataset(base_dir, size, source_format=source_format)
+            path = import_engine.dataset_path(base_dir, "requests", source_format)
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = sum(1 for _ in import_engine.read_rows(path))
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({"format": source_format, "rows": rows, "file_mb": os.path.getsize(path) / 2 ** 20,
+                            "seconds": elapsed, "rows_per_second": rows / elapsed, "peak_mb": peak / 2 ** 20})
+    return results
+
+
+def bench_search(sizes=(100000, 1000000), page_size=50):
+    """Times RequestService.search_requests for a selective query (one client),
+    a medium one (one model, 2% of requests) and a broad one that matches
+    every request, as an administrator and as the assigned specialist."""
+    queries = {"selective": "Client 4242", "medium": "Model 17", "broad": "Problem"}
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            service = services.RequestService
+            for label, query in queries.items():
+                # The statement count is left out: FTS5 reads its shadow tables once per hit
+                rows, _, elapsed = measure(lambda: service.search_requests(query, limit=page_size))
+                _, _, specialist_elapsed = measure(
+                    lambda: service.search_requests(query, "Specialist", SPECIALIST_ID, limit=page_size)
+                )
+                results.append({"size": size, "query": label, "rows": len(rows),
+                                "seconds": elapsed, "specialist_seconds": specialist_elapsed})
+    return results
+
+
+def bench_prefix_search(sizes=(10000, 100000), page_size=50):
+    """Times the dashboard's first page filtered by a request number, phone or
+    serial prefix, from one exact match up to a prefix every request shares,
+    and by words found through the full-text index."""
+    prefixes = {"number": "REQ-B-0000777", "phone": "+790000007", "serial": "SN-0000",
+                "every_request": "REQ-", "text": "Client 777"}
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            for label, prefix in prefixes.items():
+                page, queries, elapsed = measure(
+                    lambda: services.RequestService.get_requests_page("Administrator", 1, page_size=page_size, search=prefix)
+                )
+                results.append({"size": size, "prefix": label, "rows": len(page.items),
+                                "queries": queries, "seconds": elapsed})
+    return results
+
+
+def bench_change_feed(sizes=(100000, 1000000), edits=100):
+    """Times a dashboard poll of RequestService.get_changes with nothing new,
+    after one edit and after `edits` edits from another workstation."""
+    results = []
+    for size in sizes:
+        with seeded_database(size):
+            service = services.RequestService
+            token = service.get_sync_token()
+            _, idle_queries, idle = measure(lambda: service.get_changes(token, "Administrator", 1))
+            service.toggle_help_needed(size // 2, True)
+            one, _, one_elapsed = measure(lambda: service.get_changes(token, "Administrator", 1))
+            for request_id in range(1, edits + 1):
+                service.update_status(request_id, 3)
+            many, queries, many_elapsed = measure(lambda: service.get_changes(one.sync_token, "Administrator", 1))
+        results.append({"size": size, "idle_queries": idle_queries, "idle_seconds": idle,
+                        "one_change_seconds": one_elapsed, "changes": len(many.items) + len(many.removed_ids),
+                        "queries": queries, "seconds": many_elapsed})
+    return results
+
+
+def synthetic_requests(count):
+    """Request objects as the dashboard listing returns them, without a database."""
+    from models import Request
+    statuses = ("New", "Registered", "In Progress", "Waiting for Parts", "Completed", "Overdue")
+    return [Request(id=i, request_number=f"REQ-B-{i:08d}", creation_date="2024-01-01 10:00:00",
+                    problem_description=f"Problem {i % 20}", client_id=i, equipment_id=i, status_id=1 + i % 6,
+                    status_name=statuses[i % 6], client_name=f"Client {i}", client_phone=f"+7900{i:07d}",
+                    equipment_model=f"Model {i % 50}", help_needed=i % 97 == 0,
+                    assigned_specialists=["Specialist"] if i % 3 else [])
+            for i in range(1, count + 1)]
+
+
+def bench_render(sizes=(10000, 100000), scroll_steps=200):
+    """Times MainApp's request list (VirtualList of RequestCards): showing the
+    rows, then a sweep from top to bottom in scroll_steps jumps. widgets is the
+    number of card widgets alive afterwards. Needs a display."""
+    import tkinter as tk
+    from types import SimpleNamespace
+    import interface
+    from models import User
+    from virtual_list import VirtualList
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return [{"size": size, "skipped": "no display"} for size in sizes]
+    results = []
+    try:
+        root.geometry("900x800")
+        interface.setup_styles()
+        app = SimpleNamespace(user=User(id=1, username="admin", full_name="Admin", role_id=1, role_name="Administrator"),
+                              open_details=lambda req_id: None)
+        for size in sizes:
+            items = synthetic_requests(size)
+            rows = VirtualList(root, create_row=lambda master: interface.RequestCard(master, app),
+                               bind_row=lambda card, req: card.show(req),
+                               row_height=interface.CARD_HEIGHT, gap=interface.CARD_GAP)
+            rows.pack(fill=tk.BOTH, expand=True)
+            started = time.perf_counter()
+            rows.set_items(items)
+            root.update()
+            shown = time.perf_counter() - started
+            started = time.perf_counter()
+            for step in range(1, scroll_steps + 1):
+                rows.canvas.yview_moveto(step / scroll_steps)
+                root.update()
+            scrolled = time.perf_counter() - started
+            results.append({"size": size, "widgets": rows.widget_count(), "show_seconds": shown,
+                            "frame_seconds": scrolled / scroll_steps})
+            rows.destroy()
+    finally:
+        root.destroy()
+    return results
+
+
+def bench_qr(sizes=(1000, 5000), workers=(1, 4)):
+    """Times QR matrices for `size` request numbers encoded, read back from the
+    disk cache and from the memory cache, then the sheet export from a warm
+    disk cache with each worker count. Needs qrcode (and Pillow for sheets)."""
+    import shutil
+    import tempfile
+    import qr_codes
+    if not qr_codes.HAS_QRCODE:
+        return [{"size": size, "skipped": "qrcode is not installed"} for size in sizes]
+    results = []
+    for size in sizes:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            numbers = [f"REQ-B-{i:08d}" for i in range(1, size + 1)]
+            cache_dir = os.path.join(tmp_dir, "cache")
+            cache = qr_codes.QRCache(cache_dir, size=size)
+            row = {"size": size}
+            for name, prepare in (("encode", None), ("disk", cache.clear), ("memory", None)):
+                if prepare:
+                    prepare()
+                started = time.perf_counter()
+                for number in numbers:
+                    cache.matrix(number)
+                row[f"{name}_seconds"] = time.perf_counter() - started
+            if qr_codes.HAS_PIL:
+                for count in workers:
+                    started = time.perf_counter()
+                    qr_codes.export_sheets(os.path.join(tmp_dir, f"sheets_{count}"), numbers,
+                                           workers=count, cache_dir=cache_dir)
+                    row[f"sheets_{count}_workers_seconds"] = time.perf_counter() - started
+            results.append(row)
+        finally:
+            shutil.rmtree(tmp_dir)
+    return results
+
+
+BENCHMARKS = {
+    "get_requests": bench_get_requests,
+    "get_requests_page": bench_get_requests_page,
+    "get_request": bench_get_request,
+    "concurrent_writers": bench_concurrent_writers,
+    "statistics": bench_statistics,
+    "aggregate_statistics": bench_aggregate_statistics,
+    "duration_distribution": bench_duration_distribution,
+    "duration_report": bench_duration_report,
+    "time_in_status": bench_time_in_status,
+    "overdue_sweep": bench_overdue_sweep,
+    "request_numbers": bench_request_numbers,
+    "create_requests_bulk": bench_create_requests_bulk,
+    "import": bench_import,
+    "read_sources": bench_read_sources,
+    "parse_workers": bench_parse_workers,
+    "dry_run": bench_dry_run,
+    "search": bench_search,
+    "prefix_search": bench_prefix_search,
+    "change_feed": bench_change_feed,
+    "render": bench_render,
+    "qr": bench_qr,
+}
+
+
+def print_results(name, results):
+    print(f"== {name}")
+    for result in results:
+        print("   " + ", ".join(
+            f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in result.items()
+        ))
+
+
+if __name__ == "__main__":
+    for name, bench in BENCHMARKS.items():
+        print_results(name, bench())
@@ -1,17 +1,570 @@
 import sqlite3
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
 
 DB_NAME = "repair_system.db"
 
+# Connection settings. Several workstations may share one database file: WAL
+# lets readers run alongside the single writer, writers queue on busy_timeout
+# and write transactions are retried with exponential backoff after that.
+POOL_SIZE = 8                      # Max open pooled connections per process
+BUSY_TIMEOUT_MS = int(os.environ.get("REPAIR_DB_BUSY_TIMEOUT_MS", 5000))  # Lock wait per statement
+WRITE_RETRIES = 5                  # Extra attempts for a write transaction that stays busy
+RETRY_BASE_DELAY = 0.05            # Seconds; doubled on every retry
+RETRY_MAX_DELAY = 2.0
+CACHE_SIZE_KB = 16384              # Page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024      # Memory-mapped I/O window
+LOOKUP_CHUNK = 500                 # Keys per IN (...) lookup, under the bound parameter limit
+CANCEL_CHECK_STEPS = 1000          # VM instructions between checks of a cancel event
+
+# SQLite primary result codes that mean "another connection holds the lock"
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """A write transaction stayed locked out after every retry."""
+
+# Recomputes the materialized statistics from the requests table. Durations are
+# whole days (negative spans count as 0), matching calculate_statistics.
+STATISTICS_REBUILD = [
+    "DELETE FROM request_stats",
+    "DELETE FROM request_stats_problems",
+    """
+    INSERT INTO request_stats (id, completed_count, total_duration_days)
+    SELECT 1, count(*),
+           coalesce(sum(max(0, CAST(julianday(completion_date) - julianday(creation_date) AS INTEGER))), 0)
+    FROM requests
+    WHERE status_id = 5 AND completion_date IS NOT NULL
+    """,
+    """
+    INSERT INTO request_stats_problems (problem_description, completed_count)
+    SELECT problem_description, count(*)
+    FROM requests
+    WHERE status_id = 5 AND completion_date IS NOT NULL
+    GROUP BY problem_description
+    """,
+]
+
+# Seeds request_status_history for requests that have none (data from before
+# the table existed, or bulk imports). Only creation and completion times are
+# known, so a completed request gets New -> Completed and any other request a
+# single row in its current status.
+STATUS_HISTORY_BACKFILL = [
+    """
+    INSERT INTO request_status_history (request_id, status_id, changed_at, previous_status_id, previous_changed_at, previous_hours)
+    SELECT request_id, status_id, changed_at, previous_status_id, previous_changed_at,
+           (julianday(changed_at) - julianday(previous_changed_at)) * 24.0
+    FROM (
+        SELECT r.id AS request_id,
+               CASE WHEN r.status_id = 5 AND r.completion_date IS NOT NULL THEN 1 ELSE r.status_id END AS status_id,
+               r.creation_date AS changed_at, NULL AS previous_status_id, NULL AS previous_changed_at, 0 AS step
+        FROM requests r
+        WHERE NOT EXISTS (SELECT 1 FROM request_status_history h WHERE h.request_id = r.id)
+        UNION ALL
+        SELECT r.id, 5, max(r.completion_date, r.creation_date), 1, r.creation_date, 1
+        FROM requests r
+        WHERE r.status_id = 5 AND r.completion_date IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM request_status_history h WHERE h.request_id = r.id)
+    )
+    ORDER BY request_id, step
+    """,
+]
+
+# Full-text index row of one request: problem text, its comments, client name
+# and equipment model. The triggers of migration 8 re-insert it whenever one of
+# those sources changes; append "WHERE ..." to pick the requests.
+REQUESTS_FTS_ROW = """
+    INSERT INTO requests_fts (rowid, problem, comments, client, model)
+    SELECT r.id, r.problem_description,
+           (SELECT group_concat(m.text, ' ') FROM comments m WHERE m.request_id = r.id),
+           c.full_name, e.model
+    FROM requests r
+    JOIN clients c ON c.id = r.client_id
+    JOIN equipment e ON e.id = r.equipment_id
+"""
+
+# Triggers of the request change feed (migration 9), one per change to what the
+# dashboard shows of a request: (trigger, event, request id column, rows it is read from)
+REQUEST_CHANGE_TRIGGERS = [
+    ("trg_requests_change_insert", "AFTER INSERT ON requests", "NEW.id", ""),
+    ("trg_requests_change_update", "AFTER UPDATE ON requests", "NEW.id", ""),
+    ("trg_requests_change_delete", "AFTER DELETE ON requests", "OLD.id", ""),
+    ("trg_request_specialists_change_insert", "AFTER INSERT ON request_specialists", "NEW.request_id", ""),
+    ("trg_request_specialists_change_delete", "AFTER DELETE ON request_specialists", "OLD.request_id", ""),
+    ("trg_clients_change_update", "AFTER UPDATE OF full_name, phone ON clients",
+     "id", "FROM requests WHERE client_id = NEW.id"),
+    ("trg_equipment_change_update", "AFTER UPDATE OF model ON equipment",
+     "id", "FROM requests WHERE equipment_id = NEW.id"),
+    ("trg_users_change_update", "AFTER UPDATE OF full_name ON users",
+     "request_id", "FROM request_specialists WHERE specialist_id = NEW.id"),
+]
+
+# Schema migrations applied on top of the base tables, in order. The applied
+# version is stored in PRAGMA user_version, so running them again is a no-op.
+MIGRATIONS = [
+    (1, "Secondary indexes for hot filter, join and sort columns", [
+        # Dashboard order; the status variant also serves the status filter
+        "CREATE INDEX IF NOT EXISTS idx_requests_dashboard ON requests (help_needed, creation_date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_status ON requests (status_id, help_needed, creation_date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_client ON requests (client_id)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_equipment ON requests (equipment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_specialists_specialist ON request_specialists (specialist_id)",
+        "CREATE INDEX IF NOT EXISTS idx_request_parts_part ON request_parts (part_id)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_request ON comments (request_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients (phone)",
+        "CREATE INDEX IF NOT EXISTS idx_equipment_client ON equipment (client_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_role ON users (role_id)",
+    ]),
+    (2, "Materialized completion statistics", [
+        """
+        CREATE TABLE IF NOT EXISTS request_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            total_duration_days INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_stats_problems (
+            problem_description TEXT PRIMARY KEY,
+            completed_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        *STATISTICS_REBUILD,
+    ]),
+    (3, "Completion date index for statistics over date ranges", [
+        "CREATE INDEX IF NOT EXISTS idx_requests_completed ON requests (status_id, completion_date)",
+    ]),
+    (4, "Append-only request status history", [
+        # Each row records entering status_id at changed_at, and the span of
+        # the status it replaced (with its length), so closed spans need no
+        # self-join
+        """
+        CREATE TABLE IF NOT EXISTS request_status_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            changed_at TEXT NOT NULL,
+            changed_by INTEGER,
+            previous_status_id INTEGER,
+            previous_changed_at TEXT,
+            previous_hours REAL,
+            FOREIGN KEY (request_id) REFERENCES requests(id) ON DELETE CASCADE,
+            FOREIGN KEY (status_id) REFERENCES statuses(id),
+            FOREIGN KEY (changed_by) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_status_history_request ON request_status_history (request_id, changed_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_status_history_changed ON request_status_history (changed_at)",
+        # Covers per-status totals, and the longest span per status
+        "CREATE INDEX IF NOT EXISTS idx_status_history_status ON request_status_history (previous_status_id, previous_hours)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_status_history_append_only
+        BEFORE UPDATE ON request_status_history
+        BEGIN
+            SELECT RAISE(ABORT, 'request_status_history is append-only');
+        END
+        """,
+        *STATUS_HISTORY_BACKFILL,
+    ]),
+    (5, "Deadline index for the overdue sweep", [
+        "CREATE INDEX IF NOT EXISTS idx_requests_deadline ON requests (status_id, deadline_date)",
+    ]),
+    (6, "Request number sequences per branch prefix and year", [
+        """
+        CREATE TABLE IF NOT EXISTS request_number_sequences (
+            prefix TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY (prefix, year)
+        )
+        """,
+    ]),
+    (7, "Import checkpoints per source file", [
+        # Position just past the last committed row; size and mtime tell
+        # whether the checkpoint still belongs to the file on disk
+        """
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            file_mtime_ns INTEGER NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            row_number INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+    ]),
+    (8, "Full-text search over requests, comments, client names and models", [
+        # Prefix indexes serve the "word"* queries built by the search service
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+            problem, comments, client, model,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        # ORDER BY rank: problem text first, then client and model, then comments
+        "INSERT INTO requests_fts (requests_fts, rank) VALUES ('rank', 'bm25(4.0, 1.0, 2.0, 2.0)')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_insert AFTER INSERT ON requests
+        BEGIN
+            {REQUESTS_FTS_ROW} WHERE r.id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_update
+        AFTER UPDATE OF problem_description, client_id, equipment_id ON requests
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = OLD.id;
+            {REQUESTS_FTS_ROW} WHERE r.id = NEW.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_delete AFTER DELETE ON requests
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = OLD.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_insert AFTER INSERT ON comments
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = NEW.request_id;
+            {REQUESTS_FTS_ROW} WHERE r.id = NEW.request_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_update AFTER UPDATE OF text, request_id ON comments
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid IN (OLD.request_id, NEW.request_id);
+            {REQUESTS_FTS_ROW} WHERE r.id IN (OLD.request_id, NEW.request_id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_comments_fts_delete AFTER DELETE ON comments
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = OLD.request_id;
+            {REQUESTS_FTS_ROW} WHERE r.id = OLD.request_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update AFTER UPDATE OF full_name ON clients
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid IN (SELECT id FROM requests WHERE client_id = NEW.id);
+            {REQUESTS_FTS_ROW} WHERE r.client_id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_equipment_fts_update AFTER UPDATE OF model ON equipment
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid IN (SELECT id FROM requests WHERE equipment_id = NEW.id);
+            {REQUESTS_FTS_ROW} WHERE r.equipment_id = NEW.id;
+        END
+        """,
+        # Index the requests that already exist
+        "DELETE FROM requests_fts",
+        REQUESTS_FTS_ROW,
+    ]),
+    (9, "Change feed of requests for incremental dashboard refresh", [
+        # One global counter; each change bumps it and stamps the request with it
+        """
+        CREATE TABLE IF NOT EXISTS request_change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO request_change_counter (id, version) VALUES (1, 0)",
+        # Latest change per request, so the table stays one row per request
+        """
+        CREATE TABLE IF NOT EXISTS request_changes (
+            request_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_request_changes_version ON request_changes (version, request_id)",
+        *(f"""
+        CREATE TRIGGER IF NOT EXISTS {name} {event}
+        BEGIN
+            UPDATE request_change_counter SET version = version + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO request_changes (request_id, version)
+            SELECT {column}, (SELECT version FROM request_change_counter WHERE id = 1) {source};
+        END
+        """ for name, event, column, source in REQUEST_CHANGE_TRIGGERS),
+    ]),
+    (10, "Deadline at which each request was last marked overdue", [
+        # The sweep skips a request marked at its current deadline, so moving it
+        # back to an open status sticks until the deadline is changed
+        """
+        CREATE TABLE IF NOT EXISTS request_overdue_marks (
+            request_id INTEGER PRIMARY KEY,
+            deadline_date TEXT
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO request_overdue_marks (request_id, deadline_date)
+        SELECT id, deadline_date FROM requests WHERE status_id = 6
+        """,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def connection_pragmas():
+    # Built on every call so BUSY_TIMEOUT_MS etc. can be changed at runtime
+    return [
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {MMAP_SIZE}",
+        f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}",
+    ]
+
+def configure_connection(conn):
+    for pragma in connection_pragmas():
+        conn.execute(pragma)
+    return conn
+
+def is_busy_error(error):
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error)
+    return "locked" in message or "busy" in message
+
 def get_connection(db_name=None):
+    """Opens a new, unpooled connection. Services use connection()/transaction()."""
     if db_name is None:
         db_name = DB_NAME
-    return sqlite3.connect(db_name)
+    return configure_connection(sqlite3.connect(db_name, timeout=BUSY_TIMEOUT_MS / 1000))
+
+class ConnectionManager:
+    """
+    Bounded pool of configured SQLite connections.
+
+    A thread keeps the connection it acquired until its outermost
+    connection()/transaction() block ends, so nested service calls share it.
+    Released connections stay open (with their page cache and parsed schema)
+    and are handed to the next caller for the same database.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+        self._cond = threading.Condition()
+        self._idle = {}         # db path -> [(connection, generation)]
+        self._generation = {}   # db path -> bumped by close_all
+        self._open = 0
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _forget_connections(self):
+        # SQLite connections must not be used across fork(); a child process
+        # starts with an empty pool and opens its own connections
+        self._cond = threading.Condition()
+        self._idle = {}
+        self._open = 0
+        self._local = threading.local()
+
+    def _held(self):
+        if not hasattr(self._local, "held"):
+            self._local.held = {}
+        return self._local.held
+
+    def _path(self, db_name):
+        return os.path.abspath(db_name if db_name is not None else DB_NAME)
+
+    def _connect(self, path):
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        return configure_connection(conn)
+
+    def acquire(self, db_name=None):
+        path = self._path(db_name)
+        held = self._held()
+        if path in held:
+            held[path][2] += 1
+            return held[path][0]
+            
+        conn = None
+        with self._cond:
+            while True:
+                idle = self._idle.get(path)
+                if idle:
+                    conn, generation = idle.pop()
+                    break
+                if self._open < self.pool_size:
+                    self._open += 1
+                    generation = self._generation.get(path, 0)
+                    break
+                # Pool is full: drop an idle connection to another database, or wait
+                victim = next((other for other in self._idle.values() if other), None)
+                if victim:
+                    victim.pop()[0].close()
+                    self._open -= 1
+                    continue
+                self._cond.wait()
+                
+        if conn is None:
+            try:
+                conn = self._connect(path)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+        held[path] = [conn, generation, 1]
+        return conn
+
+    def release(self, db_name=None):
+        path = self._path(db_name)
+        held = self._held()
+        entry = held[path]
+        entry[2] -= 1
+        if entry[2] > 0:
+            return
+        del held[path]
+        conn, generation = entry[0], entry[1]
+        
+        if conn.in_transaction:
+            # A caller left without commit/rollback; never hand out an open transaction
+            conn.rollback()
+        with self._cond:
+            if generation == self._generation.get(path, 0):
+                self._idle.setdefault(path, []).append((conn, generation))
+            else:
+                conn.close()
+                self._open -= 1
+            self._cond.notify()
+
+    def close_all(self, db_name=None):
+        """Closes idle connections (to one database or all); busy ones close on release."""
+        with self._cond:
+            paths = [os.path.abspath(db_name)] if db_name is not None else list(self._idle)
+            for path in paths:
+                self._generation[path] = self._generation.get(path, 0) + 1
+                for conn, _ in self._idle.pop(path, []):
+                    conn.close()
+                    self._open -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self, db_name=None):
+        conn = self.acquire(db_name)
+        try:
+            yield conn
+        finally:
+            self.release(db_name)
+
+    @contextmanager
+    def transaction(self, db_name=None):
+        """
+        Runs the block in a write transaction, committing on success and rolling
+        back on any exception. Nested blocks join the outer transaction.
+        """
+        with self.connection(db_name) as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            # IMMEDIATE takes the write lock up front so concurrent writers wait
+            # on busy_timeout instead of failing on lock upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @contextmanager
+    def cancellable(self, cancelled, db_name=None):
+        """
+        Holds this thread's pooled connection for the block and aborts its
+        statements once the threading.Event `cancelled` is set: the running
+        statement raises sqlite3.OperationalError ("interrupted").
+        """
+        with self.connection(db_name) as conn:
+            conn.set_progress_handler(cancelled.is_set, CANCEL_CHECK_STEPS)
+            try:
+                yield conn
+            finally:
+                conn.set_progress_handler(None, CANCEL_CHECK_STEPS)
+
+    def run_in_transaction(self, work, db_name=None, retries=None):
+        """
+        Calls work(conn) inside transaction() and returns its result. If the
+        database stays locked by another writer, the whole transaction is
+        retried with exponential backoff and DatabaseBusyError is raised once
+        the retries are used up.
+        """
+        if retries is None:
+            retries = WRITE_RETRIES
+        attempt = 0
+        while True:
+            try:
+                with self.transaction(db_name) as conn:
+                    return work(conn)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or self._held().get(self._path(db_name)):
+                    # Not a lock conflict, or nested in an outer transaction
+                    # that has to be retried as a whole
+                    raise
+                if attempt >= retries:
+                    raise DatabaseBusyError(f"Database is busy after {attempt + 1} attempts: {e}") from e
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+                time.sleep(random.uniform(delay / 2, delay))
+                attempt += 1
+
+connection_manager = ConnectionManager()
+
+def connection(db_name=None):
+    """Context manager yielding this thread's pooled connection (autocommit)."""
+    return connection_manager.connection(db_name)
+
+def transaction(db_name=None):
+    """Context manager yielding a pooled connection inside a write transaction."""
+    return connection_manager.transaction(db_name)
+
+def run_in_transaction(work, db_name=None, retries=None):
+    """Runs work(conn) in a write transaction, retrying while the database is locked."""
+    return connection_manager.run_in_transaction(work, db_name, retries)
+
+def cancellable(cancelled, db_name=None):
+    """Context manager: service calls in the block stop once `cancelled` is set."""
+    return connection_manager.cancellable(cancelled, db_name)
+
+def close_all(db_name=None):
+    connection_manager.close_all(db_name)
+
+def lookup_ids(conn, query, keys):
+    """Runs `query` (with one {placeholders} slot) over keys in chunks; returns {key: id}."""
+    keys = list(keys)
+    found = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[start:start + LOOKUP_CHUNK]
+        found.update(conn.execute(query.format(placeholders=", ".join("?" * len(chunk))), chunk).fetchall())
+    return found
+
+def ensure_database(db_name=None):
+    """
+    Creates and seeds the database if it does not exist yet, otherwise
+    brings it up to SCHEMA_VERSION. Cheap once the schema is current.
+    """
+    if not os.path.exists(db_name if db_name is not None else DB_NAME):
+        init_db(db_name)
+    else:
+        migrate(db_name)
 
 def init_db(db_name=None):
     if db_name is None:
         db_name = DB_NAME
         
+    close_all(db_name)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
     if os.path.exists(db_name):
         os.remove(db_name)  # Recreate for clean state, or handle migration. For this task, clean state is safer to ensure 3NF.
     
@@ -148,6 +701,9 @@ def init_db(db_name=None):
         )
     """)
 
+    # Indexes and later schema changes
+    apply_migrations(conn)
+
     # Seed Initial Data
     seed_data(cursor)
     
@@ -155,6 +711,34 @@ def init_db(db_name=None):
     conn.close()
     print("Database initialized successfully.")
 
+def apply_migrations(conn):
+    """
+    Applies every migration newer than the database's user_version.
+    Returns the list of applied versions; the caller commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    current = cursor.fetchone()[0]
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+def migrate(db_name=None):
+    """Brings an existing database up to SCHEMA_VERSION without touching its data."""
+    conn = get_connection(db_name)
+    try:
+        applied = apply_migrations(conn)
+        conn.commit()
+        return applied
+    finally:
+        conn.close()
+
 def seed_data(cursor):
     # Roles
     roles = ['Administrator', 'Operator', 'Specialist', 'Manager', 'Quality Manager']
@@ -4,9 +4,10 @@ from database import get_connection
 print("Checking requests via Service...")
 try:
     # Mimic Admin user
-    requests = RequestService.get_requests("Administrator", 1, None)
-    print(f"Found {len(requests)} requests.")
-    for r in requests:
+    count = 0
+    for r in RequestService.iter_requests("Administrator", 1, None):
         print(f"- {r.request_number} | {r.client_name} | {r.status_name}")
+        count += 1
+    print(f"Found {count} requests.")
 except Exception as e:
     print(f"Error getting requests: {e}")
@@ -0,0 +1,873 @@
+"""
+Streaming import of partner datasets (users, requests, comments).
+
+Both dataset layouts are read (import_БытСервис with homeTech* columns,
+Кондиционеры_данные with climateTech* columns):
+    <base_dir>/Пользователи/inputDataUsers.{csv,txt,xlsx}
+    <base_dir>/Заявки/inputDataRequests.{csv,txt,xlsx}
+    <base_dir>/Комментарии/inputDataComments.{csv,txt,xlsx}   (optional)
+The .txt files hold the same ';'-separated text as the .csv ones; .xlsx
+sheets are streamed out of the zipped sheet XML, never loaded whole.
+
+Files are parsed row by row through generators and written in batches:
+one transaction per batch and one executemany per table. Source ids are
+mapped to database ids in memory, so rows are never looked up one by one
+and memory stays flat apart from the id maps.
+
+Rows are upserted on their natural keys (client phone, user login,
+equipment serial, request number), so importing the same data twice
+changes nothing. Every batch also stores, in the same transaction, the
+byte offset just past its last row in import_checkpoints; an incremental
+run continues each file from there. An interrupted import (full or
+incremental) is resumed with --incremental.
+
+Large files are parsed and validated in a process pool, batch by batch,
+while this process reads ahead and stays the only SQLite writer; batches
+are written in file order.
+
+--dry-run only validates the files: it prints a JSON report of the rows
+that would be imported and of every malformed, orphan and duplicate row,
+without opening the database.
+
+Run: python import_engine.py [base_dir] [--db repair_system.db] [--batch-size 5000] [--incremental]
+                             [--format csv|txt|xlsx] [--workers N] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path, PurePosixPath
+from xml.etree.ElementTree import iterparse
+from xml.parsers import expat
+
+import database
+from database import init_db, lookup_ids, migrate, run_in_transaction
+from stats_module import backfill_status_history, rebuild_statistics, record_status_change
+
+BATCH_SIZE = 5000          # Source rows per write transaction
+# Processes parsing batches ahead of the writer; 1 parses in the importing process
+IMPORT_WORKERS = int(os.environ.get("REPAIR_IMPORT_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # Smaller files are parsed in-process; a pool costs more than it saves
+MAX_REPORTED_ISSUES = 1000 # Skipped rows kept with details in the report; all are counted
+# Kinds of problem rows in the report: unparsable, referencing a row that
+# does not exist, repeating a row already seen
+PROBLEMS = ("malformed", "orphan", "duplicate")
+
+# Dataset file per kind: (folder, file name without extension)
+DATASET_FILES = {
+    "users": ("Пользователи", "inputDataUsers"),
+    "requests": ("Заявки", "inputDataRequests"),
+    "comments": ("Комментарии", "inputDataComments"),
+}
+
+# Source file formats, in the order they are picked when several are present
+SOURCE_FORMATS = ("csv", "txt", "xlsx")
+
+# Source user type -> roles.id; clients are not users
+CLIENT_TYPE = "Заказчик"
+ROLE_MAP = {
+    "Администратор": 1,
+    "Оператор": 2,
+    "Специалист": 3,
+    "Мастер": 3,
+    "Менеджер": 4,
+    "Менеджер по качеству": 5,
+}
+DEFAULT_ROLE_ID = 2  # Operator
+
+# Source request status -> statuses.id
+STATUS_MAP = {
+    "Новая заявка": 1,       # New
+    "В процессе ремонта": 3, # In Progress
+    "Ожидание запчастей": 4, # Waiting for Parts
+    "Готова к выдаче": 5,    # Completed
+    "Завершена": 5,
+}
+DEFAULT_STATUS_ID = 1  # New
+
+# Request columns named differently in the two layouts, first match wins
+REQUEST_COLUMNS = {
+    "equipment_type": ("homeTechType", "climateTechType"),
+    "model": ("homeTechModel", "climateTechModel"),
+    "problem": ("problemDescryption", "problemDescription"),
+}
+
+REQUEST_NUMBER_PREFIX = "REQ-OLD-"  # requests.request_number = prefix + requestID
+DEADLINE_DAYS = 7
+
+def equipment_serial(number_prefix, source_id):
+    """
+    Placeholder serial of an imported request's equipment (the exports have
+    none), its natural key on re-import. LEGACY-<requestID> is what
+    import_legacy_data.py wrote, so databases it loaded are matched; other
+    number prefixes keep their prefix so the serials cannot collide.
+    """
+    if number_prefix == REQUEST_NUMBER_PREFIX:
+        return f"LEGACY-{source_id}"
+    return f"LEGACY-{number_prefix}{source_id}"
+
+UserRow = namedtuple("UserRow", "source_id full_name phone login password role_id")  # role_id None: client
+RequestRow = namedtuple("RequestRow", "source_id creation_date equipment_type model problem status_id "
+                                      "completion_date deadline_date master_id client_id")
+CommentRow = namedtuple("CommentRow", "source_id text master_id request_id")
+
+def _null(value):
+    if value is None:
+        return None
+    value = value.strip()
+    return None if value == "" or value.lower() == "null" else value
+
+def _parse_datetime(value):
+    # fromisoformat is several times faster than strptime; the length check keeps
+    # it to the two formats the exports use
+    if len(value) in (10, 19):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    raise ValueError(f"bad date {value!r}")
+
+def parse_date(value):
+    """'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' -> stored date text; None for empty/null."""
+    value = _null(value)
+    if value is None:
+        return None
+    return _parse_datetime(value).isoformat(" ")
+
+def _column(row, names):
+    for name in names:
+        if name in row:
+            return row[name]
+    return None
+
+def _required(row, name):
+    value = _null(row.get(name))
+    if value is None:
+        raise ValueError(f"{name} is empty")
+    return value
+
+def parse_user(row):
+    user_type = _required(row, "type")
+    role_id = None if user_type == CLIENT_TYPE else ROLE_MAP.get(user_type, DEFAULT_ROLE_ID)
+    return UserRow(
+        source_id=_required(row, "userID"),
+        full_name=_required(row, "fio"),
+        phone=_required(row, "phone") if role_id is None else _null(row.get("phone")),
+        login=_required(row, "login") if role_id is not None else _null(row.get("login")),
+        password=_null(row.get("password")) or "",
+        role_id=role_id,
+    )
+
+def parse_request(row):
+    created = _parse_datetime(_required(row, "startDate"))
+    problem = _null(_column(row, REQUEST_COLUMNS["problem"]))
+    if problem is None:
+        raise ValueError("problemDescryption is empty")
+    return RequestRow(
+        source_id=_required(row, "requestID"),
+        creation_date=created.isoformat(" "),
+        equipment_type=_null(_column(row, REQUEST_COLUMNS["equipment_type"])) or "",
+        model=_null(_column(row, REQUEST_COLUMNS["model"])) or "",
+        problem=problem,
+        status_id=STATUS_MAP.get(_null(row.get("requestStatus")), DEFAULT_STATUS_ID),
+        completion_date=parse_date(row.get("completionDate")),
+        deadline_date=(created + timedelta(days=DEADLINE_DAYS)).isoformat(" "),
+        master_id=_null(row.get("masterID")),
+        client_id=_required(row, "clientID"),
+    )
+
+def parse_comment(row):
+    return CommentRow(
+        source_id=_null(row.get("commentID")),
+        text=_required(row, "message"),
+        master_id=_required(row, "masterID"),
+        request_id=_required(row, "requestID"),
+    )
+
+PARSERS = {"users": parse_user, "requests": parse_request, "comments": parse_comment}
+
+def dataset_path(base_dir, kind, source_format=None):
+    """Path of a dataset file: the given format, else the first of SOURCE_FORMATS present."""
+    folder, name = DATASET_FILES[kind]
+    formats = (source_format,) if source_format else SOURCE_FORMATS
+    paths = [Path(base_dir) / folder / f"{name}.{ext}" for ext in formats]
+    return next((path for path in paths if path.exists()), paths[0])
+
+class TextReader:
+    """
+    Iterates the rows of a ';'-separated export (.csv or .txt) as dicts,
+    starting at a byte offset. After each row, `offset` is the position just
+    past it and `row_number` the number of rows read from the start of the file.
+    """
+
+    def __init__(self, path, offset=0, row_number=0):
+        self.path = Path(path)
+        self.offset = offset
+        self.row_number = row_number
+
+    def _lines(self, f):
+        for line in f:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode("utf-8-sig")], delimiter=";"))
+            if self.offset < len(header_line):
+                self.offset = len(header_line)
+            f.seek(self.offset)
+            # csv pulls only the lines of the row it returns, so offset is exact
+            for values in csv.reader(self._lines(f), delimiter=";"):
+                if not values:
+                    continue
+                self.row_number += 1
+                yield dict(zip(header, values))
+
+XLSX_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+XLSX_EPOCH = datetime(1899, 12, 30)
+XLSX_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}  # Built-in number formats that show dates
+XLSX_READ_SIZE = 64 * 1024  # Compressed sheet bytes fed to the parser at a time
+
+def _xlsx_column(reference):
+    """'C12' -> 2"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+class XlsxReader:
+    """
+    Iterates the rows of the first sheet of an .xlsx workbook as dicts. The
+    sheet XML is fed to an expat parser in chunks straight out of the zip,
+    so no element tree is built; only the shared strings table stays in
+    memory. There are no byte offsets inside a zipped sheet, so `offset`
+    counts rows and resuming skips that many.
+    """
+
+    def __init__(self, path, offset=0, row_number=0):
+        self.path = Path(path)
+        self.offset = offset
+        self.row_number = row_number
+
+    @staticmethod
+    def _first_sheet(book):
+        with book.open("xl/workbook.xml") as f:
+            sheet = next(e for _, e in iterparse(f) if e.tag == f"{XLSX_MAIN}sheet")
+        with book.open("xl/_rels/workbook.xml.rels") as f:
+            target = next(e.get("Target") for _, e in iterparse(f)
+                          if e.tag == f"{XLSX_PKG_REL}Relationship" and e.get("Id") == sheet.get(f"{XLSX_REL}id"))
+        return target[1:] if target.startswith("/") else str(PurePosixPath("xl") / target)
+
+    @staticmethod
+    def _shared_strings(book):
+        strings = []
+        if "xl/sharedStrings.xml" in book.namelist():
+            with book.open("xl/sharedStrings.xml") as f:
+                for _, element in iterparse(f):
+                    if element.tag == f"{XLSX_MAIN}si":
+                        # Rich text keeps its runs in several <t> elements
+                        strings.append("".join(t.text or "" for t in element.iter(f"{XLSX_MAIN}t")))
+                        element.clear()
+        return strings
+
+    @staticmethod
+    def _date_styles(book):
+        """Indexes of the cell styles that display numbers as dates."""
+        if "xl/styles.xml" not in book.namelist():
+            return set()
+        custom, formats = {}, []
+        with book.open("xl/styles.xml") as f:
+            for _, element in iterparse(f):
+                if element.tag == f"{XLSX_MAIN}numFmt":
+                    code = re.sub(r'"[^"]*"|\[[^]]*]', "", element.get("formatCode", "").lower())
+                    custom[int(element.get("numFmtId"))] = any(c in code for c in "dy")
+                elif element.tag == f"{XLSX_MAIN}cellXfs":
+                    formats = [int(xf.get("numFmtId", 0)) for xf in element.iter(f"{XLSX_MAIN}xf")]
+        return {str(style) for style, fmt in enumerate(formats) if fmt in XLSX_DATE_FORMATS or custom.get(fmt)}
+
+    @staticmethod
+    def _number(text, is_date):
+        number = float(text)
+        if is_date:
+            value = XLSX_EPOCH + timedelta(days=number)
+            return value.strftime("%Y-%m-%d" if number.is_integer() else "%Y-%m-%d %H:%M:%S")
+        # Ids and phone numbers are stored as numbers; keep them as plain digits
+        return str(int(number)) if number.is_integer() else text
+
+    def _sheet_rows(self, sheet, strings, date_styles):
+        """Yields {column index: text} for every row of the sheet XML."""
+        # expat reports namespaced tags as "uri}name", without the leading brace
+        namespace = XLSX_MAIN[1:]
+        row_tag, cell_tag = f"{namespace}row", f"{namespace}c"
+        text_tags = {f"{namespace}v", f"{namespace}t"}
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.buffer_text = True
+        done, row, cell, text = [], None, None, None
+
+        def start(tag, attrs):
+            nonlocal row, cell, text
+            if tag == row_tag:
+                row = {}
+                cell = (None, None, -1)
+            elif tag == cell_tag:
+                # The reference is optional; without it cells follow each other
+                reference = attrs.get("r")
+                column = _xlsx_column(reference) if reference else cell[2] + 1
+                cell = (attrs.get("t"), attrs.get("s"), column)
+                text = []
+            elif tag in text_tags and cell is not None:
+                parser.CharacterDataHandler = text.append
+
+        def end(tag):
+            nonlocal row
+            if tag in text_tags:
+                parser.CharacterDataHandler = None
+            elif tag == cell_tag:
+                kind, style, column = cell
+                value = "".join(text)
+                if value and kind == "s":
+                    value = strings[int(value)]
+                elif value and kind == "b":
+                    value = "TRUE" if value == "1" else "FALSE"
+                elif value and kind in (None, "n"):
+                    value = self._number(value, style in date_styles)
+                row[column] = value
+            elif tag == row_tag:
+                done.append(row)
+                row = None
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        while True:
+            chunk = sheet.read(XLSX_READ_SIZE)
+            parser.Parse(chunk, not chunk)
+            yield from done
+            done.clear()
+            if not chunk:
+                return
+
+    def __iter__(self):
+        with zipfile.ZipFile(self.path) as book:
+            strings = self._shared_strings(book)
+            date_styles = self._date_styles(book)
+            header = None
+            skip = self.offset
+            with book.open(self._first_sheet(book)) as sheet:
+                for values in self._sheet_rows(sheet, strings, date_styles):
+                    if not any(values.values()):
+                        continue
+                    if header is None:
+                        header = [values.get(i, "").strip() for i in range(max(values) + 1)]
+                    elif skip:
+                        skip -= 1
+                    else:
+                        self.row_number += 1
+                        self.offset += 1
+                        yield {name: values.get(i, "") for i, name in enumerate(header) if name}
+
+READERS = {"csv": TextReader, "txt": TextReader, "xlsx": XlsxReader}
+
+def open_source(path, offset=0, row_number=0):
+    """Returns the reader for a dataset file, picked by its extension."""
+    return READERS[Path(path).suffix.lower().lstrip(".")](path, offset, row_number)
+
+def read_rows(path):
+    """Yields the rows of a dataset file as dicts, one at a time."""
+    yield from open_source(path)
+
+def parse_rows(rows, parser, start=0):
+    """Yields (row number, record, None) or (row number, None, error) per source row."""
+    for number, row in enumerate(rows, start + 1):
+        try:
+            yield number, parser(row), None
+        except ValueError as e:
+            yield number, None, str(e)
+
+def load_checkpoint(path, db_name=None):
+    """Returns (byte offset, row number) to resume `path` from; (0, 0) when the
+    file has no checkpoint or changed since it was written."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    with database.connection(db_name) as conn:
+        row = conn.execute("""
+            SELECT byte_offset, row_number FROM import_checkpoints
+            WHERE source = ? AND file_size = ? AND file_mtime_ns = ?
+        """, (str(path), stat.st_size, stat.st_mtime_ns)).fetchone()
+    return tuple(row) if row else (0, 0)
+
+def save_checkpoint(conn, path, position):
+    """Records (byte offset, row number) reached in `path`; call inside the batch's write transaction."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    offset, row_number = position
+    conn.execute("""
+        INSERT INTO import_checkpoints (source, file_size, file_mtime_ns, byte_offset, row_number, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source) DO UPDATE SET
+            file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns,
+            byte_offset = excluded.byte_offset, row_number = excluded.row_number, updated_at = excluded.updated_at
+    """, (str(path), stat.st_size, stat.st_mtime_ns, offset, row_number,
+          datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+def read_chunks(reader, size):
+    """Yields (rows, row number before them, (offset, row number) after them) per `size` source rows."""
+    rows = iter(reader)
+    while True:
+        start = reader.row_number
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk, start, (reader.offset, reader.row_number)
+
+def parse_chunk(kind, rows, start):
+    """Parses one chunk of source rows; runs in the worker processes."""
+    return list(parse_rows(rows, PARSERS[kind], start))
+
+def _next_id(conn, table):
+    # Ids are assigned here so executemany needs no lastrowid; safe inside the
+    # write transaction, and AUTOINCREMENT's sqlite_sequence is respected
+    return conn.execute(f"""
+        SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0),
+                   coalesce((SELECT max(id) FROM {table}), 0)) + 1
+    """).fetchone()[0]
+
+class ImportEngine:
+    """
+    Imports one dataset into db_name. Keeps the source -> database id maps
+    (users, clients) for resolving references in later files; requests are
+    resolved through their request numbers.
+
+    With resume, each file continues from its checkpoint. The users file is
+    still read in full to rebuild the id maps, but rows before the
+    checkpoint only add missing records instead of updating existing ones.
+    """
+
+    def __init__(self, db_name=None, batch_size=BATCH_SIZE, number_prefix=REQUEST_NUMBER_PREFIX, resume=False,
+                 source_format=None, workers=IMPORT_WORKERS):
+        self.db_name = db_name
+        self.workers = workers
+        self.source_format = source_format  # None: first of SOURCE_FORMATS present
+        self.batch_size = batch_size
+        self.number_prefix = number_prefix
+        self.resume = resume
+        self.user_ids = {}           # source userID -> users.id
+        self.client_ids = {}         # source userID -> clients.id
+        self.user_sources = set()    # source userIDs read by this run
+        self.user_keys = set()       # ("phone", ...) / ("login", ...) read by this run
+        self.request_sources = set() # source requestIDs imported by this run
+        self.comment_keys = set()    # (requestID, masterID, text) of the comments read by this run
+        self.report = {
+            "users": 0, "clients": 0, "requests": 0, "specialists": 0, "comments": 0,
+            "updated": {"users": 0, "clients": 0, "requests": 0},
+            "skipped": {"users": 0, "requests": 0, "comments": 0},
+            "problems": {kind: dict.fromkeys(PROBLEMS, 0) for kind in DATASET_FILES},
+            "resumed": {},
+            "issues": [],
+        }
+
+    def skip(self, kind, number, problem, reason, kept=False):
+        """Reports a problem row (one of PROBLEMS); kept rows (e.g. a dangling
+        optional reference) are still imported."""
+        self.report["problems"][kind][problem] += 1
+        if not kept:
+            self.report["skipped"][kind] += 1
+        if len(self.report["issues"]) < MAX_REPORTED_ISSUES:
+            issue = {"file": kind, "row": number, "problem": problem, "reason": reason}
+            if kept:
+                issue["kept"] = True
+            self.report["issues"].append(issue)
+
+    def _new_user(self, number, r):
+        """Reports a repeated userID, client phone or login (the import merges
+        such rows); returns False when the phone or login was seen before."""
+        repeated = r.source_id in self.user_sources
+        self.user_sources.add(r.source_id)
+        if repeated:
+            self.skip("users", number, "duplicate", f"duplicate user {r.source_id}", kept=True)
+        key = ("phone", r.phone) if r.role_id is None else ("login", r.login)
+        if key in self.user_keys:
+            if not repeated:
+                self.skip("users", number, "duplicate", f"duplicate {key[0]} {key[1]}", kept=True)
+            return False
+        self.user_keys.add(key)
+        return True
+
+    def _valid(self, kind, batch):
+        records = []
+        for number, record, error in batch:
+            if error:
+                self.skip(kind, number, "malformed", error)
+            else:
+                records.append((number, record))
+        return records
+
+    def parse_batches(self, kind, reader):
+        """
+        Yields (parsed batch, checkpoint position after it) in file order.
+        Reading stays in this process; parsing and validating the batches
+        runs in a pool of self.workers processes, at most two batches per
+        worker ahead of the writer, so memory stays bounded.
+        """
+        chunks = read_chunks(reader, self.batch_size)
+        if self.workers <= 1 or reader.path.stat().st_size < PARALLEL_MIN_BYTES:
+            for rows, start, position in chunks:
+                yield parse_chunk(kind, rows, start), position
+            return
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = deque()
+            for rows, start, position in chunks:
+                pending.append((pool.submit(parse_chunk, kind, rows, start), position))
+                if len(pending) > self.workers * 2:
+                    future, ready = pending.popleft()
+                    yield future.result(), ready
+            while pending:
+                future, ready = pending.popleft()
+                yield future.result(), ready
+
+    def open(self, kind, path):
+        """Returns (path, parsed batches) for a source file, positioned at its checkpoint on resume."""
+        offset, row_number = load_checkpoint(path, self.db_name) if self.resume else (0, 0)
+        if row_number:
+            self.report["resumed"][kind] = row_number
+        return path, self.parse_batches(kind, open_source(path, offset, row_number))
+
+    def import_users(self, path, batches, update_after=0):
+        """Upserts clients (by phone) and employees (by login). Rows numbered up
+        to update_after were committed by an earlier run and are only resolved."""
+        for batch, position in batches:
+            records = self._valid("users", batch)
+            for number, r in records:
+                self._new_user(number, r)
+
+            def work(conn):
+                # Clients are matched by phone and employees by login, including
+                # rows already in the database (e.g. the seeded accounts)
+                clients = {r.phone: (n, r) for n, r in records if r.role_id is None}
+                users = {r.login: (n, r) for n, r in records if r.role_id is not None}
+                client_ids = lookup_ids(conn, "SELECT phone, min(id) FROM clients WHERE phone IN ({placeholders}) GROUP BY phone",
+                                        clients)
+                user_ids = lookup_ids(conn, "SELECT username, id FROM users WHERE username IN ({placeholders})", users)
+                new_clients = [r for phone, (_, r) in clients.items() if phone not in client_ids]
+                new_users = [r for login, (_, r) in users.items() if login not in user_ids]
+                changed_clients = [(r.full_name, client_ids[phone], r.full_name) for phone, (n, r) in clients.items()
+                                   if phone in client_ids and n > update_after]
+                changed_users = [(r.password, r.full_name, r.role_id, user_ids[login], r.password, r.full_name, r.role_id)
+                                 for login, (n, r) in users.items() if login in user_ids and n > update_after]
+
+                # Unchanged rows are not written, so the FTS and change feed triggers stay quiet
+                conn.executemany("UPDATE clients SET full_name = ? WHERE id = ? AND full_name IS NOT ?", changed_clients)
+                conn.executemany("""
+                    UPDATE users SET password = ?, full_name = ?, role_id = ?
+                    WHERE id = ? AND (password, full_name, role_id) IS NOT (?, ?, ?)
+                """, changed_users)
+                next_id = _next_id(conn, "clients")
+                for offset, r in enumerate(new_clients):
+                    client_ids[r.phone] = next_id + offset
+                conn.executemany("INSERT INTO clients (id, full_name, phone) VALUES (?, ?, ?)",
+                                 ((client_ids[r.phone], r.full_name, r.phone) for r in new_clients))
+                next_id = _next_id(conn, "users")
+                for offset, r in enumerate(new_users):
+                    user_ids[r.login] = next_id + offset
+                conn.executemany("INSERT INTO users (id, username, password, full_name, role_id) VALUES (?, ?, ?, ?, ?)",
+                                 ((user_ids[r.login], r.login, r.password, r.full_name, r.role_id) for r in new_users))
+                save_checkpoint(conn, path, position)
+                return client_ids, user_ids, len(new_clients), len(new_users), len(changed_clients), len(changed_users)
+
+            client_ids, user_ids, new_clients, new_users, changed_clients, changed_users = \
+                run_in_transaction(work, self.db_name)
+            # Maps change only after the batch committed; work() may be retried
+            for _, r in records:
+                if r.role_id is None:
+                    self.client_ids[r.source_id] = client_ids[r.phone]
+                else:
+                    self.user_ids[r.source_id] = user_ids[r.login]
+            self.report["clients"] += new_clients
+            self.report["users"] += new_users
+            self.report["updated"]["clients"] += changed_clients
+            self.report["updated"]["users"] += changed_users
+
+    def import_requests(self, path, batches):
+        """Upserts equipment (by serial) and requests (by request number)."""
+        for batch, position in batches:
+            records = []
+            seen = set()
+            for number, r in self._valid("requests", batch):
+                if r.client_id not in self.client_ids:
+                    self.skip("requests", number, "orphan", f"client {r.client_id} not found")
+                elif r.source_id in self.request_sources or r.source_id in seen:
+                    self.skip("requests", number, "duplicate", f"duplicate request {r.source_id}")
+                else:
+                    seen.add(r.source_id)
+                    records.append((number, r))
+                    if r.master_id is not None and r.master_id not in self.user_ids:
+                        # The request is still imported, just unassigned
+                        self.skip("requests", number, "orphan", f"master {r.master_id} not found", kept=True)
+
+            def work(conn):
+                serials = {equipment_serial(self.number_prefix, r.source_id): r for _, r in records}
+                numbers = {f"{self.number_prefix}{r.source_id}": r for _, r in records}
+                equipment_ids = lookup_ids(conn, "SELECT serial_number, id FROM equipment WHERE serial_number IN ({placeholders})",
+                                           serials)
+                request_ids = lookup_ids(conn, "SELECT request_number, id FROM requests WHERE request_number IN ({placeholders})",
+                                         numbers)
+                statuses = lookup_ids(conn, "SELECT id, status_id FROM requests WHERE id IN ({placeholders})",
+                                      request_ids.values())
+                new_equipment = [serial for serial in serials if serial not in equipment_ids]
+                new_requests = [(number, r) for number, r in numbers.items() if number not in request_ids]
+
+                # Unchanged rows are not written, so the FTS and change feed triggers stay quiet
+                conn.executemany(
+                    """
+                    UPDATE equipment SET model = ?, type = ?, client_id = ?
+                    WHERE id = ? AND (model, type, client_id) IS NOT (?, ?, ?)
+                    """,
+                    ((r.model, r.equipment_type, self.client_ids[r.client_id], equipment_ids[serial],
+                      r.model, r.equipment_type, self.client_ids[r.client_id])
+                     for serial, r in serials.items() if serial in equipment_ids)
+                )
+                next_id = _next_id(conn, "equipment")
+                for offset, serial in enumerate(new_equipment):
+                    equipment_ids[serial] = next_id + offset
+                conn.executemany(
+                    "INSERT INTO equipment (id, serial_number, model, type, client_id) VALUES (?, ?, ?, ?, ?)",
+                    ((equipment_ids[serial], serial, serials[serial].model, serials[serial].equipment_type,
+                      self.client_ids[serials[serial].client_id]) for serial in new_equipment)
+                )
+
+                changed_requests = []
+                for number, r in numbers.items():
+                    if number in request_ids:
+                        values = (r.creation_date, r.problem, self.client_ids[r.client_id],
+                                  equipment_ids[equipment_serial(self.number_prefix, r.source_id)], r.status_id,
+                                  r.completion_date, r.deadline_date)
+                        changed_requests.append(values + (request_ids[number],) + values)
+                conn.executemany(
+                    """
+                    UPDATE requests SET creation_date = ?, problem_description = ?, client_id = ?, equipment_id = ?,
+                                        status_id = ?, completion_date = ?, deadline_date = ?
+                    WHERE id = ? AND (creation_date, problem_description, client_id, equipment_id,
+                                      status_id, completion_date, deadline_date) IS NOT (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    changed_requests
+                )
+                for number, r in numbers.items():
+                    if number in request_ids and statuses[request_ids[number]] != r.status_id:
+                        record_status_change(conn, request_ids[number], r.status_id)
+                next_id = _next_id(conn, "requests")
+                for offset, (number, _) in enumerate(new_requests):
+                    request_ids[number] = next_id + offset
+                conn.executemany(
+                    """
+                    INSERT INTO requests (id, request_number, creation_date, problem_description, client_id, equipment_id,
+                                          status_id, completion_date, deadline_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    ((request_ids[number], number, r.creation_date, r.problem, self.client_ids[r.client_id],
+                      equipment_ids[equipment_serial(self.number_prefix, r.source_id)], r.status_id, r.completion_date,
+                      r.deadline_date)
+                     for number, r in new_requests)
+                )
+                # Assignments are only added; ones made in the application are kept
+                assignments = [(request_ids[number], self.user_ids[r.master_id])
+                               for number, r in numbers.items() if r.master_id in self.user_ids]
+                assigned = conn.executemany(
+                    "INSERT OR IGNORE INTO request_specialists (request_id, specialist_id) VALUES (?, ?)", assignments
+                ).rowcount
+                save_checkpoint(conn, path, position)
+                return len(new_requests), len(numbers) - len(new_requests), assigned
+
+            created, updated, assigned = run_in_transaction(work, self.db_name)
+            self.request_sources.update(r.source_id for _, r in records)
+            self.report["requests"] += created
+            self.report["updated"]["requests"] += updated
+            self.report["specialists"] += assigned
+
+    def import_comments(self, path, batches, created_at=None):
+        """Adds comments; one with the same request, author and text is not added twice
+        (a repeat within the file is reported as a duplicate)."""
+        # The exports carry no comment time; the import time stands in for it
+        created_at = created_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for batch, position in batches:
+            records = []
+            for number, c in self._valid("comments", batch):
+                key = (c.request_id, c.master_id, c.text)
+                if key in self.comment_keys:
+                    self.skip("comments", number, "duplicate", f"duplicate comment on request {c.request_id}")
+                else:
+                    self.comment_keys.add(key)
+                    records.append((number, c))
+
+            def work(conn):
+                request_ids = lookup_ids(conn, "SELECT request_number, id FROM requests WHERE request_number IN ({placeholders})",
+                                         {f"{self.number_prefix}{c.request_id}" for _, c in records})
+                rows, missing = [], []
+                for number, c in records:
+                    request_id = request_ids.get(f"{self.number_prefix}{c.request_id}")
+                    user_id = self.user_ids.get(c.master_id)
+                    if request_id is None:
+                        missing.append((number, f"request {c.request_id} not found"))
+                    elif user_id is None:
+                        missing.append((number, f"user {c.master_id} not found"))
+                    else:
+                        rows.append((request_id, user_id, c.text, created_at, request_id, user_id, c.text))
+                added = conn.executemany("""
+                    INSERT INTO comments (request_id, user_id, text, created_at)
+                    SELECT ?, ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM comments WHERE request_id = ? AND user_id = ? AND text = ?)
+                """, rows).rowcount
+                save_checkpoint(conn, path, position)
+                return added, missing
+
+            added, missing = run_in_transaction(work, self.db_name)
+            for number, reason in missing:
+                self.skip("comments", number, "orphan", reason)
+            self.report["comments"] += added
+
+    def validate(self, base_dir):
+        """
+        Dry run: streams the dataset through the same parsing and checks as
+        run() and returns the report an import into an empty database would
+        give, without opening the database. Cross-file references (clientID,
+        masterID, requestID) are resolved against in-memory sets of the ids
+        seen in the earlier files. Duplicate users (same userID, login or
+        client phone) are merged by the import, so they are reported as kept.
+        """
+        paths = {kind: dataset_path(base_dir, kind, self.source_format) for kind in DATASET_FILES}
+        for kind in ("users", "requests"):
+            if not paths[kind].exists():
+                raise FileNotFoundError(f"Не найден файл: {paths[kind]}")
+        self.report["dry_run"] = True
+        self.report["files"] = {kind: str(path) for kind, path in paths.items() if path.exists()}
+
+        clients, employees = set(), set()
+        for batch, _ in self.parse_batches("users", open_source(paths["users"])):
+            for number, r in self._valid("users", batch):
+                (clients if r.role_id is None else employees).add(r.source_id)
+                if self._new_user(number, r):
+                    self.report["clients" if r.role_id is None else "users"] += 1
+
+        for batch, _ in self.parse_batches("requests", open_source(paths["requests"])):
+            for number, r in self._valid("requests", batch):
+                if r.client_id not in clients:
+                    self.skip("requests", number, "orphan", f"client {r.client_id} not found")
+                elif r.source_id in self.request_sources:
+                    self.skip("requests", number, "duplicate", f"duplicate request {r.source_id}")
+                else:
+                    self.request_sources.add(r.source_id)
+                    self.report["requests"] += 1
+                    if r.master_id is None:
+                        continue
+                    if r.master_id in employees:
+                        self.report["specialists"] += 1
+                    else:
+                        self.skip("requests", number, "orphan", f"master {r.master_id} not found", kept=True)
+
+        if paths["comments"].exists():
+            for batch, _ in self.parse_batches("comments", open_source(paths["comments"])):
+                for number, c in self._valid("comments", batch):
+                    key = (c.request_id, c.master_id, c.text)
+                    if key in self.comment_keys:
+                        self.skip("comments", number, "duplicate", f"duplicate comment on request {c.request_id}")
+                        continue
+                    self.comment_keys.add(key)
+                    if c.request_id not in self.request_sources:
+                        self.skip("comments", number, "orphan", f"request {c.request_id} not found")
+                    elif c.master_id not in employees:
+                        self.skip("comments", number, "orphan", f"user {c.master_id} not found")
+                    else:
+                        self.report["comments"] += 1
+        return self.report
+
+    def run(self, base_dir):
+        paths = {kind: dataset_path(base_dir, kind, self.source_format) for kind in DATASET_FILES}
+        for kind in ("users", "requests"):
+            if not paths[kind].exists():
+                raise FileNotFoundError(f"Не найден файл: {paths[kind]}")
+
+        print("Importing users and clients...")
+        # Read in full: later files need the id map of every user
+        _, committed = load_checkpoint(paths["users"], self.db_name) if self.resume else (0, 0)
+        if committed:
+            self.report["resumed"]["users"] = committed
+        self.import_users(paths["users"], self.parse_batches("users", open_source(paths["users"])),
+                          update_after=committed)
+        print("Importing requests...")
+        self.import_requests(*self.open("requests", paths["requests"]))
+        if paths["comments"].exists():
+            print("Importing comments...")
+            self.import_comments(*self.open("comments", paths["comments"]))
+        else:
+            print("Comments file not found, skipping.")
+
+        # Requests were inserted directly, so recompute the materialized statistics
+        # and give them a starting status history
+        rebuild_statistics(self.db_name)
+        backfill_status_history(self.db_name)
+        return self.report
+
+def run_import(base_dir=None, db_name=None, reset=True, batch_size=BATCH_SIZE, source_format=None,
+               workers=IMPORT_WORKERS):
+    """
+    Imports the dataset in base_dir (default: $IMPORT_DIR or import_БытСервис).
+    With reset the database is recreated first (seeded accounts are kept).
+    Otherwise the import is incremental: rows are upserted into the existing
+    data and every file resumes from its checkpoint. Returns the import report.
+    """
+    if base_dir is None:
+        base_dir = os.environ.get("IMPORT_DIR", "import_БытСервис")
+    if reset:
+        init_db(db_name)
+    else:
+        migrate(db_name)
+    report = ImportEngine(db_name, batch_size, resume=not reset, source_format=source_format,
+                          workers=workers).run(base_dir)
+    skipped = sum(report["skipped"].values())
+    updated = sum(report["updated"].values())
+    print(f"Import completed: {report['requests']} new requests, {report['comments']} comments, "
+          f"{updated} rows updated, {skipped} rows skipped.")
+    return report
+
+def dry_run(base_dir=None, batch_size=BATCH_SIZE, source_format=None, workers=IMPORT_WORKERS):
+    """Validates the dataset in base_dir without touching any database; returns the report."""
+    if base_dir is None:
+        base_dir = os.environ.get("IMPORT_DIR", "import_БытСервис")
+    return ImportEngine(None, batch_size, source_format=source_format, workers=workers).validate(base_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a users/requests/comments dataset")
+    parser.add_argument("base_dir", nargs="?", default=None, help="dataset folder (default: $IMPORT_DIR or import_БытСервис)")
+    parser.add_argument("--db", default=None, help="database file (default: repair_system.db)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--incremental", action="store_true",
+                        help="upsert into the existing database and resume from the checkpoints instead of recreating it")
+    parser.add_argument("--format", dest="source_format", choices=SOURCE_FORMATS, default=None,
+                        help="source file format (default: the first of csv, txt, xlsx present)")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                        help=f"parser processes (default: $REPAIR_IMPORT_WORKERS or the CPU count, {IMPORT_WORKERS})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only validate the files and print the report as JSON; the database is not opened")
+    args = parser.parse_args()
+    if args.dry_run:
+        json.dump(dry_run(args.base_dir, args.batch_size, args.source_format, args.workers), sys.stdout,
+                  ensure_ascii=False, indent=2)
+        print()
+        sys.exit(0)
+    if args.db:
+        database.DB_NAME = args.db
+    report = run_import(args.base_dir, reset=not args.incremental, batch_size=args.batch_size,
+                        source_format=args.source_format, workers=args.workers)
+    for issue in report["issues"]:
+        print(f"  {issue['file']} row {issue['row']}: {issue['reason']}")
@@ -1,26 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime
-import urllib.request
-import io
-try:
-    import qrcode
-    HAS_QRCODE = True
-except ImportError:
-    HAS_QRCODE = False
-    
-try:
-    from PIL import Image, ImageTk
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
-
-from services import UserService, RequestService, PartService, ImportService, STATUS_NEW, STATUS_REGISTERED, STATUS_IN_PROGRESS, STATUS_WAITING_PARTS, STATUS_COMPLETED, STATUS_OVERDUE
-from stats_module import calculate_statistics
+from datetime import datetime, timedelta
+
+from database import ensure_database
+from services import UserService, RequestService, PartService, ImportService, merge_request_changes, STATUS_NEW, STATUS_REGISTERED, STATUS_IN_PROGRESS, STATUS_WAITING_PARTS, STATUS_COMPLETED, STATUS_OVERDUE
+from overdue_sweeper import OverdueSweeper
+from background import BackgroundRunner
+from virtual_list import VirtualList
 from tkinter import filedialog
 
 # Constants
-FEEDBACK_URL = "https://docs.google.com/forms/d/e/1FAIpQLSdhZcExx6LSIXxk0ub55mSu-WIh23WYdGG9HY5EZhLDo7P8eA/viewform"
+SEARCH_DEBOUNCE_MS = 300  # Pause in typing before the search runs
+LIST_PAGE_SIZE = 200      # Requests fetched per page as the list is scrolled
+CARD_HEIGHT = 170         # Row pitch of the request list: card plus the gap below it
+CARD_GAP = 20
+PROGRESS_DELAY_MS = 300   # Quicker background loads finish without showing the progress bar
+DURATION_REPORT_DAYS = 30 # Completed requests covered by the repair time report
+SYNC_INTERVAL_MS = 3000   # How often the list picks up edits made here or on other workstations
 
 def setup_styles():
     style = ttk.Style()
@@ -112,6 +108,7 @@ class LoginWindow(tk.Tk):
         username = self.username_entry.get()
         password = self.password_entry.get()
         
+        ensure_database()
         user = UserService.login(username, password)
         if user:
             self.destroy()
@@ -172,6 +169,7 @@ class RegistrationDialog(tk.Toplevel):
             messagebox.showerror("Ошибка", "Заполните все поля")
             return
 
+        ensure_database()
         if UserService.create_user(u, p, n, role_map[r]):
             messagebox.showinfo("Успех", "Пользователь зарегистрирован")
             self.destroy()
@@ -179,6 +177,109 @@ class RegistrationDialog(tk.Toplevel):
             messagebox.showerror("Ошибка", "Не удалось создать пользователя (возможно, логин занят)")
 
 
+# Status Display Logic
+STATUS_COLORS = {
+    "New": "#DC3545",       # Red
+    "Registered": "#0DCAF0",# Cyan
+    "In Progress": "#FFC107",# Yellow
+    "Waiting for Parts": "#FD7E14", # Orange
+    "Completed": "#198754", # Green
+    "Overdue": "#212529"    # Black
+}
+STATUS_RUS = {
+    "New": "Новая заявка",
+    "Registered": "Зарегистрирована",
+    "In Progress": "В процессе ремонта",
+    "Waiting for Parts": "Ожидание запчастей",
+    "Completed": "Выполнена",
+    "Overdue": "Просрочена"
+}
+
+
+class RequestCard(ttk.Frame):
+    """
+    One request in the MainApp list. The widgets are built once; the request
+    list reuses a card for another request by calling show() again.
+    """
+
+    def __init__(self, master, app):
+        super().__init__(master, style="Card.TFrame", padding=20)
+        self.app = app
+        self.req = None
+        
+        # Grid Layout for Card
+        self.columnconfigure(1, weight=1)
+        
+        # Header Row: ID + Status Dot
+        header_frame = ttk.Frame(self, style="Card.TFrame")
+        header_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.id_lbl = ttk.Label(header_frame, style="CardHeader.TLabel")
+        self.id_lbl.pack(side=tk.LEFT)
+        
+        # Status Dot
+        self.dot = tk.Label(header_frame, text="●", bg="#FFFFFF", font=("Arial", 16))
+        self.dot.pack(side=tk.LEFT, padx=5)
+        
+        # Help Needed Badge (packed only for requests that need help)
+        self.help_lbl = tk.Label(header_frame, text=" SOS ", fg="white", bg="#DC3545", font=("Segoe UI", 8, "bold"))
+        
+        # Content Row
+        content_frame = ttk.Frame(self, style="Card.TFrame")
+        content_frame.pack(fill=tk.X)
+        
+        # Left Column (Client & Equipment)
+        left_col = ttk.Frame(content_frame, style="Card.TFrame")
+        left_col.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.client_lbl = ttk.Label(left_col, style="Card.TLabel")
+        self.client_lbl.pack(anchor="w", pady=2)
+        self.equipment_lbl = ttk.Label(left_col, style="CardSub.TLabel")
+        self.equipment_lbl.pack(anchor="w", pady=2)
+        
+        # Right Column (Status & Specialist & Date)
+        right_col = ttk.Frame(content_frame, style="Card.TFrame")
+        right_col.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.status_lbl = ttk.Label(right_col, style="Card.TLabel")
+        self.status_lbl.pack(anchor="w", pady=2)
+        self.specialists_lbl = ttk.Label(right_col, style="CardSub.TLabel")
+        self.specialists_lbl.pack(anchor="w", pady=2)
+        self.date_lbl = ttk.Label(right_col, style="CardSub.TLabel")
+        self.date_lbl.pack(anchor="w", pady=2)
+        
+        # Action Buttons Column
+        action_col = ttk.Frame(content_frame, style="Card.TFrame")
+        action_col.pack(side=tk.RIGHT)
+        
+        ttk.Button(action_col, text="👁️ Подробнее", style="Outline.TButton", command=self.open_details).pack(pady=2, fill=tk.X)
+        if app.user.role_name in ['Operator', 'Administrator', 'Manager']:
+             ttk.Button(action_col, text="✏️ Редактировать", style="Outline.TButton", command=self.open_details).pack(pady=2, fill=tk.X)
+
+    def show(self, req):
+        self.req = req
+        self.id_lbl.configure(text=req.request_number)
+        self.dot.configure(fg=STATUS_COLORS.get(req.status_name, "#6C757D"))
+        if req.help_needed:
+            self.help_lbl.pack(side=tk.LEFT, padx=5)
+        else:
+            self.help_lbl.pack_forget()
+        
+        self.client_lbl.configure(text=f"👤 {req.client_name} | 📞 {req.client_phone}")
+        self.equipment_lbl.configure(text=f"🔧 {req.equipment_model}")
+        self.status_lbl.configure(text=f"Статус: {STATUS_RUS.get(req.status_name, req.status_name)}")
+        
+        spec_text = "Не назначен"
+        if req.assigned_specialists:
+            spec_text = ", ".join(req.assigned_specialists)
+        self.specialists_lbl.configure(text=f"👨‍🔧 {spec_text}")
+        self.date_lbl.configure(text=f"📅 {req.creation_date}")
+
+    def open_details(self):
+        if self.req is not None:
+            self.app.open_details(self.req.id)
+
+
 class MainApp(tk.Tk):
     def __init__(self, user):
         super().__init__()
@@ -187,8 +288,21 @@ class MainApp(tk.Tk):
         self.geometry("1200x800")
         self.configure(bg="#F8F9FA")
         
+        # Data is loaded in the background; a newer load replaces the one in flight
+        self.tasks = BackgroundRunner(self, on_busy=self.on_tasks_changed)
+        self.progress_job = None
+        self.search_job = None
+        self.search_text = ""
+        # Change feed position of the listing; None until the first load
+        self.sync_token = None
+        
         self.create_layout()
         self.load_data()
+        self.sync_job = self.after(SYNC_INTERVAL_MS, self.poll_changes)
+        
+        # Keeps "Просрочена" current while the app is open
+        self.sweeper = OverdueSweeper()
+        self.sweeper.start()
 
     def create_layout(self):
         # Main Container (Sidebar + Content)
@@ -218,6 +332,8 @@ class MainApp(tk.Tk):
         
         if self.user.role_name in ['Administrator', 'Manager']:
             self.create_nav_btn(nav_frame, "📊 Статистика", self.show_statistics)
+            self.create_nav_btn(nav_frame, "⏱ Время ремонта", self.show_durations)
+            self.create_nav_btn(nav_frame, "🖨 QR-коды за день", self.export_qr_sheets)
             
         if self.user.role_name == 'Administrator':
             self.create_nav_btn(nav_frame, "👥 Управление пользователями", self.manage_users)
@@ -238,6 +354,15 @@ class MainApp(tk.Tk):
         
         ttk.Label(header_frame, text="Управление заявками", style="Header.TLabel").pack(side=tk.LEFT)
         
+        # Progress of background loads (packed by show_progress)
+        self.progress_frame = ttk.Frame(header_frame)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="indeterminate", length=120)
+        self.progress_bar.pack(side=tk.LEFT)
+        self.progress_label = ttk.Label(self.progress_frame, font=("Segoe UI", 9), foreground="#6C757D")
+        self.progress_label.pack(side=tk.LEFT, padx=(8, 0))
+        # Shown while the change feed cannot be read (packed by sync_failed)
+        self.sync_error_label = ttk.Label(header_frame, font=("Segoe UI", 9), foreground="#DC3545")
+        
         if self.user.role_name in ['Operator', 'Administrator']:
             ttk.Button(header_frame, text="+ Создать новую заявку", command=self.new_request, style="Create.TButton").pack(side=tk.RIGHT)
             
@@ -253,31 +378,23 @@ class MainApp(tk.Tk):
         self.status_filter.bind("<<ComboboxSelected>>", lambda e: self.load_data())
         
         # Search
-        ttk.Label(filter_frame, text="Поиск по номеру:", font=("Segoe UI", 9, "bold"), foreground="#6C757D").pack(anchor="w", pady=(10, 0))
+        ttk.Label(filter_frame, text="Поиск (номер, телефон, серийный номер или текст):", font=("Segoe UI", 9, "bold"), foreground="#6C757D").pack(anchor="w", pady=(10, 0))
         self.search_entry = ttk.Entry(filter_frame, font=("Segoe UI", 10))
         self.search_entry.pack(fill=tk.X, pady=(5, 0))
-        self.search_entry.bind('<KeyRelease>', lambda e: self.load_data())
+        self.search_entry.bind('<KeyRelease>', self.on_search_changed)
         
         # Request List Area (Scrollable)
         ttk.Label(content, text="Список заявок:", font=("Segoe UI", 11, "bold")).pack(anchor="w", pady=(10, 10))
         
-        self.canvas = tk.Canvas(content, bg="#F8F9FA", highlightthickness=0)
-        scrollbar = ttk.Scrollbar(content, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
-        
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        # Only the cards in view exist; they are refilled as the list scrolls,
+        # and the next page is fetched when the end comes into view
+        self.next_page_token = None
+        self.request_list = VirtualList(
+            content, create_row=lambda master: RequestCard(master, self),
+            bind_row=lambda card, req: card.show(req),
+            row_height=CARD_HEIGHT, gap=CARD_GAP, on_near_end=self.load_more, background="#F8F9FA"
         )
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw", width=880) # Width adjustment needed on resize
-        self.canvas.configure(yscrollcommand=scrollbar.set)
-        
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # Bind resize to adjust inner frame width
-        self.canvas.bind('<Configure>', self.on_canvas_configure)
+        self.request_list.pack(fill=tk.BOTH, expand=True)
         
         # Mousewheel scrolling
         self.bind_all("<MouseWheel>", self._on_mousewheel)
@@ -286,17 +403,42 @@ class MainApp(tk.Tk):
         btn = ttk.Button(parent, text=text, command=command, style="Sidebar.TButton")
         btn.pack(fill=tk.X, padx=10, pady=2)
 
-    def on_canvas_configure(self, event):
-        self.canvas.itemconfig(self.canvas.find_withtag("all")[0], width=event.width)
+    def on_tasks_changed(self, labels):
+        if labels:
+            self.progress_label.configure(text=labels[-1])
+            if self.progress_job is None and not self.progress_frame.winfo_ismapped():
+                self.progress_job = self.after(PROGRESS_DELAY_MS, self.show_progress)
+            return
+        if self.progress_job:
+            self.after_cancel(self.progress_job)
+            self.progress_job = None
+        self.progress_bar.stop()
+        self.progress_frame.pack_forget()
+
+    def show_progress(self):
+        self.progress_job = None
+        self.progress_frame.pack(side=tk.LEFT, padx=20)
+        self.progress_bar.start(15)
 
     def _on_mousewheel(self, event):
-        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self.request_list.scroll_units(int(-1*(event.delta/120)) * 3)
 
-    def load_data(self):
-        # Clear existing cards
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-            
+    def on_search_changed(self, event=None):
+        # Debounced: only the text left after a pause in typing is searched
+        text = self.search_entry.get().strip()
+        if text == self.search_text:
+            return  # Cursor keys, Shift etc.
+        self.search_text = text
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        self.load_data()
+
+    def list_filters(self):
+        """(role, user id, status id, search text) for the request listing."""
         status_map = {
             "Новая": STATUS_NEW,
             "Зарегистрирована": STATUS_REGISTERED,
@@ -307,105 +449,103 @@ class MainApp(tk.Tk):
         }
         
         filter_val = self.status_filter.get()
-        status_id = status_map.get(filter_val)
-        
-        requests = RequestService.get_requests(self.user.role_name, self.user.id, status_id)
-        
-        # Filter by Search
-        search_query = self.search_entry.get().lower().strip()
-        if search_query:
-            requests = [r for r in requests if search_query in r.request_number.lower()]
-            
-        print(f"Loaded {len(requests)} requests")
-        
-        if not requests:
-            ttk.Label(self.scrollable_frame, text="Заявок не найдено", font=("Segoe UI", 12), foreground="#6C757D").pack(pady=20)
+        search_query = self.search_entry.get().strip()
+        return self.user.role_name, self.user.id, status_map.get(filter_val), search_query or None
+
+    def load_data(self, page_size=LIST_PAGE_SIZE, keep_position=False):
+        if self.search_job:
+            # This load already uses the latest text
+            self.after_cancel(self.search_job)
+            self.search_job = None
+        self.search_text = self.search_entry.get().strip()
+        role, user_id, status_id, search = self.list_filters()
+        
+        # Replaces any listing fetch in flight, including a "load more" or a sync
+        self.tasks.cancel("more_requests")
+        self.tasks.cancel("sync")
+        self.tasks.submit(
+            "requests",
+            # The token is taken first, so changes made while the page loads are synced again
+            lambda: (RequestService.get_sync_token(),
+                     RequestService.get_requests_page(role, user_id, status_id, page_size=page_size, search=search)),
+            lambda result: self.show_requests(*result, keep_position),
+            lambda error: messagebox.showerror("Ошибка", f"Не удалось загрузить заявки: {error}"),
+            label="Загрузка заявок..."
+        )
+
+    def load_more(self):
+        # Called by the list when its last card comes into view
+        if not self.next_page_token or self.tasks.busy("requests") or self.tasks.busy("more_requests"):
             return
-            
-        for req in requests:
-            self.create_request_card(req)
-
-    def create_request_card(self, req):
-        # Status Display Logic
-        status_colors = {
-            "New": "#DC3545",       # Red
-            "Registered": "#0DCAF0",# Cyan
-            "In Progress": "#FFC107",# Yellow
-            "Waiting for Parts": "#FD7E14", # Orange
-            "Completed": "#198754", # Green
-            "Overdue": "#212529"    # Black
-        }
-        status_rus = {
-            "New": "Новая заявка",
-            "Registered": "Зарегистрирована",
-            "In Progress": "В процессе ремонта",
-            "Waiting for Parts": "Ожидание запчастей",
-            "Completed": "Выполнена",
-            "Overdue": "Просрочена"
-        }
-        
-        color = status_colors.get(req.status_name, "#6C757D")
-        display_status = status_rus.get(req.status_name, req.status_name)
-        
-        # Card Frame
-        card = ttk.Frame(self.scrollable_frame, style="Card.TFrame", padding=20)
-        card.pack(fill=tk.X, pady=10, padx=5)
-        
-        # Grid Layout for Card
-        card.columnconfigure(1, weight=1)
-        
-        # Header Row: ID + Status Dot
-        header_frame = ttk.Frame(card, style="Card.TFrame")
-        header_frame.pack(fill=tk.X, pady=(0, 10))
-        
-        id_lbl = ttk.Label(header_frame, text=f"REQ-{datetime.now().year}-{req.id:04d}", style="CardHeader.TLabel") # Mock ID format
-        id_lbl.pack(side=tk.LEFT)
-        
-        # Status Dot
-        dot = tk.Label(header_frame, text="●", fg=color, bg="#FFFFFF", font=("Arial", 16))
-        dot.pack(side=tk.LEFT, padx=5)
-        
-        # Help Needed Badge
-        if req.help_needed:
-            help_lbl = tk.Label(header_frame, text=" SOS ", fg="white", bg="#DC3545", font=("Segoe UI", 8, "bold"))
-            help_lbl.pack(side=tk.LEFT, padx=5)
-        
-        # Content Row
-        content_frame = ttk.Frame(card, style="Card.TFrame")
-        content_frame.pack(fill=tk.X)
-        
-        # Left Column (Client & Equipment)
-        left_col = ttk.Frame(content_frame, style="Card.TFrame")
-        left_col.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        ttk.Label(left_col, text=f"👤 {req.client_name} | 📞 {req.client_phone}", style="Card.TLabel").pack(anchor="w", pady=2)
-        ttk.Label(left_col, text=f"🔧 {req.equipment_model}", style="CardSub.TLabel").pack(anchor="w", pady=2)
-        
-        # Right Column (Status & Specialist & Date)
-        right_col = ttk.Frame(content_frame, style="Card.TFrame")
-        right_col.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        ttk.Label(right_col, text=f"Статус: {display_status}", style="Card.TLabel").pack(anchor="w", pady=2)
-        
-        spec_text = "Не назначен"
-        if req.assigned_specialists:
-            spec_text = ", ".join(req.assigned_specialists)
-        ttk.Label(right_col, text=f"👨‍🔧 {spec_text}", style="CardSub.TLabel").pack(anchor="w", pady=2)
-        
-        ttk.Label(right_col, text=f"📅 {req.creation_date}", style="CardSub.TLabel").pack(anchor="w", pady=2)
-        
-        # Action Buttons Column
-        action_col = ttk.Frame(content_frame, style="Card.TFrame")
-        action_col.pack(side=tk.RIGHT)
-        
-        ttk.Button(action_col, text="👁️ Подробнее", style="Outline.TButton", command=lambda: self.open_details(req.id)).pack(pady=2, fill=tk.X)
-        if self.user.role_name in ['Operator', 'Administrator', 'Manager']:
-             ttk.Button(action_col, text="✏️ Редактировать", style="Outline.TButton", command=lambda: self.open_details(req.id)).pack(pady=2, fill=tk.X)
+        role, user_id, status_id, search = self.list_filters()
+        token = self.next_page_token
+        self.tasks.submit(
+            "more_requests",
+            lambda: RequestService.get_requests_page(role, user_id, status_id, page_token=token, page_size=LIST_PAGE_SIZE, search=search),
+            self.append_requests,
+            lambda error: messagebox.showerror("Ошибка", f"Не удалось загрузить заявки: {error}"),
+            label="Загрузка заявок..."
+        )
+
+    def show_requests(self, sync_token, page, keep_position=False):
+        self.sync_token = sync_token
+        self.next_page_token = page.next_page_token
+        print(f"Loaded {len(page.items)} requests")
+        self.request_list.set_items(page.items, keep_position)
+        if not page.items:
+            self.request_list.show_empty("Заявок не найдено", font=("Segoe UI", 12), foreground="#6C757D")
+
+    def append_requests(self, page):
+        self.next_page_token = page.next_page_token
+        self.request_list.append_items(page.items)
+
+    def reload_page(self):
+        # Refresh the requests already loaded without jumping back to the top
+        self.load_data(max(LIST_PAGE_SIZE, len(self.request_list.items)), keep_position=True)
+
+    def poll_changes(self):
+        self.sync_job = self.after(SYNC_INTERVAL_MS, self.poll_changes)
+        self.sync_now()
+
+    def sync_now(self):
+        """Patches the list with the requests changed since the last load or sync."""
+        if self.sync_token is None or self.tasks.busy("requests") or self.tasks.busy("more_requests"):
+            return  # The load in flight brings fresh rows
+        role, user_id, status_id, search = self.list_filters()
+        token = self.sync_token
+        self.tasks.submit(
+            "sync",
+            lambda: RequestService.get_changes(token, role, user_id, status_id, search),
+            self.apply_changes,
+            self.sync_failed
+        )
+
+    def sync_failed(self, error):
+        # Reported once; the poll keeps retrying quietly until a sync succeeds
+        if not self.sync_error_label.winfo_ismapped():
+            self.sync_error_label.configure(text=f"Нет связи с базой данных, список не обновляется: {error}")
+            self.sync_error_label.pack(side=tk.LEFT, padx=20)
+
+    def apply_changes(self, changes):
+        self.sync_error_label.pack_forget()
+        if changes.full_reload:
+            self.reload_page()
+            return
+        self.sync_token = changes.sync_token
+        if not changes.items and not changes.removed_ids:
+            return
+        items = merge_request_changes(self.request_list.items, changes, complete=self.next_page_token is None)
+        self.request_list.set_items(items, keep_position=True)
+        if not items:
+            self.request_list.show_empty("Заявок не найдено", font=("Segoe UI", 12), foreground="#6C757D")
 
     def open_details(self, req_id):
         RequestDetailDialog(self, req_id, self.user)
 
     def logout(self):
+        self.sweeper.stop()
+        self.after_cancel(self.sync_job)
+        self.tasks.close()
         self.destroy()
         LoginWindow().mainloop()
 
@@ -413,14 +553,49 @@ class MainApp(tk.Tk):
         NewRequestDialog(self)
 
     def show_statistics(self):
+        self.tasks.submit(
+            "statistics", self.statistics_message,
+            lambda msg: messagebox.showinfo("Статистика", msg),
+            lambda error: messagebox.showerror("Ошибка", f"Не удалось рассчитать статистику: {error}"),
+            label="Расчет статистики..."
+        )
+
+    @staticmethod
+    def statistics_message():
+        # Runs on a worker thread: no Tk calls here
+        from stats_module import calculate_statistics
         stats = calculate_statistics()
         msg = f"Выполнено заявок: {stats['completed_count']}\n"
-        msg += f"Среднее время ремонта: {stats['average_days']} дней\n\n"
+        msg += f"Среднее время ремонта: {stats['average_days']} дней\n"
+        msg += "\n"
         msg += "По типам неисправностей:\n"
         for problem, count in stats['problem_types'].items():
             msg += f"- {problem}: {count}\n"
-        
-        messagebox.showinfo("Статистика", msg)
+        return msg
+
+    def show_durations(self):
+        self.tasks.submit(
+            "durations", self.durations_message,
+            lambda msg: messagebox.showinfo("Время ремонта", msg),
+            lambda error: messagebox.showerror("Ошибка", f"Не удалось рассчитать время ремонта: {error}"),
+            label="Расчет времени ремонта..."
+        )
+
+    @staticmethod
+    def durations_message():
+        # Runs on a worker thread: no Tk calls here. Reads one row per request
+        # completed in the window, unlike the materialized statistics
+        from stats_module import duration_distribution, load_durations
+        date_from = datetime.now() - timedelta(days=DURATION_REPORT_DAYS)
+        durations = duration_distribution(load_durations(date_from=date_from)[1])
+        msg = f"Заявки, выполненные за {DURATION_REPORT_DAYS} дней: {durations['count']}\n"
+        if durations["count"]:
+            p = durations["percentiles"]
+            msg += f"Время ремонта (ч): среднее {durations['mean_hours']}, медиана {p[50]}, p90 {p[90]}, p99 {p[99]}\n\n"
+            msg += "Распределение (ч):\n"
+            for low, high, count in durations["histogram"]:
+                msg += f"- {low}–{high}: {count}\n" if high is not None else f"- от {low}: {count}\n"
+        return msg
         
     def manage_users(self):
         UserManagementDialog(self)
@@ -428,11 +603,44 @@ class MainApp(tk.Tk):
     def import_users(self):
         filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
         if filename:
-            success, msg = ImportService.import_users_from_csv(filename)
-            if success:
-                messagebox.showinfo("Импорт", msg)
-            else:
-                messagebox.showerror("Ошибка импорта", msg)
+            self.tasks.submit(
+                "import_users", lambda: ImportService.import_users_from_csv(filename),
+                self.show_import_result, label="Импорт пользователей...", interruptible=False
+            )
+
+    def export_qr_sheets(self):
+        import qr_codes
+        if not (qr_codes.HAS_QRCODE and qr_codes.HAS_PIL):
+            messagebox.showwarning("Внимание", "Для печати QR-кодов нужны библиотеки qrcode и Pillow.")
+            return
+        output_dir = filedialog.askdirectory(title="Папка для листов с QR-кодами")
+        if output_dir:
+            self.tasks.submit(
+                "export_qr", lambda: self.render_qr_sheets(output_dir), self.show_qr_export_result,
+                lambda error: messagebox.showerror("Ошибка", f"Не удалось подготовить QR-коды: {error}"),
+                label="Подготовка QR-кодов...", interruptible=False
+            )
+
+    @staticmethod
+    def render_qr_sheets(output_dir):
+        # Runs on a worker thread: no Tk calls here
+        import qr_codes
+        numbers = qr_codes.completed_request_numbers(datetime.now().date())
+        return output_dir, len(numbers), qr_codes.export_sheets(output_dir, numbers)
+
+    def show_qr_export_result(self, result):
+        output_dir, count, sheets = result
+        if count:
+            messagebox.showinfo("QR-коды", f"QR-коды для {count} выполненных заявок сохранены на {len(sheets)} лист(ах) в папке {output_dir}")
+        else:
+            messagebox.showinfo("QR-коды", "Сегодня нет выполненных заявок")
+
+    def show_import_result(self, result):
+        success, msg = result
+        if success:
+            messagebox.showinfo("Импорт", msg)
+        else:
+            messagebox.showerror("Ошибка импорта", msg)
 
 class NewRequestDialog(tk.Toplevel):
     def __init__(self, parent):
@@ -494,7 +702,7 @@ class NewRequestDialog(tk.Toplevel):
         req_num = RequestService.create_request((name, phone), (serial, model, eq_type), problem)
         if req_num:
             messagebox.showinfo("Успех", f"Заявка {req_num} создана!")
-            self.parent.load_data()
+            self.parent.sync_now()
             self.destroy()
         else:
             messagebox.showerror("Ошибка", "Не удалось создать заявку")
@@ -508,12 +716,22 @@ class RequestDetailDialog(tk.Toplevel):
         self.title(f"Детали заявки #{request_id}")
         self.geometry("600x600")
         
+        self.tasks = BackgroundRunner(self)
+        self.request = None
+        self.loading_label = ttk.Label(self, text="Загрузка...", foreground="#6C757D")
+        self.loading_label.pack(pady=20)
         self.load_request_data()
-        self.create_widgets()
         
     def load_request_data(self):
-        requests = RequestService.get_requests("Admin", self.user.id) # Admin sees all
-        self.request = next((r for r in requests if str(r.id) == str(self.request_id)), None)
+        self.tasks.submit(
+            "request", lambda: RequestService.get_request(self.request_id), self.show_request,
+            lambda error: self.loading_label.configure(text=f"Не удалось загрузить заявку: {error}")
+        )
+
+    def show_request(self, request):
+        self.loading_label.destroy()
+        self.request = request
+        self.create_widgets()
         
     def create_widgets(self):
         if not self.request:
@@ -590,7 +808,7 @@ class RequestDetailDialog(tk.Toplevel):
         
         self.parts_list = tk.Listbox(parts_frame, height=3, font=("Segoe UI", 10), borderwidth=1, relief="solid")
         self.parts_list.pack(fill=tk.X, side=tk.LEFT, expand=True)
-        self.load_parts()
+        self.load_parts(self.request.parts)
         
         if self.user.role_name in ['Specialist', 'Administrator']:
             ttk.Button(parts_frame, text="+", command=self.add_part_dialog, width=3, style="TButton").pack(side=tk.LEFT, padx=5)
@@ -601,7 +819,7 @@ class RequestDetailDialog(tk.Toplevel):
         
         self.comment_list = tk.Listbox(comment_frame, height=5, font=("Segoe UI", 10), borderwidth=1, relief="solid")
         self.comment_list.pack(fill=tk.BOTH, expand=True)
-        self.load_comments()
+        self.load_comments(self.request.comments)
         
         # Add Comment
         add_comment_frame = ttk.Frame(comment_frame)
@@ -610,15 +828,21 @@ class RequestDetailDialog(tk.Toplevel):
         self.new_comment_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
         ttk.Button(add_comment_frame, text="Добавить", command=self.add_comment, style="TButton").pack(side=tk.LEFT, padx=(5, 0))
 
-    def load_comments(self):
+    def load_comments(self, comments=None):
+        if comments is None:
+            request_id = self.request.id
+            self.tasks.submit("comments", lambda: RequestService.get_comments(request_id), self.load_comments)
+            return
         self.comment_list.delete(0, tk.END)
-        comments = RequestService.get_comments(self.request.id)
         for c in comments:
             self.comment_list.insert(tk.END, f"{c.created_at} - {c.user_name}: {c.text}")
 
-    def load_parts(self):
+    def load_parts(self, parts=None):
+        if parts is None:
+            request_id = self.request.id
+            self.tasks.submit("parts", lambda: PartService.get_parts_for_request(request_id), self.load_parts)
+            return
         self.parts_list.delete(0, tk.END)
-        parts = PartService.get_parts_for_request(self.request.id)
         for p in parts:
             self.parts_list.insert(tk.END, f"{p.name} (x{p.quantity_used}) - {p.price * p.quantity_used} руб.")
 
@@ -686,9 +910,9 @@ class RequestDetailDialog(tk.Toplevel):
         }
         new_id = status_map.get(new_status_name)
         if new_id:
-            RequestService.update_status(self.request.id, new_id)
+            RequestService.update_status(self.request.id, new_id, self.user.id)
             messagebox.showinfo("Успех", "Статус обновлен")
-            self.parent.load_data()
+            self.parent.sync_now()
             self.destroy() # Close to refresh or reload data
             
     def assign_specialist_dialog(self):
@@ -714,9 +938,9 @@ class RequestDetailDialog(tk.Toplevel):
             if sel:
                 spec_str = lb.get(sel[0])
                 spec_id = int(spec_str.split(' - ')[0])
-                RequestService.assign_specialist(self.request.id, spec_id)
+                RequestService.assign_specialist(self.request.id, spec_id, self.user.id)
                 messagebox.showinfo("Успех", "Специалист назначен")
-                self.parent.load_data()
+                self.parent.sync_now()
                 dialog.destroy()
                 
         ttk.Button(frame, text="Назначить", command=do_assign, style="TButton").pack(fill=tk.X, pady=5)
@@ -726,7 +950,7 @@ class RequestDetailDialog(tk.Toplevel):
         if days:
             RequestService.extend_deadline(self.request.id, days)
             messagebox.showinfo("Успех", "Срок продлен")
-            self.parent.load_data()
+            self.parent.sync_now()
             self.destroy()
 
     def toggle_help(self, force_off=False):
@@ -736,36 +960,25 @@ class RequestDetailDialog(tk.Toplevel):
             msg = "Помощь запрошена" if new_state else "Запрос помощи отменен"
             if force_off: msg = "Помощь отмечена как оказанная"
             messagebox.showinfo("Успех", msg)
-            self.parent.load_data()
+            self.parent.sync_now()
             self.destroy()
         else:
             messagebox.showerror("Ошибка", "Не удалось изменить статус помощи")
 
     def show_qr(self):
-        data = f"{FEEDBACK_URL}?request_id={self.request.request_number}"
-        
-        if not HAS_PIL:
-            messagebox.showwarning("Внимание", "Библиотека PIL (Pillow) не установлена. QR-код не может быть отображен.")
+        # Imported the first time a QR code is shown
+        import qr_codes
+        if not qr_codes.HAS_QRCODE:
+            messagebox.showwarning("Внимание", "Библиотека qrcode не установлена. QR-код не может быть отображен.")
             return
 
         try:
-            # Local generation using qrcode library
-            qr = qrcode.QRCode(box_size=10, border=4)
-            qr.add_data(data)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to PhotoImage
-            bio = io.BytesIO()
-            img.save(bio, format="PNG")
-            bio.seek(0)
-            
-            image = Image.open(bio)
-            photo = ImageTk.PhotoImage(image)
+            matrix = qr_codes.qr_cache.matrix(self.request.request_number)
             
             qr_win = tk.Toplevel(self)
             qr_win.title("QR-код для отзыва")
             qr_win.geometry("350x400")
+            photo = qr_codes.photo_image(matrix, master=qr_win)
             
             frame = ttk.Frame(qr_win, padding=20)
             frame.pack(fill=tk.BOTH, expand=True)
@@ -1,11 +1,6 @@
 from interface import LoginWindow
-from database import init_db
-import os
 
 if __name__ == "__main__":
-    # Ensure DB exists
-    if not os.path.exists("repair_system.db"):
-        init_db()
-        
+    # The database is created on the first login or registration, not before the window shows
     app = LoginWindow()
     app.mainloop()
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 @dataclass
@@ -46,6 +46,27 @@ class Request:
     deadline_date: Optional[str] = None
     help_needed: bool = False
     assigned_specialists: Optional[list] = None # List of specialist names or IDs
+    parts: Optional[list] = None # List of Part, loaded by RequestService.get_request
+    comments: Optional[list] = None # List of Comment, loaded by RequestService.get_request
+
+@dataclass
+class RequestPage:
+    items: list
+    next_page_token: Optional[str] = None  # None on the last page
+    prev_page_token: Optional[str] = None  # None on the first page
+
+@dataclass
+class RequestChanges:
+    sync_token: int  # Pass to the next get_changes call
+    items: list = field(default_factory=list)  # Changed requests that match the listing filters
+    removed_ids: list = field(default_factory=list)  # Changed requests that left the listing (or were deleted)
+    full_reload: bool = False  # Too many changes to patch; reload the listing instead
+
+@dataclass
+class BulkCreateResult:
+    index: int  # Position in the input batch
+    request_number: Optional[str] = None  # Set when the request was created
+    error: Optional[str] = None
 
 @dataclass
 class Comment:
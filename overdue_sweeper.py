@@ -0,0 +1,78 @@
+"""
+Background job that moves requests past their deadline into STATUS_OVERDUE.
+
+In-process:
+    sweeper = OverdueSweeper(interval=60)
+    sweeper.start()
+    ...
+    sweeper.stop()
+
+As a daemon (one per site is enough; extra sweepers are harmless):
+    python overdue_sweeper.py --interval 60 [--db repair_system.db] [--once]
+"""
+import argparse
+import os
+import threading
+
+import database
+from services import RequestService
+
+# Seconds between sweeps; the deadline granularity is one day, so a minute is plenty
+SWEEP_INTERVAL_SECONDS = float(os.environ.get("REPAIR_OVERDUE_SWEEP_SECONDS", "60"))
+
+class OverdueSweeper:
+    """
+    Runs RequestService.mark_overdue every `interval` seconds on a daemon
+    thread. on_sweep, if given, is called from that thread with the ids of
+    the requests each sweep marked (only when there are any).
+    """
+
+    def __init__(self, interval=None, on_sweep=None):
+        self.interval = SWEEP_INTERVAL_SECONDS if interval is None else interval
+        self.on_sweep = on_sweep
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self):
+        marked = RequestService.mark_overdue()
+        if marked and self.on_sweep:
+            self.on_sweep(marked)
+        return marked
+
+    def run(self):
+        while not self._stop.is_set():
+            self.sweep()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="overdue-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mark requests past their deadline as overdue")
+    parser.add_argument("--interval", type=float, default=SWEEP_INTERVAL_SECONDS, help="seconds between sweeps")
+    parser.add_argument("--db", default=None, help="database file (default: repair_system.db)")
+    parser.add_argument("--once", action="store_true", help="run a single sweep and exit")
+    args = parser.parse_args()
+    if args.db:
+        database.DB_NAME = args.db
+
+    sweeper = OverdueSweeper(args.interval, on_sweep=lambda ids: print(f"Marked overdue: {len(ids)} request(s)"))
+    try:
+        if args.once:
+            sweeper.sweep()
+        else:
+            sweeper.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        database.close_all()
@@ -0,0 +1,244 @@
+"""
+Feedback QR codes: rendering, caching and printable sheets.
+
+A code encodes feedback_url(request_number), the feedback form with the
+request number attached. Building the module matrix (choosing the version
+and the mask pattern) is the slow part, so matrices are cached by
+(FEEDBACK_URL, request number): the most recently used ones in memory and
+all of them on disk under CACHE_DIR. The cache files are named after a hash
+of the key, so a new FEEDBACK_URL never serves a stale code.
+
+Images are drawn straight from the matrix, one pixel per module scaled up:
+a Tk PhotoImage zoomed by Tk for the request dialog, a PIL image for the
+sheets. Nothing is encoded to PNG and decoded back.
+
+    photo = photo_image(qr_cache.matrix(request.request_number), master=window)
+
+export_sheets() lays the codes out SHEET_COLUMNS x SHEET_ROWS per A4 page
+and renders the pages in a pool of processes.
+
+qrcode is needed for new codes and Pillow for the sheets; both are imported
+on first use.
+
+Run: python qr_codes.py [output_dir] [--db repair_system.db] [--date YYYY-MM-DD | --all]
+                        [--workers N] [--cache-dir qr_cache]
+"""
+import argparse
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from database import connection
+
+FEEDBACK_URL = "https://docs.google.com/forms/d/e/1FAIpQLSdhZcExx6LSIXxk0ub55mSu-WIh23WYdGG9HY5EZhLDo7P8eA/viewform"
+
+HAS_QRCODE = importlib.util.find_spec("qrcode") is not None
+HAS_PIL = importlib.util.find_spec("PIL") is not None
+
+CACHE_DIR = "qr_cache"
+MEMORY_CACHE_SIZE = 256  # Matrices kept in memory
+BORDER = 4               # Quiet zone, in modules
+BOX_SIZE = 10            # Pixels per module in the request dialog
+
+SHEET_SIZE = (1240, 1754)  # A4 at 150 dpi
+SHEET_DPI = 150
+SHEET_MARGIN = 60
+SHEET_COLUMNS = 4
+SHEET_ROWS = 5
+LABEL_HEIGHT = 30          # Room under each code for its request number
+QR_WORKERS = int(os.environ.get("REPAIR_QR_WORKERS", os.cpu_count() or 1))
+
+_PIXELS = bytes.maketrans(b"01", b"\xff\x00")  # Matrix text -> 8-bit grayscale
+
+def feedback_url(request_number, base_url=FEEDBACK_URL):
+    return f"{base_url}?request_id={request_number}"
+
+def encode_matrix(data):
+    """Module matrix of the QR code for data, quiet zone included, as '0'/'1' rows."""
+    import qrcode
+    qr = qrcode.QRCode(border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple("".join("1" if dark else "0" for dark in row) for row in qr.get_matrix())
+
+class QRCache:
+    """
+    Matrices of feedback codes by (base_url, request_number): the `size`
+    most recently used in memory, every one on disk under cache_dir (None
+    keeps the memory cache only). The disk cache can be shared between
+    processes; it is best effort, so an unwritable directory only costs
+    the re-encoding. Thread-safe.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, size=MEMORY_CACHE_SIZE, encode=encode_matrix):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.encode = encode
+        self.stats = {"memory": 0, "disk": 0, "encoded": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, request_number, base_url=FEEDBACK_URL):
+        key = (base_url, str(request_number))
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self.stats["memory"] += 1
+                return matrix
+        data = feedback_url(key[1], base_url)
+        matrix = self._load(key, data)
+        if matrix is None:
+            matrix = self.encode(data)
+            self._save(key, data, matrix)
+            source = "encoded"
+        else:
+            source = "disk"
+        with self._lock:
+            self.stats[source] += 1
+            self._entries[key] = matrix
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        """Empties the memory cache; the disk cache is kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def path(self, key):
+        digest = hashlib.sha1("\n".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".qr")
+
+    def _load(self, key, data):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.path(key), encoding="ascii") as f:
+                lines = f.read().split()
+        except (OSError, UnicodeDecodeError):
+            return None
+        # The first line is the encoded text: a hash collision or a torn file is a miss
+        rows = tuple(lines[1:])
+        if not lines or lines[0] != data or not rows or any(len(row) != len(rows) for row in rows):
+            return None
+        return rows
+
+    def _save(self, key, data, matrix):
+        if self.cache_dir is None:
+            return
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary, "w", encoding="ascii") as f:
+                f.write("\n".join((data,) + tuple(matrix)) + "\n")
+            os.replace(temporary, path)  # Readers never see a partly written file
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+qr_cache = QRCache()
+
+def photo_image(matrix, master=None, box_size=BOX_SIZE):
+    """Tk image of a matrix, box_size pixels per module; needs no PIL."""
+    import tkinter as tk
+    size = len(matrix)
+    photo = tk.PhotoImage(master=master, width=size, height=size)
+    photo.put(" ".join("{" + " ".join("#000000" if module == "1" else "#ffffff" for module in row) + "}"
+                       for row in matrix))
+    return photo.zoom(box_size) if box_size > 1 else photo
+
+def pil_image(matrix, box_size=BOX_SIZE):
+    """Grayscale PIL image of a matrix, box_size pixels per module."""
+    from PIL import Image
+    size = len(matrix)
+    image = Image.frombytes("L", (size, size), "".join(matrix).encode("ascii").translate(_PIXELS))
+    return image.resize((size * box_size, size * box_size), Image.NEAREST) if box_size > 1 else image
+
+def completed_request_numbers(day=None, db_name=None):
+    """
+    Numbers of the completed requests in completion order; with day (a date
+    or "YYYY-MM-DD"), only those completed that day.
+    """
+    query = "SELECT request_number FROM requests WHERE status_id = 5"
+    params = []
+    if day is not None:
+        if isinstance(day, datetime):
+            day = day.date()
+        elif not isinstance(day, date):
+            day = datetime.strptime(str(day), "%Y-%m-%d").date()
+        # Dates are stored as "YYYY-MM-DD HH:MM:SS" text, which sorts chronologically
+        query += " AND completion_date >= ? AND completion_date < ?"
+        params += [day.isoformat(), (day + timedelta(days=1)).isoformat()]
+    query += " ORDER BY completion_date, id"
+    with connection(db_name) as conn:
+        return [row[0] for row in conn.execute(query, params)]
+
+def sheet_pages(output_dir, request_numbers):
+    """[(page path, request numbers on it)], SHEET_COLUMNS x SHEET_ROWS codes per page."""
+    per_page = SHEET_COLUMNS * SHEET_ROWS
+    numbers = list(request_numbers)
+    return [(os.path.join(output_dir, f"qr_sheet_{start // per_page + 1:04d}.png"), numbers[start:start + per_page])
+            for start in range(0, len(numbers), per_page)]
+
+def render_sheet(path, request_numbers, base_url=FEEDBACK_URL, cache_dir=CACHE_DIR):
+    """Draws one page of codes, each with its request number underneath, and saves it as PNG."""
+    from PIL import Image, ImageDraw
+    cache = QRCache(cache_dir)
+    page = Image.new("L", SHEET_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    cell_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // SHEET_COLUMNS
+    cell_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // SHEET_ROWS
+    for index, number in enumerate(request_numbers):
+        matrix = cache.matrix(number, base_url)
+        box_size = max(1, min(cell_width, cell_height - LABEL_HEIGHT) // len(matrix))
+        image = pil_image(matrix, box_size)
+        row, column = divmod(index, SHEET_COLUMNS)
+        x = SHEET_MARGIN + column * cell_width + (cell_width - image.width) // 2
+        y = SHEET_MARGIN + row * cell_height
+        page.paste(image, (x, y))
+        # Lined up with the left edge of the code, inside the quiet zone
+        draw.text((x + BORDER * box_size, y + image.height), str(number), fill=0)
+    page.save(path, dpi=(SHEET_DPI, SHEET_DPI))
+    return path
+
+def export_sheets(output_dir, request_numbers, base_url=FEEDBACK_URL, workers=QR_WORKERS, cache_dir=CACHE_DIR):
+    """
+    Renders the codes of request_numbers onto printable pages
+    output_dir/qr_sheet_0001.png, ... and returns their paths in order.
+    Pages are rendered in a pool of `workers` processes, which share the
+    disk cache.
+    """
+    pages = sheet_pages(output_dir, request_numbers)
+    if not pages:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    paths, numbers = zip(*pages)
+    if workers <= 1 or len(pages) == 1:
+        return [render_sheet(path, chunk, base_url, cache_dir) for path, chunk in pages]
+    with ProcessPoolExecutor(min(workers, len(pages)), mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(render_sheet, paths, numbers, [base_url] * len(pages), [cache_dir] * len(pages)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Printable feedback QR codes of completed requests")
+    parser.add_argument("output_dir", nargs="?", default="qr_sheets")
+    parser.add_argument("--db", default=None, help="database file (default: repair_system.db)")
+    parser.add_argument("--date", default=None, help="completed on this day (YYYY-MM-DD, default: today)")
+    parser.add_argument("--all", action="store_true", help="every completed request")
+    parser.add_argument("--workers", type=int, default=QR_WORKERS)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+    if args.db:
+        import database
+        database.DB_NAME = args.db
+    numbers = completed_request_numbers(None if args.all else args.date or date.today())
+    sheets = export_sheets(args.output_dir, numbers, workers=args.workers, cache_dir=args.cache_dir)
+    print(f"{len(numbers)} QR codes on {len(sheets)} sheets in {args.output_dir}")
@@ -1,9 +1,11 @@
 import unittest
 import os
 import sqlite3
+from dataclasses import replace
+from datetime import datetime, timedelta
 import database
 from database import init_db, get_connection
-from services import UserService, RequestService, PartService, STATUS_NEW, STATUS_COMPLETED
+from services import UserService, RequestService, PartService, STATUS_NEW, STATUS_IN_PROGRESS, STATUS_COMPLETED, STATUS_OVERDUE
 from models import User
 
 class TestRepairSystem(unittest.TestCase):
@@ -95,5 +97,1591 @@ class TestRepairSystem(unittest.TestCase):
         updated_part = next(p for p in updated_parts if p.id == test_part.id)
         self.assertEqual(updated_part.stock_quantity, 8)
 
+    def test_07_get_request_details(self):
+        req = RequestService.get_requests("Administrator", 1)[0]
+        RequestService.add_comment(req.id, 1, "Checked")
+        
+        detail = RequestService.get_request(req.id)
+        self.assertEqual(detail.request_number, req.request_number)
+        self.assertEqual(detail.assigned_specialists, req.assigned_specialists)
+        self.assertEqual([p.name for p in detail.parts], ["Test Part"])
+        self.assertEqual([c.text for c in detail.comments], ["Checked"])
+        
+        self.assertIsNone(RequestService.get_request(999999))
+
+class TestRequestListingQueries(unittest.TestCase):
+    def test_get_requests_query_count_is_flat(self):
+        from benchmark import bench_get_requests
+        small, large = bench_get_requests(sizes=(50, 500))
+        self.assertEqual(small["rows"], 50)
+        self.assertEqual(large["rows"], 500)
+        # Specialists are aggregated in the listing query, not fetched per row
+        self.assertEqual(small["queries"], large["queries"])
+
+    def test_get_request_query_count_is_flat(self):
+        from benchmark import bench_get_request
+        small, large = bench_get_request(sizes=(50, 500))
+        self.assertEqual(small["queries"], 3)
+        self.assertEqual(large["queries"], 3)
+
+    def test_get_requests_loads_specialists(self):
+        from benchmark import seeded_database
+        with seeded_database(20):
+            requests = RequestService.get_requests("Specialist", 3)
+        self.assertEqual(len(requests), 20)
+        self.assertTrue(all(r.assigned_specialists == ["Specialist User"] for r in requests))
+
+class TestRequestPagination(unittest.TestCase):
+    def test_pages_cover_listing_in_order(self):
+        from benchmark import seeded_database
+        with seeded_database(125):
+            expected = [r.id for r in RequestService.get_requests("Administrator", 1)]
+            seen = []
+            pages = []
+            token = None
+            while True:
+                page = RequestService.get_requests_page("Administrator", 1, page_token=token, page_size=20)
+                pages.append(page)
+                seen.extend(r.id for r in page.items)
+                if not page.next_page_token:
+                    break
+                token = page.next_page_token
+            self.assertEqual(seen, expected)
+            self.assertEqual(len(pages), 7)
+            self.assertIsNone(pages[0].prev_page_token)
+            
+            # Walking back from the last page returns the previous page
+            back = RequestService.get_requests_page("Administrator", 1, page_token=pages[-1].prev_page_token, page_size=20)
+            self.assertEqual([r.id for r in back.items], [r.id for r in pages[-2].items])
+            first = RequestService.get_requests_page("Administrator", 1, page_token=pages[1].prev_page_token, page_size=20)
+            self.assertEqual([r.id for r in first.items], [r.id for r in pages[0].items])
+            self.assertIsNone(first.prev_page_token)
+
+    def test_iter_requests_and_filters(self):
+        from benchmark import seeded_database
+        with seeded_database(60):
+            all_ids = [r.id for r in RequestService.iter_requests("Administrator", 1, page_size=7)]
+            self.assertEqual(len(all_ids), 60)
+            completed = list(RequestService.iter_requests("Administrator", 1, STATUS_COMPLETED, page_size=7))
+            self.assertTrue(completed and all(r.status_id == STATUS_COMPLETED for r in completed))
+            page = RequestService.get_requests_page("Administrator", 1, search="REQ-B-00000042")
+            self.assertEqual([r.id for r in page.items], [42])
+
+    def test_invalid_page_token(self):
+        with self.assertRaises(ValueError):
+            RequestService.get_requests_page("Administrator", 1, page_token="not-a-token")
+
+class TestRequestSearch(unittest.TestCase):
+    def found(self, search, user_role="Administrator", user_id=1, filter_status=None):
+        return sorted(r.id for r in RequestService.get_requests(user_role, user_id, filter_status, search=search))
+
+    def test_prefix_matches_number_phone_and_serial(self):
+        from benchmark import seeded_database
+        with seeded_database(300):
+            self.assertEqual(self.found("REQ-B-0000012"), list(range(120, 130)))
+            self.assertEqual(self.found("+79000000042"), [42])
+            self.assertEqual(self.found("SN-0000025"), list(range(250, 260)))
+            self.assertEqual(self.found("REQ-B-000002", filter_status=STATUS_COMPLETED), list(range(202, 300, 6)))
+            # Prefixes only, and no LIKE wildcards
+            for search in ("0000012", "%", "_", "REQ-B-%", "req-b-0000012", "SN-00000025 "):
+                self.assertEqual(self.found(search), [], search)
+            # Role filtering still applies
+            self.assertEqual(self.found("SN-0000025", "Specialist", 3), list(range(250, 260)))
+            self.assertEqual(self.found("SN-0000025", "Specialist", 2), [])
+            
+            # Pages walk the matches in dashboard order
+            ids, token = [], None
+            while True:
+                page = RequestService.get_requests_page("Administrator", 1, page_token=token, page_size=7, search="REQ-B-000001")
+                ids.extend(r.id for r in page.items)
+                token = page.next_page_token
+                if not token:
+                    break
+            listing = [r.id for r in RequestService.get_requests("Administrator", 1)]
+            self.assertEqual(ids, [i for i in listing if 100 <= i <= 199])
+
+    def search_counting_steps(self, search):
+        steps = [0]
+        def tick():
+            steps[0] += 1
+            return 0
+        with database.connection() as conn:
+            conn.set_progress_handler(tick, 10)
+            try:
+                page = RequestService.get_requests_page("Administrator", 1, search=search)
+            finally:
+                conn.set_progress_handler(None, 10)
+        return [r.id for r in page.items], steps[0]
+
+    def test_search_cost_does_not_depend_on_table_size(self):
+        from benchmark import seeded_database
+        results = []
+        for size in (1000, 20000):
+            with seeded_database(size):
+                results.append(self.search_counting_steps("SN-00000777"))
+        (small_ids, small_steps), (large_ids, large_steps) = results
+        self.assertEqual(small_ids, [777])
+        self.assertEqual(large_ids, [777])
+        self.assertLess(large_steps, small_steps * 1.5)
+
+class TestBackgroundRunner(unittest.TestCase):
+    class FakeWidget:
+        """Stands in for a Tk widget: after() callbacks run when run_pending() is called."""
+        def __init__(self):
+            self.jobs = {}
+            self.next_id = 0
+            self.bindings = {}
+
+        def bind(self, sequence, callback, add=None):
+            self.bindings.setdefault(sequence, []).append(callback)
+
+        def after(self, ms, callback):
+            self.next_id += 1
+            self.jobs[self.next_id] = callback
+            return self.next_id
+
+        def after_cancel(self, job):
+            self.jobs.pop(job, None)
+
+        def run_pending(self):
+            jobs, self.jobs = self.jobs, {}
+            for callback in jobs.values():
+                callback()
+
+    def setUp(self):
+        # Tasks run under database.cancellable(), which opens DB_NAME
+        from benchmark import seeded_database
+        database_context = seeded_database(10)
+        database_context.__enter__()
+        self.addCleanup(database_context.__exit__, None, None, None)
+
+    def finish(self, widget, runner, *tasks):
+        for task in tasks:
+            task.thread.join(5)
+            self.assertFalse(task.thread.is_alive())
+        while widget.jobs:
+            widget.run_pending()
+        self.assertFalse(runner.busy())
+
+    def test_newer_task_replaces_stale_one(self):
+        import threading
+        from background import BackgroundRunner
+        widget = self.FakeWidget()
+        busy = []
+        runner = BackgroundRunner(widget, on_busy=busy.append)
+        results, errors = [], []
+        gate = threading.Event()
+        old = runner.submit("requests", lambda: gate.wait(5) and "old", results.append, label="old")
+        new = runner.submit("requests", lambda: gate.wait(5) and "new", results.append, label="new")
+        failing = runner.submit("stats", lambda: 1 / 0, results.append, errors.append)
+        self.assertEqual(busy, [["old"], ["new"], ["new"]])
+        gate.set()
+        self.finish(widget, runner, old, new, failing)
+        self.assertTrue(old.cancelled.is_set())
+        self.assertEqual(results, ["new"])
+        self.assertEqual([type(e) for e in errors], [ZeroDivisionError])
+        self.assertEqual(busy[-1], [])
+
+    def test_destroyed_widget_closes_runner(self):
+        import threading
+        from background import BackgroundRunner
+        widget = self.FakeWidget()
+        runner = BackgroundRunner(widget)
+        gate = threading.Event()
+        results = []
+        task = runner.submit("comments", lambda: gate.wait(5) and "late", results.append)
+        # A child's <Destroy> reaches the toplevel binding too and is ignored
+        child = type("Event", (), {"widget": object()})()
+        for callback in widget.bindings["<Destroy>"]:
+            callback(child)
+        self.assertTrue(runner.busy("comments"))
+        event = type("Event", (), {"widget": widget})()
+        for callback in widget.bindings["<Destroy>"]:
+            callback(event)
+        gate.set()
+        task.thread.join(5)
+        self.assertEqual(widget.jobs, {})
+        self.assertIsNone(runner.submit("comments", lambda: "again", results.append))
+        self.assertEqual(results, [])
+
+    def test_cancel_interrupts_running_query(self):
+        import threading
+        from background import BackgroundRunner
+        from benchmark import seeded_database
+        widget = self.FakeWidget()
+        runner = BackgroundRunner(widget)
+        started = threading.Event()
+        results, errors = [], []
+        def endless_query():
+            with database.connection() as conn:
+                started.set()
+                return conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n").fetchone()
+        with seeded_database(10):
+            task = runner.submit("requests", endless_query, results.append, errors.append)
+            self.assertTrue(started.wait(5))
+            runner.cancel("requests")
+            self.finish(widget, runner, task)
+            
+            # A write is not interrupted: cancelling only drops its result
+            gate = threading.Event()
+            def write():
+                gate.wait(5)
+                return RequestService.add_comment(1, 1, "Written anyway")
+            task = runner.submit("comment", write, results.append, errors.append, interruptible=False)
+            runner.cancel("comment")
+            gate.set()
+            self.finish(widget, runner, task)
+            self.assertEqual(RequestService.get_comments(1)[-1].text, "Written anyway")
+            # The pooled connection is usable again, without the cancel check
+            self.assertEqual(len(RequestService.get_requests("Administrator", 1, search="REQ-B-")), 10)
+        self.assertEqual((results, errors), ([], []))
+
+def tk_root():
+    """A hidden Tk root, or None when there is no display to open one on."""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    return root
+
+class TestChangeFeed(unittest.TestCase):
+    def changes(self, since, user_role="Administrator", user_id=1, filter_status=None):
+        changes = RequestService.get_changes(since, user_role, user_id, filter_status)
+        return changes.sync_token, sorted(r.id for r in changes.items), sorted(changes.removed_ids)
+
+    def test_changes_since_token(self):
+        from benchmark import seeded_database
+        with seeded_database(30) as db_name:
+            token = RequestService.get_sync_token()
+            self.assertEqual(self.changes(token), (token, [], []))
+            
+            RequestService.update_status(3, STATUS_COMPLETED)
+            RequestService.assign_specialist(4, 2)
+            RequestService.toggle_help_needed(5, True)
+            RequestService.add_comment(7, 1, "Not shown on the dashboard")
+            conn = sqlite3.connect(db_name)
+            conn.execute("UPDATE clients SET phone = '+79990000006' WHERE id = 6")
+            conn.execute("UPDATE equipment SET model = 'Renamed' WHERE id = 9")
+            conn.commit()
+            number = RequestService.create_request(("Feed Client", "+79995550001"), ("SN-FEED", "M", "T"), "Feed")
+            new_id = conn.execute("SELECT id FROM requests WHERE request_number = ?", (number,)).fetchone()[0]
+            
+            latest, changed, removed = self.changes(token)
+            self.assertGreater(latest, token)
+            self.assertEqual(changed, [3, 4, 5, 6, 9, new_id])
+            self.assertEqual(removed, [])
+            self.assertEqual(self.changes(latest), (latest, [], []))
+            
+            # Renaming a specialist touches every request it is assigned to
+            conn.execute("UPDATE users SET full_name = 'Renamed Specialist' WHERE id = 2")
+            conn.execute("DELETE FROM request_specialists WHERE request_id = 8")
+            conn.execute("DELETE FROM request_status_history WHERE request_id = 10")
+            conn.execute("DELETE FROM request_specialists WHERE request_id = 10")
+            conn.execute("DELETE FROM requests WHERE id = 10")
+            conn.commit()
+            conn.close()
+            _, changed, removed = self.changes(latest)
+            self.assertEqual((changed, removed), ([4, 8], [10]))
+            # Rows that left a filtered listing are reported as removed
+            _, changed, removed = self.changes(latest, "Specialist", 3)
+            self.assertEqual((changed, removed), ([4], [8, 10]))
+            _, changed, removed = self.changes(token, filter_status=STATUS_COMPLETED)
+            self.assertEqual(changed, [3, 4])
+            self.assertIn(5, removed)
+
+    def test_full_reload(self):
+        from unittest import mock
+        import services
+        from benchmark import seeded_database
+        with seeded_database(20):
+            token = RequestService.get_sync_token()
+            self.assertTrue(RequestService.get_changes(None, "Administrator", 1).full_reload)
+            self.assertTrue(RequestService.get_changes(token + 1, "Administrator", 1).full_reload)
+            with mock.patch.object(services, "CHANGE_FEED_LIMIT", 3):
+                for request_id in (1, 2, 3):
+                    RequestService.toggle_help_needed(request_id, True)
+                self.assertFalse(RequestService.get_changes(token, "Administrator", 1).full_reload)
+                RequestService.toggle_help_needed(4, True)
+                changes = RequestService.get_changes(token, "Administrator", 1)
+            self.assertTrue(changes.full_reload)
+            self.assertEqual(changes.sync_token, RequestService.get_sync_token())
+
+    def test_merge_keeps_dashboard_order(self):
+        from services import merge_request_changes
+        from models import RequestChanges
+        from benchmark import synthetic_requests
+        def listing(requests):
+            return sorted(requests, key=lambda r: (r.help_needed, r.creation_date, r.id), reverse=True)
+        requests = {r.id: r for r in synthetic_requests(20)}
+        for r in requests.values():
+            r.help_needed = False
+            r.creation_date = f"2024-01-01 10:{r.id:02d}:00"
+        full = listing(requests.values())
+        loaded = full[:10]  # ids 20..11
+        
+        raised = replace(requests[15], help_needed=True)   # moves to the top
+        renamed = replace(requests[13], client_name="New")  # stays in place
+        beyond = replace(requests[3], client_name="Later")  # not loaded yet
+        new = replace(requests[1], id=21, creation_date="2024-01-01 11:00:00")
+        changes = RequestChanges(99, [raised, renamed, beyond, new], [18])
+        merged = merge_request_changes(loaded, changes, complete=False)
+        self.assertEqual([r.id for r in merged], [15, 21, 20, 19, 17, 16, 14, 13, 12, 11])
+        self.assertEqual(merged[7].client_name, "New")
+        # When the whole listing is loaded nothing is left for a later page
+        merged = merge_request_changes(full, changes, complete=True)
+        self.assertEqual([r.id for r in merged][:3], [15, 21, 20])
+        self.assertIn(3, [r.id for r in merged])
+        self.assertEqual(len(merged), 20)
+        self.assertEqual(merge_request_changes([], changes, complete=False), [])
+
+    def test_idle_poll_cost_does_not_depend_on_table_size(self):
+        from benchmark import seeded_database
+        results = []
+        for size in (1000, 20000):
+            with seeded_database(size):
+                token = RequestService.get_sync_token()
+                RequestService.toggle_help_needed(500, True)
+                steps = [0]
+                def tick():
+                    steps[0] += 1
+                    return 0
+                with database.connection() as conn:
+                    conn.set_progress_handler(tick, 10)
+                    try:
+                        latest, changed, _ = self.changes(token)
+                        idle = self.changes(latest)
+                    finally:
+                        conn.set_progress_handler(None, 10)
+            results.append((changed, idle[1:], steps[0]))
+        (small_changed, small_idle, small_steps), (large_changed, large_idle, large_steps) = results
+        self.assertEqual((small_changed, small_idle), ([500], ([], [])))
+        self.assertEqual((large_changed, large_idle), ([500], ([], [])))
+        self.assertLess(large_steps, small_steps * 1.5)
+
+class TestVirtualList(unittest.TestCase):
+    def test_visible_range(self):
+        from virtual_list import visible_range
+        self.assertEqual(visible_range(0, 600, 100000, 170, overscan=2), (0, 6))
+        self.assertEqual(visible_range(170 * 5000 + 30, 600, 100000, 170, overscan=2), (4998, 5006))
+        self.assertEqual(visible_range(170 * 99998, 600, 100000, 170, overscan=2), (99996, 100000))
+        self.assertEqual(visible_range(0, 600, 3, 170, overscan=2), (0, 3))
+        self.assertEqual(visible_range(0, 600, 0, 170), (0, 0))
+        self.assertEqual(visible_range(-50, 0, 10, 170, overscan=0), (0, 1))
+        # The window size does not depend on the list length
+        sizes = {b - a for a, b in (visible_range(y * 170, 600, 10 ** 6, 170) for y in range(100, 10 ** 6 - 100, 9973))}
+        self.assertEqual(len(sizes), 1)
+
+    def test_widgets_are_recycled(self):
+        from tkinter import ttk
+        from virtual_list import VirtualList
+        root = tk_root()
+        if root is None:
+            self.skipTest("no display")
+        try:
+            root.geometry("400x600")
+            near_end = []
+            rows = VirtualList(root, create_row=lambda master: ttk.Label(master),
+                               bind_row=lambda label, item: label.configure(text=item),
+                               row_height=50, on_near_end=lambda: near_end.append(True))
+            rows.pack(fill="both", expand=True)
+            rows.set_items(f"row {i}" for i in range(100000))
+            root.update()
+            pool = rows.widget_count()
+            self.assertLess(pool, 20)
+            for position in (0.5, 0.25, 0.999999):
+                rows.canvas.yview_moveto(position)
+                root.update()
+                self.assertEqual(rows.widget_count(), pool)
+                for index, (label, _) in rows._bound.items():
+                    self.assertEqual(label.cget("text"), f"row {index}")
+            self.assertTrue(near_end)
+            self.assertIn(99999, rows._bound)
+        finally:
+            root.destroy()
+
+class TestQRCodes(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.encoded = []
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir)
+
+    def encode(self, data):
+        self.encoded.append(data)
+        return ("1110", "1010", "0101", "0111")
+
+    def cache(self, size=2):
+        from qr_codes import QRCache
+        return QRCache(os.path.join(self.tmp_dir, "cache"), size=size, encode=self.encode)
+
+    def test_memory_cache_is_lru(self):
+        from qr_codes import feedback_url
+        cache = self.cache()
+        cache.cache_dir = None
+        matrix = cache.matrix("REQ-1")
+        self.assertEqual(matrix, ("1110", "1010", "0101", "0111"))
+        cache.matrix("REQ-2")
+        cache.matrix("REQ-1")
+        cache.matrix("REQ-3")  # Evicts REQ-2, the least recently used
+        cache.matrix("REQ-1")
+        cache.matrix("REQ-2")
+        self.assertEqual(self.encoded, [feedback_url(n) for n in ("REQ-1", "REQ-2", "REQ-3", "REQ-2")])
+        self.assertEqual(cache.stats, {"memory": 2, "disk": 0, "encoded": 4})
+
+    def test_disk_cache_keyed_by_url(self):
+        from qr_codes import feedback_url
+        self.cache().matrix("REQ-1")
+        cache = self.cache()
+        self.assertEqual(cache.matrix("REQ-1"), ("1110", "1010", "0101", "0111"))
+        self.assertEqual(cache.stats, {"memory": 0, "disk": 1, "encoded": 0})
+        # A changed feedback form gets new codes
+        cache.matrix("REQ-1", "https://example.com/form")
+        self.assertEqual(self.encoded, [feedback_url("REQ-1"), feedback_url("REQ-1", "https://example.com/form")])
+
+    def test_damaged_cache_file_is_encoded_again(self):
+        from qr_codes import FEEDBACK_URL
+        cache = self.cache()
+        cache.matrix("REQ-1")
+        with open(cache.path((FEEDBACK_URL, "REQ-1")), "w") as f:
+            f.write("truncated")
+        cache.clear()
+        self.assertEqual(cache.matrix("REQ-1"), ("1110", "1010", "0101", "0111"))
+        self.assertEqual(len(self.encoded), 2)
+
+    def test_sheet_pages(self):
+        from qr_codes import sheet_pages, SHEET_COLUMNS, SHEET_ROWS
+        per_page = SHEET_COLUMNS * SHEET_ROWS
+        pages = sheet_pages("out", [f"REQ-{i}" for i in range(2 * per_page + 1)])
+        self.assertEqual([os.path.basename(path) for path, _ in pages],
+                         ["qr_sheet_0001.png", "qr_sheet_0002.png", "qr_sheet_0003.png"])
+        self.assertEqual([len(numbers) for _, numbers in pages], [per_page, per_page, 1])
+        self.assertEqual(pages[1][1][0], f"REQ-{per_page}")
+        self.assertEqual(sheet_pages("out", []), [])
+
+    def test_completed_request_numbers(self):
+        from qr_codes import completed_request_numbers
+        from benchmark import seeded_database
+        with seeded_database(300):
+            conn = get_connection()
+            expected = [row[0] for row in conn.execute(
+                "SELECT request_number FROM requests WHERE status_id = 5 ORDER BY completion_date, id")]
+            day = conn.execute("SELECT substr(min(completion_date), 1, 10) FROM requests WHERE status_id = 5").fetchone()[0]
+            on_day = conn.execute("SELECT count(*) FROM requests WHERE status_id = 5 AND date(completion_date) = ?",
+                                  (day,)).fetchone()[0]
+            conn.close()
+            self.assertEqual(completed_request_numbers(), expected)
+            self.assertEqual(len(completed_request_numbers(day)), on_day)
+            self.assertEqual(completed_request_numbers(datetime.strptime(day, "%Y-%m-%d")),
+                             completed_request_numbers(day))
+        self.assertGreater(on_day, 0)
+
+    def test_photo_image(self):
+        from qr_codes import photo_image
+        root = tk_root()
+        if root is None:
+            self.skipTest("no display")
+        try:
+            photo = photo_image(("10", "01"), master=root, box_size=3)
+            self.assertEqual((photo.width(), photo.height()), (6, 6))
+            self.assertEqual(tuple(photo.get(0, 0)), (0, 0, 0))
+            self.assertEqual(tuple(photo.get(5, 0)), (255, 255, 255))
+        finally:
+            root.destroy()
+
+    def test_export_sheets(self):
+        import qr_codes
+        if not (qr_codes.HAS_QRCODE and qr_codes.HAS_PIL):
+            self.skipTest("qrcode and Pillow are not installed")
+        from PIL import Image
+        numbers = [f"REQ-{i:05d}" for i in range(qr_codes.SHEET_COLUMNS * qr_codes.SHEET_ROWS + 3)]
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        sheets = qr_codes.export_sheets(os.path.join(self.tmp_dir, "sheets"), numbers, workers=2, cache_dir=cache_dir)
+        self.assertEqual(len(sheets), 2)
+        with Image.open(sheets[0]) as page:
+            self.assertEqual(page.size, qr_codes.SHEET_SIZE)
+        # The workers filled the shared disk cache
+        cache = qr_codes.QRCache(cache_dir, encode=self.encode)
+        self.assertEqual(cache.matrix(numbers[-1]), qr_codes.encode_matrix(qr_codes.feedback_url(numbers[-1])))
+        self.assertEqual(self.encoded, [])
+
+class TestStartupImports(unittest.TestCase):
+    # Only needed by the QR dialog, the statistics view or not at all
+    DEFERRED = ("qrcode", "PIL", "numpy", "urllib.request", "http.client", "qr_codes")
+    # What any Tk + SQLite client has to import; the budget scales with it, so it
+    # holds on slow machines and under coverage alike
+    BASELINE = ("tkinter", "tkinter.ttk", "sqlite3")
+    BUDGET_RATIO = 5  # interface.py takes about 3x the baseline
+
+    def import_times(self, statement="import interface"):
+        """{module: cumulative microseconds} from `python -X importtime -c statement`."""
+        import subprocess
+        import sys
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)  # Measure a deployed install, not recompilation
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                capture_output=True, text=True, check=True).stderr
+        times = {}
+        for line in output.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, cumulative, name = line[len("import time:"):].split("|")
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        return times
+
+    def test_optional_modules_not_imported(self):
+        times = self.import_times()
+        self.assertIn("interface", times)
+        self.assertEqual([name for name in self.DEFERRED if name in times], [])
+
+    def test_startup_budget(self):
+        self.import_times()  # Writes the bytecode caches
+        best = min(self.import_times()["interface"] for _ in range(3)) / 1000
+        # REPAIR_STARTUP_BUDGET_MS sets an absolute budget for the target hardware
+        budget = os.environ.get("REPAIR_STARTUP_BUDGET_MS")
+        if budget:
+            budget = float(budget)
+        else:
+            statement = "import " + ", ".join(self.BASELINE)
+            baseline = min(sum(self.import_times(statement)[name] for name in self.BASELINE)
+                           for _ in range(3)) / 1000
+            budget = baseline * self.BUDGET_RATIO
+        self.assertLess(best, budget, f"import interface took {best:.0f} ms, budget {budget:.0f} ms")
+
+    def test_database_created_on_first_use(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_name = os.path.join(tmp_dir, "first_run.db")
+            database.ensure_database(db_name)
+            conn = get_connection(db_name)
+            conn.execute("INSERT INTO parts (name, stock_quantity, price) VALUES ('Marker', 1, 1)")
+            conn.commit()
+            conn.close()
+            # An existing database is kept, not recreated
+            database.ensure_database(db_name)
+            conn = get_connection(db_name)
+            self.assertEqual(conn.execute("SELECT count(*) FROM parts WHERE name = 'Marker'").fetchone()[0], 1)
+            conn.close()
+            database.close_all(db_name)
+
+class TestQueryPlans(unittest.TestCase):
+    """Every statement issued by the services must be answered through an index."""
+
+    # Small summary tables that are meant to be read in full
+    FULL_SCAN_ALLOWED = {"request_stats_problems", "statuses"}
+
+    def run_service_calls(self):
+        from stats_module import calculate_statistics, aggregate_statistics, time_in_status
+        from qr_codes import completed_request_numbers
+        first = RequestService.get_requests_page("Administrator", 1, page_size=10)
+        RequestService.get_requests_page("Administrator", 1, page_token=first.next_page_token, page_size=10)
+        by_status = RequestService.get_requests_page("Administrator", 1, STATUS_COMPLETED, page_size=10)
+        RequestService.get_requests_page("Administrator", 1, STATUS_COMPLETED, page_token=by_status.next_page_token, page_size=10)
+        RequestService.get_requests_page("Specialist", 3, page_size=10)
+        RequestService.get_requests_page("Administrator", 1, STATUS_COMPLETED, page_size=10, search="REQ-B-000001")
+        RequestService.get_requests_page("Specialist", 3, page_size=10, search="+7900000001")
+        RequestService.get_requests("Administrator", 1, search="SN-0000001")
+        RequestService.get_requests("Administrator", 1, STATUS_NEW)
+        RequestService.get_requests("Specialist", 3)
+        RequestService.get_request(5)
+        RequestService.get_comments(5)
+        PartService.get_parts_for_request(5)
+        RequestService.create_request(("Client 1", "+79000000001"), ("SN-00000001", "Model 1", "Type 1"), "Again")
+        RequestService.create_request(("Plan Client", "+79990000000"), ("SN-PLAN", "Model P", "Type P"), "New")
+        UserService.login("admin", "admin")
+        UserService.get_specialists()
+        RequestService.update_status(4, STATUS_COMPLETED)
+        RequestService.assign_specialist(4, 2)
+        RequestService.extend_deadline(4, 2)
+        RequestService.toggle_help_needed(4, True)
+        RequestService.add_comment(4, 1, "Plan check")
+        PartService.assign_part_to_request(4, 1, 1)
+        calculate_statistics()
+        aggregate_statistics(date_from="2024-01-01", date_to="2024-02-01", group_by=("equipment_type", "month"))
+        aggregate_statistics(specialist_id=3, group_by="specialist")
+        aggregate_statistics(client_id=5, equipment_type="Type 5")
+        time_in_status(request_id=5)
+        RequestService.mark_overdue(datetime(2024, 1, 8, 12))
+        time_in_status(("status", "day"), date_from="2024-01-01 01:00:00", date_to="2024-01-01 02:00:00")
+        RequestService.search_requests("Problem 3")
+        token = RequestService.get_sync_token()
+        RequestService.get_changes(token - 3, "Administrator", 1)
+        RequestService.get_changes(token - 3, "Specialist", 3, STATUS_COMPLETED)
+        RequestService.search_requests("Model", "Specialist", 3, limit=5)
+        completed_request_numbers()
+        completed_request_numbers("2024-01-05")
+
+    def test_no_full_table_scans(self):
+        from benchmark import seeded_database, count_queries
+        with seeded_database(300) as db_name:
+            with count_queries() as counter:
+                self.run_service_calls()
+            conn = sqlite3.connect(db_name)
+            checked = 0
+            for statement in counter["statements"]:
+                if statement.split()[0].upper() not in ("SELECT", "UPDATE", "DELETE", "WITH"):
+                    continue
+                # FTS5 reads its own shadow tables ('main'.'requests_fts_*') by rowid
+                if "'main'." in statement:
+                    continue
+                plan = conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+                # Materialized CTEs and subqueries are already filtered intermediate results
+                allowed = {f"SCAN {table}" for table in self.FULL_SCAN_ALLOWED}
+                allowed.update("SCAN " + row[3].split()[1] for row in plan if row[3].startswith("MATERIALIZE "))
+                for row in plan:
+                    detail = row[3]
+                    # "SCAN t" without "USING ..." reads the whole table; a full-text
+                    # table scanned with a MATCH constraint (":M" in the index info) reads its index
+                    if detail in allowed or detail.startswith("SCAN ("):
+                        continue
+                    if " VIRTUAL TABLE INDEX " in detail and "M" in detail.rsplit(":", 1)[-1]:
+                        continue
+                    self.assertFalse(
+                        detail.startswith("SCAN ") and " USING " not in detail,
+                        f"Full table scan ({detail}) in: {' '.join(statement.split())}"
+                    )
+                checked += 1
+            conn.close()
+        self.assertGreater(checked, 20)
+
+class TestSchemaMigrations(unittest.TestCase):
+    def test_migrate_adds_indexes_to_existing_database(self):
+        from benchmark import seeded_database
+        with seeded_database(10) as db_name:
+            # Simulate a database created before the index set existed
+            conn = sqlite3.connect(db_name)
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'").fetchall():
+                conn.execute(f"DROP INDEX {name}")
+            conn.execute("PRAGMA user_version = 0")
+            conn.commit()
+            conn.close()
+            
+            self.assertEqual(database.migrate(db_name), [v for v, _, _ in database.MIGRATIONS])
+            self.assertEqual(database.migrate(db_name), [])
+            
+            conn = sqlite3.connect(db_name)
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            count = conn.execute("SELECT count(*) FROM requests").fetchone()[0]
+            conn.close()
+        self.assertIn("idx_requests_dashboard", indexes)
+        self.assertIn("idx_comments_request", indexes)
+        self.assertEqual(version, database.SCHEMA_VERSION)
+        self.assertEqual(count, 10)
+
+    def test_login_migrates_existing_database(self):
+        import shutil
+        import tempfile
+        # The shipped database predates the migrations (user_version 0)
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repair_system.db")
+        tmp_dir = tempfile.mkdtemp()
+        db_name = os.path.join(tmp_dir, "repair_system.db")
+        shutil.copyfile(source, db_name)
+        conn = sqlite3.connect(db_name)
+        conn.execute("PRAGMA user_version = 0")
+        conn.close()
+        previous = database.DB_NAME
+        database.DB_NAME = db_name
+        try:
+            # What LoginWindow.login does before the main window opens
+            database.ensure_database()
+            self.assertIsNotNone(UserService.login("admin", "admin"))
+            token = RequestService.get_sync_token()
+            number = RequestService.create_request(("Legacy Client", "+79990001122"), ("SN-LEGACY", "Model L", "Type L"), "Noise")
+            self.assertTrue(number)
+            self.assertGreater(RequestService.get_sync_token(), token)
+            request_id = RequestService.get_requests("Administrator", 1, search=number)[0].id
+            self.assertTrue(RequestService.update_status(request_id, STATUS_COMPLETED))
+            conn = sqlite3.connect(db_name)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.close()
+            self.assertEqual(version, database.SCHEMA_VERSION)
+        finally:
+            database.DB_NAME = previous
+            database.close_all(db_name)
+            shutil.rmtree(tmp_dir)
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.tmp_dir, "pool.db")
+        init_db(self.db_name)
+        self.manager = database.ConnectionManager(pool_size=2)
+
+    def tearDown(self):
+        import shutil
+        self.manager.close_all()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_connection_is_reused_and_configured(self):
+        with self.manager.connection(self.db_name) as first:
+            with self.manager.connection(self.db_name) as nested:
+                self.assertIs(first, nested)
+        with self.manager.connection(self.db_name) as again:
+            self.assertIs(first, again)
+            self.assertEqual(again.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(again.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+            self.assertEqual(again.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(again.execute("PRAGMA busy_timeout").fetchone()[0], database.BUSY_TIMEOUT_MS)
+
+    def test_transaction_commits_and_rolls_back(self):
+        with self.manager.transaction(self.db_name) as conn:
+            conn.execute("INSERT INTO parts (name) VALUES ('Committed')")
+            with self.manager.transaction(self.db_name) as inner:
+                inner.execute("INSERT INTO parts (name) VALUES ('Nested')")
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.manager.transaction(self.db_name) as conn:
+                conn.execute("INSERT INTO parts (name) VALUES ('Rolled back')")
+                conn.execute("INSERT INTO parts (name) VALUES ('Committed')")
+        with self.manager.connection(self.db_name) as conn:
+            self.assertFalse(conn.in_transaction)
+            names = {r[0] for r in conn.execute("SELECT name FROM parts")}
+        self.assertIn("Committed", names)
+        self.assertIn("Nested", names)
+        self.assertNotIn("Rolled back", names)
+
+    def test_pool_size_is_bounded_across_threads(self):
+        import threading
+        import time
+        active = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def worker():
+            with self.manager.connection(self.db_name) as conn:
+                with lock:
+                    active.append(conn)
+                    peak[0] = max(peak[0], len(active))
+                time.sleep(0.02)
+                conn.execute("SELECT count(*) FROM users").fetchone()
+                with lock:
+                    active.remove(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(self.manager._open, 2)
+
+class TestConcurrentAccess(unittest.TestCase):
+    def test_write_retries_until_lock_is_released(self):
+        import threading
+        from benchmark import seeded_database
+        with seeded_database(5) as db_name:
+            previous = database.BUSY_TIMEOUT_MS
+            database.BUSY_TIMEOUT_MS = 10
+            blocker = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+            try:
+                blocker.execute("BEGIN IMMEDIATE")
+                # No retries: the lock error surfaces as DatabaseBusyError
+                with self.assertRaises(database.DatabaseBusyError):
+                    database.run_in_transaction(
+                        lambda conn: conn.execute("UPDATE requests SET help_needed = 1 WHERE id = 1"), retries=0
+                    )
+                threading.Timer(0.2, blocker.rollback).start()
+                database.run_in_transaction(
+                    lambda conn: conn.execute("UPDATE requests SET help_needed = 1 WHERE id = 1"), retries=10
+                )
+            finally:
+                database.BUSY_TIMEOUT_MS = previous
+                database.close_all(db_name)
+                blocker.close()
+            self.assertTrue(RequestService.get_request(1).help_needed)
+
+    def test_concurrent_writer_processes_lose_nothing(self):
+        from benchmark import run_stress
+        result = run_stress(processes=4, operations=25)
+        self.assertEqual(result["created"], result["attempted"])
+        self.assertEqual(result["lost"], 0)
+        self.assertEqual(result["updates"], result["attempted"])
+        self.assertEqual(result["comments"], result["attempted"])
+
+class TestMaterializedStatistics(unittest.TestCase):
+    def rebuilt_statistics(self):
+        from stats_module import calculate_statistics, rebuild_statistics
+        rebuild_statistics()
+        return calculate_statistics()
+
+    def test_incremental_matches_rebuild(self):
+        from stats_module import calculate_statistics
+        from benchmark import seeded_database
+        with seeded_database(120):
+            before = calculate_statistics()
+            self.assertEqual(before, self.rebuilt_statistics())
+            self.assertEqual(before["completed_count"], 20)
+            
+            # Into Completed, out of Completed, and Completed again
+            RequestService.update_status(1, STATUS_COMPLETED)
+            RequestService.update_status(2, STATUS_COMPLETED)
+            RequestService.update_status(4, STATUS_NEW)
+            RequestService.update_status(10, STATUS_COMPLETED)
+            after = calculate_statistics()
+            self.assertEqual(after["completed_count"], 21)
+            self.assertEqual(after, self.rebuilt_statistics())
+            
+            # A problem type disappears when its last completed request is reopened
+            for req in RequestService.get_requests("Administrator", 1, STATUS_COMPLETED):
+                if req.problem_description == "Problem 4":
+                    RequestService.update_status(req.id, STATUS_IN_PROGRESS)
+            stats = calculate_statistics()
+            self.assertNotIn("Problem 4", stats["problem_types"])
+            self.assertEqual(stats, self.rebuilt_statistics())
+
+    def test_statistics_cost_is_flat(self):
+        from benchmark import bench_statistics
+        small, large = bench_statistics(sizes=(60, 600))
+        self.assertEqual(small["queries"], large["queries"])
+
+class TestStatisticsAggregation(unittest.TestCase):
+    def completed(self):
+        conn = get_connection()
+        rows = conn.execute("""
+            SELECT r.id, r.client_id, e.type, r.creation_date, r.completion_date
+            FROM requests r JOIN equipment e ON e.id = r.equipment_id
+            WHERE r.status_id = 5 AND r.completion_date IS NOT NULL
+        """).fetchall()
+        conn.close()
+        return rows
+
+    def days(self, created, completed):
+        fmt = "%Y-%m-%d %H:%M:%S"
+        return (datetime.strptime(completed, fmt) - datetime.strptime(created, fmt)).total_seconds() / 86400
+
+    def test_grouping_matches_python_reference(self):
+        from stats_module import aggregate_statistics
+        from benchmark import seeded_database
+        with seeded_database(600):
+            rows = self.completed()
+            by_type = {}
+            for _, _, eq_type, created, completed in rows:
+                by_type.setdefault(eq_type, []).append(self.days(created, completed))
+            result = aggregate_statistics(group_by="equipment_type")
+            self.assertEqual([r["equipment_type"] for r in result], sorted(by_type))
+            for r in result:
+                durations = by_type[r["equipment_type"]]
+                self.assertEqual(r["completed_count"], len(durations))
+                self.assertAlmostEqual(r["average_days"], sum(durations) / len(durations), places=2)
+                self.assertAlmostEqual(r["max_days"], max(durations), places=2)
+            
+            total = aggregate_statistics()
+            self.assertEqual(total[0]["completed_count"], len(rows))
+
+    def test_filters(self):
+        from stats_module import aggregate_statistics
+        from benchmark import seeded_database
+        with seeded_database(600):
+            rows = self.completed()
+            january = [r for r in rows if "2024-01-02" <= r[4] < "2024-01-05"]
+            self.assertTrue(january)
+            result = aggregate_statistics(date_from="2024-01-02", date_to=datetime(2024, 1, 5))
+            self.assertEqual(result[0]["completed_count"], len(january))
+            
+            self.assertEqual(aggregate_statistics(specialist_id=3)[0]["completed_count"], len(rows))
+            self.assertEqual(aggregate_statistics(specialist_id=2), [])
+            by_specialist = aggregate_statistics(specialist_id=3, group_by=["specialist", "month"])
+            self.assertEqual({r["specialist"] for r in by_specialist}, {"Specialist User"})
+            
+            client_id = rows[0][1]
+            self.assertEqual(aggregate_statistics(client_id=client_id, group_by="client")[0]["completed_count"], 1)
+            eq_type = rows[0][2]
+            self.assertEqual(
+                aggregate_statistics(equipment_type=eq_type)[0]["completed_count"],
+                len([r for r in rows if r[2] == eq_type])
+            )
+            with self.assertRaises(ValueError):
+                aggregate_statistics(group_by="colour")
+
+class TestDurationDistribution(unittest.TestCase):
+    def test_percentiles_and_histogram(self):
+        from stats_module import duration_distribution
+        result = duration_distribution([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, -3], percentiles=(0, 50, 90, 100))
+        self.assertEqual(result["count"], 11)
+        # The negative span counts as 0 hours
+        self.assertEqual(result["percentiles"], {0: 0.0, 50: 5.0, 90: 9.0, 100: 10.0})
+        self.assertEqual(result["mean_hours"], 5.0)
+        self.assertEqual(result["histogram"][:3], [(0, 4, 4), (4, 8, 4), (8, 24, 3)])
+        self.assertEqual(result["histogram"][-1], (336, None, 0))
+        
+        empty = duration_distribution([])
+        self.assertEqual(empty["count"], 0)
+        self.assertIsNone(empty["percentiles"][50])
+
+    def test_pure_python_fallback_matches(self):
+        import stats_module
+        hours = [0.5, 3, 7.25, 30, 30, 71, 200, 500]
+        expected = stats_module.duration_distribution(hours)
+        saved = stats_module.HAS_NUMPY
+        stats_module.HAS_NUMPY = False
+        try:
+            self.assertEqual(stats_module.duration_distribution(hours), expected)
+        finally:
+            stats_module.HAS_NUMPY = saved
+
+    def test_report_by_equipment_type(self):
+        from stats_module import duration_report
+        from benchmark import seeded_database
+        with seeded_database(300):
+            report = duration_report()
+            conn = get_connection()
+            completed = conn.execute("SELECT count(*) FROM requests WHERE status_id = 5").fetchone()[0]
+            conn.close()
+        self.assertEqual(report["overall"]["count"], completed)
+        self.assertEqual(sum(r["count"] for r in report["by_equipment_type"].values()), completed)
+        # Seeded repairs take between 1 and 300 hours
+        self.assertGreaterEqual(report["overall"]["percentiles"][50], 1)
+        self.assertLessEqual(report["overall"]["percentiles"][99], 300)
+
+    def test_dashboard_reads_only_recent_durations(self):
+        import interface
+        from benchmark import seeded_database, count_queries
+        with seeded_database(300):
+            conn = get_connection()
+            conn.execute("UPDATE requests SET completion_date = datetime('now', '-1 day') WHERE id IN (4, 5) AND status_id = 5")
+            recent = conn.execute("SELECT count(*) FROM requests WHERE status_id = 5 AND completion_date >= datetime('now', '-30 days')").fetchone()[0]
+            conn.commit()
+            conn.close()
+            with count_queries() as counter:
+                interface.MainApp.statistics_message()
+            # The statistics dialog stays on the materialized tables
+            self.assertFalse(any("julianday" in statement for statement in counter["statements"]))
+            msg = interface.MainApp.durations_message()
+        self.assertIn(f"за {interface.DURATION_REPORT_DAYS} дней: {recent}\n", msg)
+        self.assertGreater(recent, 0)
+
+class TestStatusHistory(unittest.TestCase):
+    def history(self, request_id):
+        conn = get_connection()
+        rows = conn.execute("""
+            SELECT status_id, changed_by, previous_status_id, previous_changed_at, changed_at
+            FROM request_status_history WHERE request_id = ? ORDER BY changed_at, id
+        """, (request_id,)).fetchall()
+        conn.close()
+        return rows
+
+    def test_every_status_change_is_recorded(self):
+        from benchmark import seeded_database
+        with seeded_database(12):
+            number = RequestService.create_request(("History Client", "+79995550000"), ("SN-HIST", "M", "T"), "History")
+            req_id = next(r.id for r in RequestService.get_requests("Administrator", 1) if r.request_number == number)
+            RequestService.assign_specialist(req_id, 3, changed_by=1)
+            RequestService.update_status(req_id, STATUS_IN_PROGRESS, changed_by=3)
+            RequestService.update_status(req_id, STATUS_IN_PROGRESS, changed_by=3)  # not a change
+            RequestService.update_status(req_id, STATUS_COMPLETED, changed_by=3)
+            
+            history = self.history(req_id)
+            self.assertEqual([row[0] for row in history], [STATUS_NEW, 2, STATUS_IN_PROGRESS, STATUS_COMPLETED])
+            self.assertEqual([row[1] for row in history], [None, 1, 3, 3])
+            self.assertIsNone(history[0][2])
+            for previous, row in zip(history, history[1:]):
+                self.assertEqual((row[2], row[3]), (previous[0], previous[4]))
+            
+            conn = get_connection()
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute("UPDATE request_status_history SET status_id = 1 WHERE request_id = ?", (req_id,))
+            conn.close()
+
+    def test_time_in_status_matches_history(self):
+        from stats_module import time_in_status
+        from benchmark import seeded_database
+        with seeded_database(600):
+            conn = get_connection()
+            spans = conn.execute("""
+                SELECT previous_status_id, changed_at, previous_changed_at FROM request_status_history
+                WHERE previous_status_id IS NOT NULL
+            """).fetchall()
+            conn.close()
+            fmt = "%Y-%m-%d %H:%M:%S"
+            totals = {}
+            for status_id, ended, started in spans:
+                hours = (datetime.strptime(ended, fmt) - datetime.strptime(started, fmt)).total_seconds() / 3600
+                count, total = totals.get(status_id, (0, 0.0))
+                totals[status_id] = (count + 1, total + hours)
+            
+            result = time_in_status(include_open=False)
+            self.assertEqual({r["status_id"]: r["span_count"] for r in result}, {k: v[0] for k, v in totals.items()})
+            for r in result:
+                self.assertAlmostEqual(r["total_hours"], totals[r["status_id"]][1], places=1)
+            self.assertEqual(result[0]["status"], "New")
+            
+            # Request 4 is completed 5 hours after creation: 10 + 20 minutes, then 4.5 hours in progress
+            one = {r["status"]: r["total_hours"] for r in time_in_status(request_id=4)}
+            self.assertEqual(one, {"New": 0.17, "Registered": 0.33, "In Progress": 4.5})
+            
+            by_specialist = time_in_status(("specialist", "status"), specialist_id=3, include_open=False)
+            self.assertEqual(sum(r["span_count"] for r in by_specialist), len(spans))
+            self.assertEqual({r["specialist"] for r in by_specialist}, {"Specialist User"})
+            self.assertEqual(time_in_status(specialist_id=2, include_open=False), [])
+
+    def test_open_spans_and_period_clipping(self):
+        from stats_module import time_in_status
+        from benchmark import seeded_database
+        with seeded_database(12):
+            # Request 2: New at 00:02, Registered at 00:12, In Progress since 00:32
+            current = time_in_status(request_id=2, now="2024-01-01 02:32:00")
+            self.assertEqual({r["status"]: r["total_hours"] for r in current},
+                             {"New": 0.17, "Registered": 0.33, "In Progress": 2.0})
+            window = time_in_status(("status", "day"), request_id=2, now="2024-01-01 02:32:00",
+                                    date_from="2024-01-01 00:07:00", date_to="2024-01-01 00:42:00")
+            self.assertEqual([(r["status"], r["day"], r["total_hours"]) for r in window],
+                             [("New", "2024-01-01", 0.08), ("Registered", "2024-01-01", 0.33),
+                              ("In Progress", "2024-01-01", 0.17)])
+            self.assertEqual(time_in_status(date_from="2030-01-01", now="2024-06-01"), [])
+            with self.assertRaises(ValueError):
+                time_in_status(group_by="weekday")
+
+    def test_backfill_for_directly_inserted_requests(self):
+        from stats_module import backfill_status_history
+        from benchmark import seeded_database
+        with seeded_database(12) as db_name:
+            conn = sqlite3.connect(db_name)
+            conn.execute("""
+                INSERT INTO requests (id, request_number, creation_date, problem_description, client_id, equipment_id, status_id, completion_date)
+                VALUES (100, 'IMPORTED-1', '2023-05-01 10:00:00', 'Imported', 1, 1, 5, '2023-05-03 10:00:00')
+            """)
+            conn.commit()
+            conn.close()
+            existing = self.history(1)
+            backfill_status_history()
+            backfill_status_history()
+            history = self.history(100)
+            self.assertEqual([(row[0], row[2]) for row in history], [(STATUS_NEW, None), (STATUS_COMPLETED, STATUS_NEW)])
+            self.assertEqual(self.history(1), existing)
+
+class TestOverdueSweeper(unittest.TestCase):
+    def open_past_deadline(self, now):
+        conn = get_connection()
+        rows = conn.execute("""
+            SELECT id, status_id FROM requests
+            WHERE status_id IN (1, 2, 3, 4) AND deadline_date < ? ORDER BY id
+        """, (now,)).fetchall()
+        conn.close()
+        return rows
+
+    def sweep_counting_steps(self, now):
+        # VM instructions are proportional to the rows SQLite visits
+        steps = [0]
+        def tick():
+            steps[0] += 1
+            return 0
+        with database.connection() as conn:
+            conn.set_progress_handler(tick, 10)
+            try:
+                marked = RequestService.mark_overdue(now)
+            finally:
+                conn.set_progress_handler(None, 10)
+        return marked, steps[0]
+
+    def test_marks_open_requests_past_deadline(self):
+        from benchmark import seeded_database
+        with seeded_database(120):
+            # Seeded deadlines are 2024-01-08 00:00 plus i minutes
+            expected = self.open_past_deadline("2024-01-08 00:30:00")
+            self.assertTrue(expected)
+            marked = RequestService.mark_overdue(datetime(2024, 1, 8, 0, 30))
+            self.assertEqual(marked, [request_id for request_id, _ in expected])
+            self.assertEqual(self.open_past_deadline("2024-01-08 00:30:00"), [])
+            self.assertEqual(RequestService.mark_overdue(datetime(2024, 1, 8, 0, 30)), [])
+            
+            conn = get_connection()
+            history = conn.execute("""
+                SELECT request_id, previous_status_id FROM request_status_history
+                WHERE status_id = ? AND changed_at = '2024-01-08 00:30:00' ORDER BY request_id
+            """, (STATUS_OVERDUE,)).fetchall()
+            completed = conn.execute("SELECT count(*) FROM requests WHERE status_id = 5 AND id <= 30").fetchone()[0]
+            conn.close()
+            self.assertEqual(history, expected)
+            self.assertEqual(completed, 5)
+
+    def test_request_moved_back_stays_until_deadline_changes(self):
+        from benchmark import seeded_database, count_queries
+        now = datetime(2024, 1, 8, 0, 30)
+        with seeded_database(120):
+            request_id = RequestService.mark_overdue(now)[0]
+            self.assertTrue(RequestService.update_status(request_id, STATUS_IN_PROGRESS))
+            with count_queries() as counter:
+                self.assertEqual(RequestService.mark_overdue(now), [])
+            # Nothing due: one read, no write transaction
+            self.assertEqual(len(counter["statements"]), 1)
+            self.assertTrue(counter["statements"][0].startswith("SELECT"))
+            self.assertEqual(RequestService.get_request(request_id).status_id, STATUS_IN_PROGRESS)
+
+            # A new deadline that has passed as well is swept again
+            self.assertTrue(RequestService.update_deadline(request_id, "2024-01-08 00:20:00"))
+            self.assertEqual(RequestService.mark_overdue(now), [request_id])
+            conn = get_connection()
+            marks = conn.execute("SELECT count(*) FROM request_status_history WHERE request_id = ? AND status_id = ?",
+                                 (request_id, STATUS_OVERDUE)).fetchone()[0]
+            conn.close()
+            self.assertEqual(marks, 2)
+
+    def test_cost_does_not_depend_on_table_size(self):
+        from benchmark import seeded_database
+        first = datetime(2024, 1, 8, 12)
+        results = []
+        for size in (2000, 40000):
+            with seeded_database(size):
+                backlog, _ = self.sweep_counting_steps(first)
+                newly, steps = self.sweep_counting_steps(first + timedelta(minutes=30))
+            results.append((backlog, newly, steps))
+        (small_backlog, small_new, small_steps), (large_backlog, large_new, large_steps) = results
+        self.assertEqual((small_backlog, small_new), (large_backlog, large_new))
+        self.assertTrue(small_new)
+        # 20x more requests, same work for the same newly overdue rows
+        self.assertLess(large_steps, small_steps * 1.5)
+
+    def test_background_sweeper(self):
+        import threading
+        from overdue_sweeper import OverdueSweeper
+        from benchmark import seeded_database
+        with seeded_database(60):
+            swept = threading.Event()
+            marked = []
+            sweeper = OverdueSweeper(interval=0.05, on_sweep=lambda ids: (marked.extend(ids), swept.set()))
+            sweeper.start()
+            try:
+                self.assertTrue(swept.wait(5))
+            finally:
+                sweeper.stop(5)
+            # Every seeded deadline is in the past
+            self.assertEqual(self.open_past_deadline(datetime.now().strftime("%Y-%m-%d %H:%M:%S")), [])
+            self.assertEqual(len(marked), 40)
+
+class TestRequestNumbers(unittest.TestCase):
+    def test_numbers_are_sequential_per_prefix_and_year(self):
+        from services import allocate_request_numbers
+        from benchmark import seeded_database
+        with seeded_database(5):
+            first = RequestService.create_request(("Seq Client", "+79990001111"), ("SN-SEQ-1", "M", "T"), "One")
+            second = RequestService.create_request(("Seq Client", "+79990001111"), ("SN-SEQ-2", "M", "T"), "Two")
+            branch = RequestService.create_request(("Seq Client", "+79990001111"), ("SN-SEQ-3", "M", "T"), "Three",
+                                                   branch_prefix="SPB")
+            year = datetime.now().year
+            self.assertEqual([first, second, branch], [f"REQ-{year}-0001", f"REQ-{year}-0002", f"SPB-{year}-0001"])
+            
+            block = database.run_in_transaction(lambda conn: allocate_request_numbers(conn, 3, "SPB"))
+            self.assertEqual(block, [f"SPB-{year}-0002", f"SPB-{year}-0003", f"SPB-{year}-0004"])
+            self.assertEqual(database.run_in_transaction(lambda conn: allocate_request_numbers(conn, 1, "SPB", 2030)),
+                             ["SPB-2030-0001"])
+            with self.assertRaises(ValueError):
+                database.run_in_transaction(lambda conn: allocate_request_numbers(conn, 1, "bad prefix"))
+
+    def test_rolled_back_and_existing_numbers(self):
+        from services import allocate_request_numbers
+        from benchmark import seeded_database
+        with seeded_database(5) as db_name:
+            # Rows already in the new format (e.g. restored from a backup) are skipped
+            conn = sqlite3.connect(db_name)
+            conn.execute("UPDATE requests SET request_number = 'MSK-2025-0041' WHERE id = 1")
+            conn.commit()
+            conn.close()
+            
+            def fail(conn):
+                allocate_request_numbers(conn, 5, "MSK", 2025)
+                raise RuntimeError("rolled back")
+            with self.assertRaises(RuntimeError):
+                database.run_in_transaction(fail)
+            self.assertEqual(database.run_in_transaction(lambda conn: allocate_request_numbers(conn, 1, "MSK", 2025)),
+                             ["MSK-2025-0042"])
+
+class TestBulkCreate(unittest.TestCase):
+    def test_mixed_batch(self):
+        from benchmark import seeded_database
+        with seeded_database(10) as db_name:
+            rows = [
+                (("Client 1", "+79000000001"), ("SN-00000001", "Model 1", "Type 1"), "Existing client and equipment"),
+                (("Bulk A", "+79991110001"), ("SN-BULK-1", "Model B", "Type B"), "New client"),
+                (("Bulk A again", "+79991110001"), ("SN-BULK-2", "Model B", "Type B"), "Same new client"),
+                (("Bulk C", "+79991110003"), ("SN-BULK-1", "Model B", "Type B"), "Same new serial"),
+                (("Broken", ""), ("SN-BULK-9", "Model B", "Type B"), "Missing phone"),
+                "not a row",
+            ]
+            conn = sqlite3.connect(db_name)
+            counts = lambda: [conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0]
+                              for t in ("clients", "equipment", "requests", "request_status_history")]
+            before = counts()
+            results = RequestService.create_requests_bulk(rows)
+            after = counts()
+            
+            self.assertEqual([r.index for r in results], list(range(len(rows))))
+            created = [r.request_number for r in results[:4]]
+            self.assertTrue(all(created) and all(r.error is None for r in results[:4]))
+            self.assertEqual(len(set(created)), 4)
+            self.assertIn("phone", results[4].error)
+            self.assertIsNone(results[5].request_number)
+            self.assertIsNotNone(results[5].error)
+            self.assertEqual([a - b for a, b in zip(after, before)], [2, 2, 4, 4])
+            
+            # Rows share the client and equipment created by earlier rows
+            owners = conn.execute(f"""
+                SELECT r.request_number, c.full_name, e.serial_number FROM requests r
+                JOIN clients c ON c.id = r.client_id JOIN equipment e ON e.id = r.equipment_id
+                WHERE r.request_number IN ({", ".join("?" * 4)}) ORDER BY r.id
+            """, created).fetchall()
+            conn.close()
+            self.assertEqual([row[1:] for row in owners], [
+                ("Client 1", "SN-00000001"), ("Bulk A", "SN-BULK-1"), ("Bulk A", "SN-BULK-2"), ("Bulk C", "SN-BULK-1"),
+            ])
+            self.assertEqual(RequestService.create_request(("Single", "+79991119999"), ("SN-ONE", "M", "T"), "After"),
+                             f"REQ-{datetime.now().year}-{5:04d}")
+
+    def test_lookups_are_chunked(self):
+        from benchmark import seeded_database
+        with seeded_database(10):
+            rows = [((f"Chunk {i}", f"+7555{i:07d}"), (f"SN-CHUNK-{i}", "M", "T"), "Chunked") for i in range(1200)]
+            results = RequestService.create_requests_bulk(rows)
+            self.assertTrue(all(r.request_number for r in results))
+            self.assertEqual(RequestService.create_requests_bulk([]), [])
+
+class TestFullTextSearch(unittest.TestCase):
+    def create(self, number, problem, client, model):
+        request_number = RequestService.create_request((client, f"+7955000{number:04d}"), (f"SN-FTS-{number}", model, "T"), problem)
+        return next(r.id for r in RequestService.get_requests("Administrator", 1) if r.request_number == request_number)
+
+    def found(self, query, *args):
+        return [r.id for r in RequestService.search_requests(query, *args)]
+
+    def test_ranked_prefix_search(self):
+        from benchmark import seeded_database
+        with seeded_database(40):
+            in_problem = self.create(1, "Принтер не печатает, замятие бумаги", "Иванов Пётр", "LaserJet 1020")
+            in_comment = self.create(2, "Не включается", "Смирнова Анна", "Aquos 32")
+            RequestService.add_comment(in_comment, 1, "Принтер рядом тоже сломан")
+            
+            # The problem text outweighs a comment
+            self.assertEqual(self.found("принтер"), [in_problem, in_comment])
+            self.assertEqual(self.found("ЗАМЯТ"), [in_problem])
+            self.assertEqual(self.found("laserjet 10"), [in_problem])
+            self.assertEqual(self.found("смирнова"), [in_comment])
+            self.assertEqual(self.found("принтер бумаги"), [in_problem])
+            self.assertEqual(self.found("Client 7")[0], 7)
+            self.assertEqual(len(RequestService.search_requests("Problem", limit=5)), 5)
+            
+            # Specialists only find their own requests
+            self.assertEqual(self.found("принтер", "Specialist", 3), [])
+            RequestService.assign_specialist(in_comment, 3)
+            self.assertEqual(self.found("принтер", "Specialist", 3), [in_comment])
+            
+            # User input never reaches the FTS query syntax
+            for query in ("", "   ", '"', "NEAR(a b)", "принтер OR *", "problem:x", "a AND"):
+                RequestService.search_requests(query)
+            self.assertEqual(self.found(",.;"), [])
+
+    def test_dashboard_search_uses_full_text(self):
+        from benchmark import seeded_database
+        with seeded_database(40):
+            printer = self.create(1, "Принтер не печатает", "Иванов Пётр", "LaserJet 1020")
+            other = self.create(2, "Не включается", "Смирнова Анна", "Aquos 32")
+            RequestService.add_comment(other, 1, "Принтер рядом тоже сломан")
+            listed = lambda search, *args: sorted(r.id for r in RequestService.get_requests_page(
+                *(args or ("Administrator", 1)), search=search).items)
+            self.assertEqual(listed("принтер"), sorted([printer, other]))
+            self.assertEqual(listed("иванов laserjet"), [printer])
+            # Number, phone and serial prefixes still work from the same box
+            self.assertEqual(listed("+79550000002"), [other])
+            self.assertEqual(listed("SN-FTS-1"), [printer])
+            self.assertEqual(listed("принтер", "Specialist", 3), [])
+            # The change feed follows the same filter
+            token = RequestService.get_sync_token()
+            RequestService.toggle_help_needed(printer, True)
+            RequestService.toggle_help_needed(1, True)
+            changes = RequestService.get_changes(token, "Administrator", 1, search="принтер")
+            self.assertEqual([r.id for r in changes.items], [printer])
+
+    def test_index_follows_changes(self):
+        from benchmark import seeded_database
+        with seeded_database(20) as db_name:
+            req_id = self.create(1, "Гудит вентилятор", "Петров", "Vostro")
+            RequestService.add_comment(req_id, 1, "Заказан кулер")
+            self.assertEqual(self.found("кулер"), [req_id])
+            
+            conn = sqlite3.connect(db_name)
+            conn.execute("UPDATE clients SET full_name = 'Сидоров' WHERE full_name = 'Петров'")
+            conn.execute("UPDATE equipment SET model = 'Latitude' WHERE serial_number = 'SN-FTS-1'")
+            conn.execute("UPDATE requests SET problem_description = 'Стучит диск' WHERE id = ?", (req_id,))
+            conn.execute("UPDATE comments SET text = 'Заказан диск' WHERE request_id = ?", (req_id,))
+            conn.commit()
+            self.assertEqual(self.found("петров"), [])
+            self.assertEqual(self.found("сидоров latitude"), [req_id])
+            self.assertEqual(self.found("вентилятор"), [])
+            self.assertEqual(self.found("кулер"), [])
+            
+            conn.execute("DELETE FROM comments WHERE request_id = ?", (req_id,))
+            conn.commit()
+            self.assertEqual(self.found("заказан"), [])
+            self.assertEqual(self.found("диск"), [req_id])
+            conn.execute("DELETE FROM request_specialists WHERE request_id = 1")
+            conn.execute("DELETE FROM requests WHERE id = 1")
+            conn.commit()
+            indexed = conn.execute("SELECT count(*) FROM requests_fts").fetchone()[0]
+            conn.close()
+            self.assertEqual(indexed, 20)
+            self.assertNotIn(1, self.found("Client 1"))
+
+    def test_migration_builds_index_for_existing_rows(self):
+        from benchmark import seeded_database
+        with seeded_database(30) as db_name:
+            # Simulate a database from before the full-text index
+            conn = sqlite3.connect(db_name)
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '%_fts_%'").fetchall():
+                conn.execute(f"DROP TRIGGER {name}")
+            conn.execute("DROP TABLE requests_fts")
+            conn.execute("PRAGMA user_version = 7")
+            conn.commit()
+            conn.close()
+            
+            self.assertEqual(database.migrate(db_name), [v for v, _, _ in database.MIGRATIONS if v >= 8])
+            self.assertEqual(self.found("Client 12")[0], 12)
+            self.assertEqual(len(RequestService.search_requests("Problem 3", limit=100)), 3)
+
+class TestImportEngine(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        import shutil
+        database.close_all()
+        shutil.rmtree(self.tmp_dir)
+    
+    def import_into(self, name, base_dir, batch_size=None, workers=1):
+        import import_engine
+        db_name = os.path.join(self.tmp_dir, name)
+        init_db(db_name)
+        engine = import_engine.ImportEngine(db_name, batch_size or import_engine.BATCH_SIZE, workers=workers)
+        return db_name, engine.run(base_dir)
+    
+    def test_both_dataset_layouts(self):
+        for base_dir, requests, comments in (("import_БытСервис", 7, 5), ("Кондиционеры_данные", 5, 3)):
+            db_name, report = self.import_into(base_dir + ".db", base_dir)
+            self.assertEqual(report["skipped"], {"users": 0, "requests": 0, "comments": 0})
+            self.assertEqual((report["requests"], report["comments"]), (requests, comments))
+            conn = sqlite3.connect(db_name)
+            rows = conn.execute("""
+                SELECT count(*), count(DISTINCT e.type), min(r.request_number), count(rs.specialist_id)
+                FROM requests r JOIN equipment e ON e.id = r.equipment_id
+                LEFT JOIN request_specialists rs ON rs.request_id = r.id
+            """).fetchone()
+            history = conn.execute("SELECT count(DISTINCT request_id) FROM request_status_history").fetchone()[0]
+            conn.close()
+            self.assertEqual(rows[0], requests)
+            self.assertGreater(rows[1], 0)
+            self.assertEqual(rows[2], "REQ-OLD-1")
+            self.assertEqual(rows[3], report["specialists"])
+            self.assertEqual(history, requests)
+
+    def test_matches_equipment_of_original_importer(self):
+        import import_engine
+        db_name, _ = self.import_into("legacy.db", "Кондиционеры_данные")
+        conn = sqlite3.connect(db_name)
+        serial = conn.execute("""
+            SELECT e.serial_number FROM requests r JOIN equipment e ON e.id = r.equipment_id
+            WHERE r.request_number = 'REQ-OLD-1'
+        """).fetchone()[0]
+        # What import_legacy_data.py left behind: a request whose equipment it created
+        conn.execute("DELETE FROM requests WHERE request_number = 'REQ-OLD-2'")
+        conn.commit()
+        equipment = conn.execute("SELECT count(*) FROM equipment").fetchone()[0]
+        conn.close()
+        self.assertEqual(serial, "LEGACY-1")
+
+        import_engine.ImportEngine(db_name).run("Кондиционеры_данные")
+        conn = sqlite3.connect(db_name)
+        self.assertEqual(conn.execute("SELECT count(*) FROM equipment").fetchone()[0], equipment)
+        self.assertEqual(conn.execute("""
+            SELECT e.serial_number FROM requests r JOIN equipment e ON e.id = r.equipment_id
+            WHERE r.request_number = 'REQ-OLD-2'
+        """).fetchone()[0], "LEGACY-2")
+        conn.close()
+        self.assertEqual(import_engine.equipment_serial("REQ-B-", 2), "LEGACY-REQ-B-2")
+
+    def test_txt_and_xlsx_sources(self):
+        import import_engine
+        for base_dir in ("import_БытСервис", "Кондиционеры_данные"):
+            for kind in import_engine.DATASET_FILES:
+                rows = {source_format: list(import_engine.read_rows(import_engine.dataset_path(base_dir, kind, source_format)))
+                        for source_format in import_engine.SOURCE_FORMATS}
+                self.assertEqual(rows["txt"], rows["csv"])
+                if (base_dir, kind) != ("import_БытСервис", "comments"):
+                    self.assertEqual(rows["xlsx"], rows["csv"], (base_dir, kind))
+        
+        # That workbook repeats comment 1 as comment 4; the repeat is not added twice
+        db_name = os.path.join(self.tmp_dir, "xlsx.db")
+        init_db(db_name)
+        report = import_engine.ImportEngine(db_name, source_format="xlsx").run("import_БытСервис")
+        self.assertEqual((report["requests"], report["comments"], report["skipped"]["comments"]), (7, 4, 1))
+        self.assertEqual(report["problems"]["comments"]["duplicate"], 1)
+    
+    def test_xlsx_streaming_and_resume(self):
+        import import_engine
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 30, source_format="xlsx")
+        path = import_engine.dataset_path(base_dir, "requests")
+        self.assertTrue(str(path).endswith(".xlsx"))
+        reader = import_engine.open_source(path, offset=20, row_number=20)
+        rows = list(reader)
+        self.assertEqual([row["requestID"] for row in rows], [str(i) for i in range(21, 31)])
+        self.assertEqual((reader.offset, reader.row_number), (30, 30))
+        self.assertEqual(rows[0]["completionDate"], "null")
+        self.assertEqual(import_engine.XlsxReader._number("45000.5", True), "2023-03-15 12:00:00")
+        self.assertEqual(import_engine.XlsxReader._number("8.9210563128E10", False), "89210563128")
+    
+    def test_bad_rows_are_reported(self):
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 30)
+        with open(os.path.join(base_dir, "Заявки", "inputDataRequests.csv"), "a", encoding="utf-8") as f:
+            f.write("31;06.06.2023;T;M;Bad date;Новая заявка;null;;1;3\n")
+            f.write("32;2023-06-06;T;M;No such client;Новая заявка;null;;1;999\n")
+            f.write("5;2023-06-06;T;M;Duplicate;Новая заявка;null;;1;3\n")
+            f.write("33;2023-06-06;T;M;No such master;Новая заявка;null;;999;3\n")
+        with open(os.path.join(base_dir, "Комментарии", "inputDataComments.csv"), "a", encoding="utf-8") as f:
+            f.write("31;Lost comment;1;999\n")
+        
+        _, report = self.import_into("bad.db", base_dir)
+        self.assertEqual(report["requests"], 31)
+        self.assertEqual(report["skipped"], {"users": 0, "requests": 3, "comments": 1})
+        reasons = [(issue["file"], issue["row"], issue.get("kept", False)) for issue in report["issues"]]
+        self.assertEqual(reasons, [("requests", 31, False), ("requests", 32, False), ("requests", 33, False),
+                                   ("requests", 34, True), ("comments", 31, False)])
+        self.assertIn("bad date", report["issues"][0]["reason"])
+    
+    def test_dry_run_predicts_import(self):
+        import json
+        import import_engine
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 40)
+        with open(os.path.join(base_dir, "Пользователи", "inputDataUsers.csv"), "a", encoding="utf-8") as f:
+            f.write("3;Same client again;+78000000003;;;Заказчик\n")
+            f.write("11;No login;+78000000011;;;Мастер\n")
+        with open(os.path.join(base_dir, "Заявки", "inputDataRequests.csv"), "a", encoding="utf-8") as f:
+            f.write("41;2023-13-01;T;M;Bad month;Новая заявка;null;;1;3\n")
+            f.write("42;2023-06-06;T;M;No such client;Новая заявка;null;;1;999\n")
+            f.write("7;2023-06-06;T;M;Duplicate;Новая заявка;null;;1;3\n")
+            f.write("43;2023-06-06;T;M;Client as master;Новая заявка;null;;3;3\n")
+        with open(os.path.join(base_dir, "Комментарии", "inputDataComments.csv"), "a", encoding="utf-8") as f:
+            f.write("41;Lost comment;1;999\n")
+            f.write("42;Comment 1;2;1\n")
+            f.write("43;From a client;3;1\n")
+        
+        db_name = os.path.join(self.tmp_dir, "never-created.db")
+        predicted = import_engine.ImportEngine(db_name, workers=1).validate(base_dir)
+        self.assertFalse(os.path.exists(db_name))
+        json.dumps(predicted)
+        self.assertEqual(predicted["problems"], {
+            "users": {"malformed": 1, "orphan": 0, "duplicate": 1},
+            "requests": {"malformed": 1, "orphan": 2, "duplicate": 1},
+            "comments": {"malformed": 0, "orphan": 2, "duplicate": 1},
+        })
+        
+        _, report = self.import_into("actual.db", base_dir)
+        for key in ("users", "clients", "requests", "specialists", "comments", "skipped", "problems"):
+            self.assertEqual(predicted[key], report[key], key)
+        by_row = lambda issues: sorted(issues, key=lambda issue: (issue["file"], issue["row"]))
+        self.assertEqual(by_row(predicted["issues"]), by_row(report["issues"]))
+    
+    def test_batch_size_and_workers_do_not_change_result(self):
+        import import_engine
+        from unittest import mock
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 50)
+        tables = []
+        for name, batch_size, workers in (("one.db", None, 1), ("small.db", 7, 1), ("pool.db", 7, 2)):
+            with mock.patch.object(import_engine, "PARALLEL_MIN_BYTES", 0):
+                db_name, report = self.import_into(name, base_dir, batch_size, workers)
+            conn = sqlite3.connect(db_name)
+            tables.append([conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()
+                           for table in ("clients", "users", "equipment", "requests")] + [
+                conn.execute("SELECT request_id, user_id, text FROM comments ORDER BY id").fetchall()])
+            conn.close()
+        self.assertEqual(tables[0], tables[1])
+        self.assertEqual(tables[0], tables[2])
+        self.assertEqual(len(tables[0][3]), 50)
+    
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        import import_engine
+        from unittest import mock
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 50)
+        db_name = os.path.join(self.tmp_dir, "resume.db")
+        init_db(db_name)
+        
+        def crash_at_25(row):
+            if row["requestID"] == "25":
+                raise RuntimeError("power cut")
+            return import_engine.parse_request(row)
+        with mock.patch.dict(import_engine.PARSERS, {"requests": crash_at_25}):
+            with self.assertRaises(RuntimeError):
+                import_engine.ImportEngine(db_name, batch_size=10, workers=1).run(base_dir)
+        
+        count = lambda table: sqlite3.connect(db_name).execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        self.assertEqual(count("requests"), 20)
+        report = import_engine.ImportEngine(db_name, batch_size=10, resume=True).run(base_dir)
+        self.assertEqual(report["resumed"], {"users": 10, "requests": 20})
+        self.assertEqual((report["requests"], report["updated"]["requests"], report["comments"]), (30, 0, 50))
+        self.assertEqual((count("requests"), count("equipment"), count("comments")), (50, 50, 50))
+        
+        # Finished files are not read again
+        report = import_engine.ImportEngine(db_name, resume=True).run(base_dir)
+        self.assertEqual((report["requests"], report["updated"]["requests"], report["comments"]), (0, 0, 0))
+    
+    def test_reimport_of_same_data_changes_nothing(self):
+        import import_engine
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 20)
+        db_name, _ = self.import_into("reimport.db", base_dir)
+        conn = sqlite3.connect(db_name)
+        token = conn.execute("SELECT version FROM request_change_counter").fetchone()[0]
+        conn.close()
+        report = import_engine.ImportEngine(db_name).run(base_dir)
+        self.assertEqual((report["requests"], report["updated"]["requests"]), (0, 20))
+        conn = sqlite3.connect(db_name)
+        # No row was rewritten, so the change feed and FTS triggers never fired
+        self.assertEqual(conn.execute("SELECT version FROM request_change_counter").fetchone()[0], token)
+        conn.close()
+
+    def test_changed_file_is_upserted(self):
+        import import_engine
+        from benchmark import write_dataset
+        base_dir = os.path.join(self.tmp_dir, "dataset")
+        write_dataset(base_dir, 20)
+        db_name, _ = self.import_into("upsert.db", base_dir)
+        requests_csv = os.path.join(base_dir, "Заявки", "inputDataRequests.csv")
+        with open(requests_csv, encoding="utf-8") as f:
+            lines = f.readlines()
+        lines[3] = lines[3].replace("В процессе ремонта", "Ожидание запчастей")
+        lines.append("21;2023-07-01;T;M;New one;Новая заявка;null;;1;3\n")
+        with open(requests_csv, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        
+        report = import_engine.ImportEngine(db_name, resume=True).run(base_dir)
+        self.assertEqual(report["resumed"], {"users": 10, "comments": 20})
+        self.assertEqual((report["requests"], report["updated"]["requests"], report["comments"]), (1, 20, 0))
+        self.assertEqual((report["users"], report["clients"]), (0, 0))
+        conn = sqlite3.connect(db_name)
+        counts = [conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                  for table in ("users", "clients", "equipment", "requests", "comments")]
+        status = conn.execute("SELECT status_id FROM requests WHERE request_number = 'REQ-OLD-3'").fetchone()[0]
+        history = conn.execute("""
+            SELECT h.status_id FROM request_status_history h JOIN requests r ON r.id = h.request_id
+            WHERE r.request_number = 'REQ-OLD-3' ORDER BY h.id
+        """).fetchall()
+        conn.close()
+        self.assertEqual(counts[2:], [21, 21, 20])
+        self.assertEqual(status, 4)
+        self.assertEqual(history[-1], (4,))
+
 if __name__ == '__main__':
     unittest.main()
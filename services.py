@@ -1,7 +1,12 @@
 import sqlite3
+import base64
+import json
+import os
+import re
 from datetime import datetime, timedelta
-from database import get_connection
-from models import User, Request, Client, Equipment, Comment, Part
+from database import connection, lookup_ids, run_in_transaction
+from stats_module import record_completion, record_status_change
+from models import User, Request, RequestPage, RequestChanges, BulkCreateResult, Client, Equipment, Comment, Part
 import csv
 
 # Status Constants
@@ -12,20 +17,235 @@ STATUS_WAITING_PARTS = 4
 STATUS_COMPLETED = 5
 STATUS_OVERDUE = 6
 
+# Default number of requests per dashboard page
+DEFAULT_PAGE_SIZE = 50
+
+# Most changed requests get_changes returns; past that, reloading the listing is cheaper
+CHANGE_FEED_LIMIT = 500
+
+# Request numbers look like REQ-2026-0042: branch prefix, year, then a per
+# prefix and year sequence. REPAIR_BRANCH_PREFIX selects the branch.
+REQUEST_NUMBER_PREFIX = os.environ.get("REPAIR_BRANCH_PREFIX", "REQ")
+
+# Statuses a request can become overdue from
+_OVERDUE_FROM = (STATUS_NEW, STATUS_REGISTERED, STATUS_IN_PROGRESS, STATUS_WAITING_PARTS)
+
+# Separator for specialist names aggregated with group_concat (ASCII unit separator,
+# never typed into a name field)
+_SPECIALIST_SEPARATOR = "\x1f"
+
+# Shared SELECT for request listings. Assigned specialists are aggregated by a
+# correlated subquery over the request_specialists primary key, so a listing is
+# a single statement no matter how many rows it returns.
+_REQUEST_SELECT = """
+    SELECT r.id, r.request_number, r.creation_date, r.problem_description, 
+           r.client_id, r.equipment_id, r.status_id, s.name as status_name,
+           c.full_name as client_name, c.phone as client_phone, e.model as eq_model, r.completion_date, r.deadline_date, r.help_needed,
+           (SELECT group_concat(u.full_name, char(31))
+            FROM request_specialists rsa
+            JOIN users u ON u.id = rsa.specialist_id
+            WHERE rsa.request_id = r.id) as specialists
+    FROM requests r
+    JOIN statuses s ON r.status_id = s.id
+    JOIN clients c ON r.client_id = c.id
+    JOIN equipment e ON r.equipment_id = e.id
+"""
+
+def _row_to_request(row):
+    """Builds a Request from a row selected with _REQUEST_SELECT."""
+    return Request(
+        id=row[0],
+        request_number=row[1],
+        creation_date=row[2],
+        problem_description=row[3],
+        client_id=row[4],
+        equipment_id=row[5],
+        status_id=row[6],
+        status_name=row[7],
+        client_name=row[8],
+        client_phone=row[9],
+        equipment_model=row[10],
+        completion_date=row[11],
+        deadline_date=row[12],
+        help_needed=bool(row[13]),
+        assigned_specialists=row[14].split(_SPECIALIST_SEPARATOR) if row[14] else []
+    )
+
+# Requests whose number, client phone or equipment serial starts with the search text
+_PREFIX_SEARCH = """
+    SELECT id FROM requests WHERE request_number >= ? AND request_number < ?
+    UNION ALL
+    SELECT sr.id FROM clients sc JOIN requests sr ON sr.client_id = sc.id
+    WHERE sc.phone >= ? AND sc.phone < ?
+    UNION ALL
+    SELECT er.id FROM equipment se JOIN requests er ON er.equipment_id = se.id
+    WHERE se.serial_number >= ? AND se.serial_number < ?
+"""
+# ... or whose problem, comments, client name or model contain its words
+_TEXT_SEARCH = """
+    UNION ALL
+    SELECT rowid FROM requests_fts WHERE requests_fts MATCH ?
+"""
+
+def _prefix_range(prefix):
+    """[low, high) bounds of the strings starting with prefix (BINARY collation)."""
+    # U+10FFFF sorts after every character that can follow the prefix
+    return [prefix, prefix + "\U0010ffff"]
+
+def _request_filters(user_role, user_id, filter_status=None, search=None):
+    """Returns (join_sql, where_clauses, params) shared by the request listings."""
+    join_sql = ""
+    params = []
+    where_clauses = []
+    
+    # Role based filtering
+    if user_role == 'Specialist':
+        # Only assigned requests
+        join_sql = " JOIN request_specialists rs ON r.id = rs.request_id"
+        where_clauses.append("rs.specialist_id = ?")
+        params.append(user_id)
+        
+    if filter_status:
+        where_clauses.append("r.status_id = ?")
+        params.append(filter_status)
+        
+    if search:
+        # Prefix ranges, so each branch is an index range scan, plus the
+        # full-text index when the text has words
+        match = _fts_query(search)
+        where_clauses.append(f"r.id IN ({_PREFIX_SEARCH}{_TEXT_SEARCH if match else ''})")
+        params.extend(_prefix_range(search) * 3)
+        if match:
+            params.append(match)
+        
+    return join_sql, where_clauses, params
+
+def _dashboard_key(req):
+    """Sort key of the dashboard order (descending)."""
+    return (1 if req.help_needed else 0, req.creation_date, req.id)
+
+def merge_request_changes(items, changes, complete):
+    """
+    Applies RequestChanges to a listing loaded in dashboard order and returns
+    the patched list. `complete` says whether items is the whole listing; if
+    not, a changed request sorting after the last loaded one is left for the
+    page that will load it.
+    """
+    changed = {req.id: req for req in changes.items}
+    gone = set(changes.removed_ids) | set(changed)
+    merged = [req for req in items if req.id not in gone]
+    last_key = _dashboard_key(items[-1]) if items else None
+    added = [req for req in changed.values() if complete or (last_key is not None and _dashboard_key(req) >= last_key)]
+    if added:
+        merged.extend(added)
+        merged.sort(key=_dashboard_key, reverse=True)
+    return merged
+
+def _encode_page_token(direction, req):
+    key = [direction, 1 if req.help_needed else 0, req.creation_date, req.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+def _decode_page_token(token):
+    """Returns (direction, key); a missing token means the first page."""
+    if not token:
+        return "next", None
+    try:
+        direction, help_needed, creation_date, request_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid page token: {token!r}")
+    if direction not in ("next", "prev"):
+        raise ValueError(f"Invalid page token: {token!r}")
+    return direction, (help_needed, creation_date, request_id)
+
+def _fts_query(text):
+    """
+    Turns free text into an FTS5 MATCH expression: every word must occur,
+    as a prefix ("охлажд" finds "охлаждает"). Words are quoted, so FTS5
+    operators and punctuation typed by the user are matched literally.
+    Returns None when the text has no words.
+    """
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words) or None
+
+def format_request_number(prefix, year, value):
+    return f"{prefix}-{year}-{value:04d}"
+
+def allocate_request_numbers(conn, count=1, prefix=None, year=None):
+    """
+    Reserves a block of `count` consecutive request numbers and returns them.
+
+    Must run inside the write transaction that inserts the requests: SQLite
+    serializes writers, so the reservation cannot collide with another
+    process, and it rolls back together with the requests (no gaps).
+    """
+    prefix = prefix or REQUEST_NUMBER_PREFIX
+    if not prefix or any(ch.isspace() for ch in prefix):
+        raise ValueError(f"Invalid request number prefix: {prefix!r}")
+    year = year or datetime.now().year
+    row = conn.execute("""
+        UPDATE request_number_sequences SET last_value = last_value + ?
+        WHERE prefix = ? AND year = ?
+        RETURNING last_value
+    """, (count, prefix, year)).fetchone()
+    if row is None:
+        # First number for this prefix and year: continue after any existing
+        # numbers in the same format (e.g. restored or imported rows)
+        start = format_request_number(prefix, year, 0)[:-4]
+        existing = conn.execute("""
+            SELECT coalesce(max(CAST(substr(request_number, ?) AS INTEGER)), 0) FROM requests
+            WHERE request_number >= ? AND request_number < ?
+        """, (len(start) + 1, start, start[:-1] + chr(ord(start[-1]) + 1))).fetchone()[0]
+        row = conn.execute("""
+            INSERT INTO request_number_sequences (prefix, year, last_value) VALUES (?, ?, ?)
+            RETURNING last_value
+        """, (prefix, year, existing + count)).fetchone()
+    last = row[0]
+    return [format_request_number(prefix, year, value) for value in range(last - count + 1, last + 1)]
+
+def _validate_bulk_row(row):
+    """Returns (client_data, equipment_data, problem_desc) or raises ValueError."""
+    try:
+        client_data, equipment_data, problem_desc = row
+        full_name, phone = client_data
+        serial, model, eq_type = equipment_data
+    except (TypeError, ValueError):
+        raise ValueError("expected ((full_name, phone), (serial, model, type), problem)")
+    for field, value in (("full_name", full_name), ("phone", phone), ("serial", serial),
+                         ("model", model), ("type", eq_type), ("problem", problem_desc)):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} is empty")
+    return (full_name, phone), (serial, model, eq_type), problem_desc
+
+def _fetch_comments(cursor, request_id):
+    cursor.execute("""
+        SELECT c.id, c.request_id, c.user_id, c.text, c.created_at, u.full_name
+        FROM comments c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.request_id = ?
+        ORDER BY c.created_at ASC
+    """, (request_id,))
+    return [Comment(id=r[0], request_id=r[1], user_id=r[2], text=r[3], created_at=r[4], user_name=r[5]) for r in cursor.fetchall()]
+
+def _fetch_request_parts(cursor, request_id):
+    cursor.execute("""
+        SELECT p.id, p.name, p.stock_quantity, p.price, rp.quantity
+        FROM parts p
+        JOIN request_parts rp ON p.id = rp.part_id
+        WHERE rp.request_id = ?
+    """, (request_id,))
+    return [Part(id=r[0], name=r[1], stock_quantity=r[2], price=r[3], quantity_used=r[4]) for r in cursor.fetchall()]
+
 class UserService:
     @staticmethod
     def login(username, password):
-        conn = get_connection()
-        cursor = conn.cursor()
         query = """
             SELECT u.id, u.username, u.full_name, u.role_id, r.name 
             FROM users u 
             JOIN roles r ON u.role_id = r.id 
             WHERE u.username = ? AND u.password = ?
         """
-        cursor.execute(query, (username, password))
-        row = cursor.fetchone()
-        conn.close()
+        with connection() as conn:
+            row = conn.execute(query, (username, password)).fetchone()
         
         if row:
             return User(
@@ -39,16 +259,13 @@ class UserService:
 
     @staticmethod
     def get_all_users():
-        conn = get_connection()
-        cursor = conn.cursor()
         query = """
             SELECT u.id, u.username, u.full_name, u.role_id, r.name 
             FROM users u 
             JOIN roles r ON u.role_id = r.id
         """
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
+        with connection() as conn:
+            rows = conn.execute(query).fetchall()
         users = []
         for row in rows:
             users.append(User(
@@ -62,40 +279,31 @@ class UserService:
 
     @staticmethod
     def create_user(username, password, full_name, role_id):
-        conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute(
+            run_in_transaction(lambda conn: conn.execute(
                 "INSERT INTO users (username, password, full_name, role_id) VALUES (?, ?, ?, ?)",
                 (username, password, full_name, role_id)
-            )
-            conn.commit()
+            ))
             return True
         except sqlite3.IntegrityError:
             return False
-        finally:
-            conn.close()
             
     @staticmethod
     def get_specialists():
-        conn = get_connection()
-        cursor = conn.cursor()
         # Role 3 is Specialist
         query = "SELECT id, full_name FROM users WHERE role_id = 3"
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        with connection() as conn:
+            return conn.execute(query).fetchall()
 
 class RequestService:
     @staticmethod
-    def create_request(client_data, equipment_data, problem_desc):
+    def create_request(client_data, equipment_data, problem_desc, branch_prefix=None):
         # client_data: (full_name, phone)
         # equipment_data: (serial, model, type)
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        # branch_prefix: request number prefix, REQUEST_NUMBER_PREFIX by default
+        def work(conn):
+            cursor = conn.cursor()
+            
             # 1. Create or Get Client
             cursor.execute("SELECT id FROM clients WHERE phone = ?", (client_data[1],))
             client_row = cursor.fetchone()
@@ -119,7 +327,8 @@ class RequestService:
                 equipment_id = cursor.lastrowid
                 
             # 3. Create Request
-            req_number = f"REQ-{int(datetime.now().timestamp())}"
+            req_number = allocate_request_numbers(conn, 1, branch_prefix)[0]
+            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             # Default deadline: 7 days
             deadline = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
             cursor.execute(
@@ -127,89 +336,260 @@ class RequestService:
                 INSERT INTO requests (request_number, creation_date, problem_description, client_id, equipment_id, status_id, deadline_date)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                (req_number, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), problem_desc, client_id, equipment_id, STATUS_NEW, deadline)
+                (req_number, created_at, problem_desc, client_id, equipment_id, STATUS_NEW, deadline)
             )
-            conn.commit()
+            record_status_change(conn, cursor.lastrowid, STATUS_NEW, changed_at=created_at)
             return req_number
+            
+        try:
+            return run_in_transaction(work)
         except Exception as e:
             print(f"Error creating request: {e}")
-            conn.rollback()
             return None
-        finally:
-            conn.close()
 
     @staticmethod
-    def get_requests(user_role, user_id, filter_status=None):
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        base_query = """
-            SELECT r.id, r.request_number, r.creation_date, r.problem_description, 
-                   r.client_id, r.equipment_id, r.status_id, s.name as status_name,
-                   c.full_name as client_name, c.phone as client_phone, e.model as eq_model, r.completion_date, r.deadline_date, r.help_needed
-            FROM requests r
-            JOIN statuses s ON r.status_id = s.id
-            JOIN clients c ON r.client_id = c.id
-            JOIN equipment e ON r.equipment_id = e.id
+    def create_requests_bulk(rows, branch_prefix=None):
         """
-        
-        params = []
-        where_clauses = []
-        
-        # Role based filtering
-        if user_role == 'Specialist':
-            # Only assigned requests
-            base_query += " JOIN request_specialists rs ON r.id = rs.request_id"
-            where_clauses.append("rs.specialist_id = ?")
-            params.append(user_id)
+        Creates many requests in one transaction. Each row has the arguments
+        of create_request: ((full_name, phone), (serial, model, type), problem).
+
+        Clients are matched by phone and equipment by serial with set-based
+        lookups (rows in the batch share what earlier rows create), and all
+        inserts use executemany. Returns one BulkCreateResult per input row,
+        in order; invalid rows are reported and skipped. If the transaction
+        fails, every valid row reports the error and nothing is written.
+        """
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, _validate_bulk_row(row)))
+                results.append(BulkCreateResult(index))
+            except ValueError as e:
+                results.append(BulkCreateResult(index, error=str(e)))
+        if not valid:
+            return results
+            
+        def work(conn):
+            # 1. Clients by phone; the first row with a new phone names the client
+            new_clients = {}
+            for _, (client_data, _, _) in valid:
+                new_clients.setdefault(client_data[1], client_data)
+            clients = lookup_ids(conn, "SELECT phone, min(id) FROM clients WHERE phone IN ({placeholders}) GROUP BY phone",
+                                  new_clients)
+            missing = [data for phone, data in new_clients.items() if phone not in clients]
+            if missing:
+                conn.executemany("INSERT INTO clients (full_name, phone) VALUES (?, ?)", missing)
+                clients.update(lookup_ids(conn, "SELECT phone, min(id) FROM clients WHERE phone IN ({placeholders}) GROUP BY phone",
+                                           [phone for _, phone in missing]))
             
-        if filter_status:
-            where_clauses.append("r.status_id = ?")
-            params.append(filter_status)
+            # 2. Equipment by serial, owned by the client of its first row
+            new_equipment = {}
+            for _, (client_data, equipment_data, _) in valid:
+                new_equipment.setdefault(equipment_data[0], equipment_data + (clients[client_data[1]],))
+            equipment = lookup_ids(conn, "SELECT serial_number, id FROM equipment WHERE serial_number IN ({placeholders})",
+                                    new_equipment)
+            missing = [data for serial, data in new_equipment.items() if serial not in equipment]
+            if missing:
+                conn.executemany("INSERT INTO equipment (serial_number, model, type, client_id) VALUES (?, ?, ?, ?)", missing)
+                equipment.update(lookup_ids(conn, "SELECT serial_number, id FROM equipment WHERE serial_number IN ({placeholders})",
+                                             [data[0] for data in missing]))
+            
+            # 3. Requests, numbered from one reserved block
+            numbers = allocate_request_numbers(conn, len(valid), branch_prefix)
+            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            deadline = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+            conn.executemany(
+                """
+                INSERT INTO requests (request_number, creation_date, problem_description, client_id, equipment_id, status_id, deadline_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                ((number, created_at, problem_desc, clients[client_data[1]], equipment[equipment_data[0]], STATUS_NEW, deadline)
+                 for number, (_, (client_data, equipment_data, problem_desc)) in zip(numbers, valid))
+            )
+            # First history row, as record_status_change writes for a new request
+            conn.executemany(
+                """
+                INSERT INTO request_status_history (request_id, status_id, changed_at)
+                SELECT id, ?, ? FROM requests WHERE request_number = ?
+                """,
+                ((STATUS_NEW, created_at, number) for number in numbers)
+            )
+            return numbers
             
+        try:
+            numbers = run_in_transaction(work)
+            for (index, _), number in zip(valid, numbers):
+                results[index].request_number = number
+        except Exception as e:
+            print(f"Error creating requests in bulk: {e}")
+            for index, _ in valid:
+                results[index].error = str(e)
+        return results
+
+    @staticmethod
+    def get_requests(user_role, user_id, filter_status=None, search=None):
+        join_sql, where_clauses, params = _request_filters(user_role, user_id, filter_status, search)
+        base_query = _REQUEST_SELECT + join_sql
         if where_clauses:
             base_query += " WHERE " + " AND ".join(where_clauses)
             
-        base_query += " ORDER BY r.help_needed DESC, r.creation_date DESC"
+        base_query += " ORDER BY r.help_needed DESC, r.creation_date DESC, r.id DESC"
         
-        cursor.execute(base_query, tuple(params))
-        rows = cursor.fetchall()
+        with connection() as conn:
+            rows = conn.execute(base_query, tuple(params)).fetchall()
+        return [_row_to_request(row) for row in rows]
+
+    @staticmethod
+    def get_request(request_id):
+        """
+        Returns one Request with its specialists, parts and comments loaded, or
+        None if it does not exist. Uses three primary-key/index lookups.
+        """
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_REQUEST_SELECT + " WHERE r.id = ?", (request_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            req = _row_to_request(row)
+            req.parts = _fetch_request_parts(cursor, req.id)
+            req.comments = _fetch_comments(cursor, req.id)
+        return req
+
+    @staticmethod
+    def get_requests_page(user_role, user_id, filter_status=None, page_token=None,
+                          page_size=DEFAULT_PAGE_SIZE, search=None):
+        """
+        Returns one RequestPage in dashboard order (help_needed, creation_date, id
+        descending). Pages are addressed by keyset tokens taken from the
+        next_page_token / prev_page_token of a previous page, so the cost of a
+        page depends on page_size only, not on how deep the page is.
+        search keeps requests whose number, client phone or equipment serial
+        starts with it, or whose problem, comments, client name or equipment
+        model contain all its words (requests_fts).
+        """
+        direction, key = _decode_page_token(page_token)
         
-        requests = []
-        for row in rows:
-            req = Request(
-                id=row[0],
-                request_number=row[1],
-                creation_date=row[2],
-                problem_description=row[3],
-                client_id=row[4],
-                equipment_id=row[5],
-                status_id=row[6],
-                status_name=row[7],
-                client_name=row[8],
-                client_phone=row[9],
-                equipment_model=row[10],
-                completion_date=row[11],
-                deadline_date=row[12],
-                help_needed=bool(row[13])
-            )
-            # Fetch assigned specialists
-            cursor.execute("""
-                SELECT u.full_name FROM users u
-                JOIN request_specialists rs ON u.id = rs.specialist_id
-                WHERE rs.request_id = ?
-            """, (req.id,))
-            specs = cursor.fetchall()
-            req.assigned_specialists = [s[0] for s in specs]
-            requests.append(req)
+        join_sql, where_clauses, params = _request_filters(user_role, user_id, filter_status, search)
+        if key is not None:
+            # Row value comparison walks the sort order from the cursor row
+            op = "<" if direction == "next" else ">"
+            where_clauses.append(f"(r.help_needed, r.creation_date, r.id) {op} (?, ?, ?)")
+            params.extend(key)
+            
+        query = _REQUEST_SELECT + join_sql
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        order = "DESC" if direction == "next" else "ASC"
+        query += f" ORDER BY r.help_needed {order}, r.creation_date {order}, r.id {order} LIMIT ?"
+        params.append(page_size + 1)
+        
+        with connection() as conn:
+            rows = conn.execute(query, tuple(params)).fetchall()
+        
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == "prev":
+            rows.reverse()
+        items = [_row_to_request(row) for row in rows]
+        
+        if direction == "next":
+            has_next, has_prev = has_more, key is not None
+        else:
+            has_next, has_prev = True, has_more
+            
+        return RequestPage(
+            items=items,
+            next_page_token=_encode_page_token("next", items[-1]) if items and has_next else None,
+            prev_page_token=_encode_page_token("prev", items[0]) if items and has_prev else None
+        )
+
+    @staticmethod
+    def get_sync_token():
+        """Current position of the request change feed, for get_changes."""
+        with connection() as conn:
+            return conn.execute("SELECT version FROM request_change_counter WHERE id = 1").fetchone()[0]
+
+    @staticmethod
+    def get_changes(since, user_role, user_id, filter_status=None, search=None):
+        """
+        Returns RequestChanges for the requests changed after the sync token
+        `since` (from get_sync_token or a previous call), split by the listing
+        filters into changed rows and ids that left the listing. With nothing
+        changed this is one primary-key read, so workstations can poll it.
+        """
+        with connection() as conn:
+            # Read before the rows: a change committed in between comes again next time
+            token = conn.execute("SELECT version FROM request_change_counter WHERE id = 1").fetchone()[0]
+            if since == token:
+                return RequestChanges(token)
+            if since is None or since > token:
+                # No token yet, or one from another database
+                return RequestChanges(token, full_reload=True)
+            ids = [row[0] for row in conn.execute(
+                "SELECT request_id FROM request_changes WHERE version > ? ORDER BY version LIMIT ?",
+                (since, CHANGE_FEED_LIMIT + 1)
+            )]
+            if len(ids) > CHANGE_FEED_LIMIT:
+                return RequestChanges(token, full_reload=True)
             
-        conn.close()
-        return requests
+            join_sql, where_clauses, params = _request_filters(user_role, user_id, filter_status, search)
+            where_clauses.append(f"r.id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+            rows = conn.execute(_REQUEST_SELECT + join_sql + " WHERE " + " AND ".join(where_clauses), tuple(params)).fetchall()
+        items = [_row_to_request(row) for row in rows]
+        found = {req.id for req in items}
+        return RequestChanges(token, items, [request_id for request_id in ids if request_id not in found])
+
+    @staticmethod
+    def search_requests(query, user_role=None, user_id=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Full-text search over problem descriptions, comments, client names and
+        equipment models (requests_fts). Returns up to `limit` Requests, best
+        match first: bm25 with the problem text weighted highest. Specialists
+        only find requests assigned to them.
+        """
+        match = _fts_query(query)
+        if match is None:
+            return []
+        params = {"match": match, "limit": limit, "user_id": user_id}
+        # Only the best `limit` rowids leave the index; the listing joins run on those
+        assigned = ""
+        if user_role == 'Specialist':
+            # CROSS JOIN keeps the MATCH as the outer loop: "rowid IN (...)" would
+            # make FTS5 run the query once per assigned request
+            assigned = """
+                CROSS JOIN request_specialists rs
+                    ON rs.request_id = requests_fts.rowid AND rs.specialist_id = :user_id
+            """
+        query_sql = f"""
+            WITH hits AS MATERIALIZED (
+                SELECT requests_fts.rowid AS request_id, requests_fts.rank FROM requests_fts {assigned}
+                WHERE requests_fts MATCH :match
+                ORDER BY requests_fts.rank LIMIT :limit
+            )
+            {_REQUEST_SELECT}
+            JOIN hits ON hits.request_id = r.id
+            ORDER BY hits.rank
+        """
+        with connection() as conn:
+            rows = conn.execute(query_sql, params).fetchall()
+        return [_row_to_request(row) for row in rows]
 
     @staticmethod
-    def update_status(request_id, new_status_id):
-        conn = get_connection()
-        cursor = conn.cursor()
+    def iter_requests(user_role, user_id, filter_status=None, page_size=DEFAULT_PAGE_SIZE):
+        """Yields every visible request page by page, holding one page in memory."""
+        page_token = None
+        while True:
+            page = RequestService.get_requests_page(user_role, user_id, filter_status, page_token, page_size)
+            yield from page.items
+            if not page.next_page_token:
+                return
+            page_token = page.next_page_token
+
+    @staticmethod
+    def update_status(request_id, new_status_id, changed_by=None):
         try:
             update_query = "UPDATE requests SET status_id = ?"
             params = [new_status_id]
@@ -221,136 +601,173 @@ class RequestService:
             update_query += " WHERE id = ?"
             params.append(request_id)
             
-            cursor.execute(update_query, tuple(params))
-            conn.commit()
+            def work(conn):
+                old = conn.execute("SELECT status_id, completion_date FROM requests WHERE id = ?", (request_id,)).fetchone()
+                # Keep the materialized statistics in step with Completed transitions
+                if old and old[0] == STATUS_COMPLETED and old[1] is not None:
+                    record_completion(conn, request_id, -1)
+                conn.execute(update_query, tuple(params))
+                if old and new_status_id == STATUS_COMPLETED:
+                    record_completion(conn, request_id, 1)
+                if old:
+                    record_status_change(conn, request_id, new_status_id, changed_by)
+                    
+            run_in_transaction(work)
             return True
         except Exception as e:
             print(f"Error updating status: {e}")
             return False
-        finally:
-            conn.close()
 
     @staticmethod
-    def assign_specialist(request_id, specialist_id):
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
+    def assign_specialist(request_id, specialist_id, changed_by=None):
+        def work(conn):
+            conn.execute(
                 "INSERT INTO request_specialists (request_id, specialist_id) VALUES (?, ?)",
                 (request_id, specialist_id)
             )
             # Update status to Registered or In Progress if New
-            cursor.execute("UPDATE requests SET status_id = ? WHERE id = ? AND status_id = ?", 
-                           (STATUS_REGISTERED, request_id, STATUS_NEW))
-            conn.commit()
+            cursor = conn.execute("UPDATE requests SET status_id = ? WHERE id = ? AND status_id = ?", 
+                                  (STATUS_REGISTERED, request_id, STATUS_NEW))
+            if cursor.rowcount:
+                record_status_change(conn, request_id, STATUS_REGISTERED, changed_by)
+            
+        try:
+            run_in_transaction(work)
             return True
         except sqlite3.IntegrityError:
             return False # Already assigned
-        finally:
-            conn.close()
 
     @staticmethod
     def extend_deadline(request_id, days):
-        conn = get_connection()
-        cursor = conn.cursor()
+        def work(conn):
+            current = conn.execute("SELECT deadline_date FROM requests WHERE id = ?", (request_id,)).fetchone()[0]
+            if not current:
+                return False
+            new_date = datetime.strptime(current, "%Y-%m-%d %H:%M:%S") + timedelta(days=days)
+            conn.execute("UPDATE requests SET deadline_date = ? WHERE id = ?", 
+                         (new_date.strftime("%Y-%m-%d %H:%M:%S"), request_id))
+            return True
+            
         try:
-            cursor.execute("SELECT deadline_date FROM requests WHERE id = ?", (request_id,))
-            current = cursor.fetchone()[0]
-            if current:
-                new_date = datetime.strptime(current, "%Y-%m-%d %H:%M:%S") + timedelta(days=days)
-                cursor.execute("UPDATE requests SET deadline_date = ? WHERE id = ?", 
-                               (new_date.strftime("%Y-%m-%d %H:%M:%S"), request_id))
-                conn.commit()
-                return True
-            return False
+            return run_in_transaction(work)
         except Exception as e:
             print(f"Error extending deadline: {e}")
             return False
-        finally:
-            conn.close()
 
     @staticmethod
     def add_comment(request_id, user_id, text):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        run_in_transaction(lambda conn: conn.execute(
             "INSERT INTO comments (request_id, user_id, text, created_at) VALUES (?, ?, ?, ?)",
             (request_id, user_id, text, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        )
-        conn.commit()
-        conn.close()
+        ))
 
     @staticmethod
     def get_comments(request_id):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT c.id, c.request_id, c.user_id, c.text, c.created_at, u.full_name
-            FROM comments c
-            JOIN users u ON c.user_id = u.id
-            WHERE c.request_id = ?
-            ORDER BY c.created_at ASC
-        """, (request_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        return [Comment(id=r[0], request_id=r[1], user_id=r[2], text=r[3], created_at=r[4], user_name=r[5]) for r in rows]
+        with connection() as conn:
+            return _fetch_comments(conn.cursor(), request_id)
 
     @staticmethod
     def toggle_help_needed(request_id, needed: bool):
-        conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("UPDATE requests SET help_needed = ? WHERE id = ?", (1 if needed else 0, request_id))
-            conn.commit()
+            run_in_transaction(lambda conn: conn.execute(
+                "UPDATE requests SET help_needed = ? WHERE id = ?", (1 if needed else 0, request_id)
+            ))
             return True
         except Exception as e:
             print(f"Error toggling help: {e}")
             return False
-        finally:
-            conn.close()
+
+    @staticmethod
+    def mark_overdue(now=None):
+        """
+        Moves every open request whose deadline has passed into STATUS_OVERDUE
+        with one batched UPDATE, and returns the ids it moved. A request is
+        marked once per deadline: moved back to an open status, it stays there
+        until its deadline changes. The candidates come from
+        idx_requests_deadline (status_id, deadline_date), and marked rows leave
+        that range, so a sweep only visits newly overdue requests. The write
+        transaction is only opened when a read finds any.
+        """
+        now = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        open_statuses = ", ".join(str(status) for status in _OVERDUE_FROM)
+        params = {"now": now, "overdue": STATUS_OVERDUE}
+        due = f"""
+            r.status_id IN ({open_statuses}) AND r.deadline_date < :now
+            AND NOT EXISTS (SELECT 1 FROM request_overdue_marks m
+                            WHERE m.request_id = r.id AND m.deadline_date IS r.deadline_date)
+        """
+        
+        def work(conn):
+            # Same rows as the UPDATE below; see stats_module.record_status_change
+            conn.execute(f"""
+                WITH candidates AS MATERIALIZED (
+                    SELECT r.id AS request_id, r.status_id AS previous_status_id,
+                           (SELECT h.changed_at FROM request_status_history h
+                            WHERE h.request_id = r.id ORDER BY h.changed_at DESC, h.id DESC LIMIT 1) AS previous_changed_at
+                    FROM requests r
+                    WHERE {due}
+                ), changes AS MATERIALIZED (
+                    SELECT request_id, previous_status_id, previous_changed_at,
+                           max(:now, coalesce(previous_changed_at, :now)) AS changed_at
+                    FROM candidates
+                )
+                INSERT INTO request_status_history
+                    (request_id, status_id, changed_at, previous_status_id, previous_changed_at, previous_hours)
+                SELECT request_id, :overdue, changed_at, previous_status_id, previous_changed_at,
+                       (julianday(changed_at) - julianday(previous_changed_at)) * 24.0
+                FROM changes
+            """, params)
+            rows = conn.execute(f"""
+                UPDATE requests AS r SET status_id = :overdue
+                WHERE {due}
+                RETURNING id, deadline_date
+            """, params).fetchall()
+            conn.executemany(
+                "INSERT OR REPLACE INTO request_overdue_marks (request_id, deadline_date) VALUES (?, ?)", rows
+            )
+            return sorted(row[0] for row in rows)
+            
+        try:
+            with connection() as conn:
+                if conn.execute(f"SELECT 1 FROM requests r WHERE {due} LIMIT 1", params).fetchone() is None:
+                    return []
+            return run_in_transaction(work)
+        except Exception as e:
+            print(f"Error marking overdue requests: {e}")
+            return []
 
     @staticmethod
     def update_deadline(request_id, new_date_str):
-        conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("UPDATE requests SET deadline_date = ? WHERE id = ?", (new_date_str, request_id))
-            conn.commit()
+            run_in_transaction(lambda conn: conn.execute(
+                "UPDATE requests SET deadline_date = ? WHERE id = ?", (new_date_str, request_id)
+            ))
             return True
         except Exception as e:
             print(f"Error updating deadline: {e}")
             return False
-        finally:
-            conn.close()
 
 class PartService:
     @staticmethod
     def get_all_parts():
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, stock_quantity, price FROM parts")
-        rows = cursor.fetchall()
-        conn.close()
+        with connection() as conn:
+            rows = conn.execute("SELECT id, name, stock_quantity, price FROM parts").fetchall()
         return [Part(id=r[0], name=r[1], stock_quantity=r[2], price=r[3]) for r in rows]
 
     @staticmethod
     def add_part(name, stock, price):
-        conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("INSERT INTO parts (name, stock_quantity, price) VALUES (?, ?, ?)", (name, stock, price))
-            conn.commit()
+            run_in_transaction(lambda conn: conn.execute(
+                "INSERT INTO parts (name, stock_quantity, price) VALUES (?, ?, ?)", (name, stock, price)
+            ))
             return True
         except sqlite3.IntegrityError:
             return False
-        finally:
-            conn.close()
 
     @staticmethod
     def assign_part_to_request(request_id, part_id, quantity):
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
+        def work(conn):
+            cursor = conn.cursor()
             # Check stock
             cursor.execute("SELECT stock_quantity FROM parts WHERE id = ?", (part_id,))
             stock = cursor.fetchone()[0]
@@ -369,28 +786,17 @@ class PartService:
             else:
                 cursor.execute("INSERT INTO request_parts (request_id, part_id, quantity) VALUES (?, ?, ?)", 
                                (request_id, part_id, quantity))
-            
-            conn.commit()
             return True, "Part assigned"
+            
+        try:
+            return run_in_transaction(work)
         except Exception as e:
-            conn.rollback()
             return False, str(e)
-        finally:
-            conn.close()
 
     @staticmethod
     def get_parts_for_request(request_id):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT p.id, p.name, p.stock_quantity, p.price, rp.quantity
-            FROM parts p
-            JOIN request_parts rp ON p.id = rp.part_id
-            WHERE rp.request_id = ?
-        """, (request_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        return [Part(id=r[0], name=r[1], stock_quantity=r[2], price=r[3], quantity_used=r[4]) for r in rows]
+        with connection() as conn:
+            return _fetch_request_parts(conn.cursor(), request_id)
 
 class ImportService:
     @staticmethod
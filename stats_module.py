@@ -1,5 +1,17 @@
-from database import get_connection
+import argparse
+import importlib.util
+import math
+from bisect import bisect_left
 from datetime import datetime
+from database import connection, run_in_transaction, STATISTICS_REBUILD, STATUS_HISTORY_BACKFILL
+
+# NumPy is only looked up here and imported by the functions that use it:
+# services import this module, and NumPy alone costs more than the login window
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+# Default SLA histogram buckets for repair time, in hours; the last bucket is open-ended
+SLA_BIN_EDGES_HOURS = (0, 4, 8, 24, 48, 72, 168, 336)
+DEFAULT_PERCENTILES = (50, 90, 99)
 
 def calculate_statistics():
     """
@@ -8,55 +20,478 @@ def calculate_statistics():
     - completed_count: Total number of completed requests
     - average_days: Average repair duration in days
     - problem_types: Dictionary mapping problem types (description) to count
+
+    Reads the materialized request_stats tables, which RequestService.update_status
+    keeps current, so the cost does not depend on the number of requests.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get all completed requests
-    cursor.execute("""
-        SELECT creation_date, completion_date, problem_description
-        FROM requests
-        WHERE status_id = 5 AND completion_date IS NOT NULL
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-    
-    completed_count = len(rows)
-    total_duration = 0
-    problem_types = {}
-    
-    for created, completed, problem in rows:
-        try:
-            start_dt = datetime.strptime(created, "%Y-%m-%d %H:%M:%S")
-            end_dt = datetime.strptime(completed, "%Y-%m-%d %H:%M:%S")
-            duration = (end_dt - start_dt).days
-            # Ensure non-negative duration
-            if duration < 0: 
-                duration = 0
-            total_duration += duration
-        except ValueError:
-            continue # Skip invalid dates
-            
-        # Group by problem type (simple string counting)
-        # In a real system, we might normalize this or use a separate "FailureType" entity
-        # For now, we use the description or maybe we should have added a type field.
-        # The prompt mentions "Breakdown by failure types". 
-        # "Equipment" has "type", maybe use that?
-        # The existing code used problem_description. Let's use equipment type instead if possible?
-        # "Breakdown by failure types" usually refers to *what went wrong*, which is in problem_description.
-        # But problem_description is free text. Grouping by free text is messy.
-        # However, following the previous logic and simplicity, I'll count exact matches of problem_description.
-        # Better: Group by Equipment Type? No, "Failure Types".
-        # Let's assume the user enters standard failure types or we just count unique descriptions.
-        if problem in problem_types:
-            problem_types[problem] += 1
-        else:
-            problem_types[problem] = 1
-            
+    with connection() as conn:
+        totals = conn.execute(
+            "SELECT completed_count, total_duration_days FROM request_stats WHERE id = 1"
+        ).fetchone()
+        problems = conn.execute(
+            "SELECT problem_description, completed_count FROM request_stats_problems"
+        ).fetchall()
+
+    completed_count, total_duration = totals if totals else (0, 0)
     average_days = (total_duration / completed_count) if completed_count > 0 else 0
-    
+
+    # Grouped by the exact problem_description text, as entered by the operator
     return {
         "completed_count": completed_count,
         "average_days": round(average_days, 2),
-        "problem_types": problem_types
+        "problem_types": dict(problems)
+    }
+
+# Dimensions aggregate_statistics can filter and group by: name -> SQL expression
+DIMENSIONS = {
+    "equipment_type": "e.type",
+    "equipment_model": "e.model",
+    "specialist": "u.full_name",
+    "client": "c.full_name",
+    "problem": "r.problem_description",
+    "year": "strftime('%Y', r.completion_date)",
+    "month": "strftime('%Y-%m', r.completion_date)",
+    "day": "date(r.completion_date)",
+}
+
+def _as_date_text(value):
+    # Dates are stored as "YYYY-MM-DD HH:MM:SS" text, which sorts chronologically
+    return value.strftime("%Y-%m-%d %H:%M:%S") if hasattr(value, "strftime") else str(value)
+
+def aggregate_statistics(date_from=None, date_to=None, equipment_type=None,
+                         specialist_id=None, client_id=None, group_by=()):
+    """
+    Aggregates completed requests inside SQLite.
+
+    Filters: completion date in [date_from, date_to), equipment type,
+    assigned specialist id and client id. group_by is a sequence of
+    DIMENSIONS keys. Returns one dict per group with the group values,
+    completed_count and average/min/max repair duration in days
+    (fractional, from julianday). With no group_by the result is a single
+    total row, or empty when nothing matches.
+    """
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown statistics dimension(s): {', '.join(unknown)}")
+
+    joins = []
+    where = ["r.status_id = 5", "r.completion_date IS NOT NULL"]
+    params = []
+    if date_from is not None:
+        where.append("r.completion_date >= ?")
+        params.append(_as_date_text(date_from))
+    if date_to is not None:
+        where.append("r.completion_date < ?")
+        params.append(_as_date_text(date_to))
+    if equipment_type is not None or "equipment_type" in group_by or "equipment_model" in group_by:
+        joins.append("JOIN equipment e ON e.id = r.equipment_id")
+        if equipment_type is not None:
+            where.append("e.type = ?")
+            params.append(equipment_type)
+    if client_id is not None:
+        where.append("r.client_id = ?")
+        params.append(client_id)
+    if "client" in group_by:
+        joins.append("JOIN clients c ON c.id = r.client_id")
+    if "specialist" in group_by:
+        # A request with several specialists counts once for each of them
+        joins.append("JOIN request_specialists rs ON rs.request_id = r.id")
+        joins.append("JOIN users u ON u.id = rs.specialist_id")
+        if specialist_id is not None:
+            where.append("rs.specialist_id = ?")
+            params.append(specialist_id)
+    elif specialist_id is not None:
+        where.append("EXISTS (SELECT 1 FROM request_specialists rs WHERE rs.request_id = r.id AND rs.specialist_id = ?)")
+        params.append(specialist_id)
+
+    duration = "julianday(r.completion_date) - julianday(r.creation_date)"
+    columns = [f"{DIMENSIONS[name]} AS {name}" for name in group_by]
+    query = f"""
+        SELECT {", ".join(columns + [
+            "count(*)", f"avg({duration})", f"min({duration})", f"max({duration})"
+        ])}
+        FROM requests r
+        {" ".join(joins)}
+        WHERE {" AND ".join(where)}
+    """
+    if group_by:
+        positions = ", ".join(str(i + 1) for i in range(len(group_by)))
+        query += f" GROUP BY {positions} ORDER BY {positions}"
+
+    with connection() as conn:
+        rows = conn.execute(query, tuple(params)).fetchall()
+
+    results = []
+    for row in rows:
+        values = row[len(group_by):]
+        if values[0] == 0:
+            continue  # total row over an empty selection
+        item = dict(zip(group_by, row[:len(group_by)]))
+        item.update({
+            "completed_count": values[0],
+            "average_days": round(values[1], 2) if values[1] is not None else None,
+            "min_days": round(values[2], 2) if values[2] is not None else None,
+            "max_days": round(values[3], 2) if values[3] is not None else None,
+        })
+        results.append(item)
+    return results
+
+def _percentile_sorted(values, q):
+    # Linear interpolation between closest ranks (numpy's default method)
+    rank = (len(values) - 1) * q / 100.0
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+def duration_distribution(hours, percentiles=DEFAULT_PERCENTILES, bin_edges=SLA_BIN_EDGES_HOURS):
+    """
+    Summarizes a column of repair durations in hours (negative spans count
+    as 0). Returns count, mean_hours, {percentile: hours} and a histogram
+    as [(from_hours, to_hours or None, count)]; values below the first edge
+    fall into the first bucket. Uses NumPy when available.
+    """
+    if HAS_NUMPY:
+        import numpy as np
+        values = np.maximum(np.asarray(hours, dtype=float), 0.0)
+        count = int(values.size)
+        if count:
+            mean = float(values.mean())
+            points = [float(p) for p in np.percentile(values, percentiles)]
+            buckets = np.maximum(np.searchsorted(bin_edges, values, side="right") - 1, 0)
+            counts = np.bincount(buckets, minlength=len(bin_edges)).tolist()
+    else:
+        values = [h if h > 0 else 0.0 for h in hours]
+        values.sort()
+        count = len(values)
+        if count:
+            mean = math.fsum(values) / count
+            points = [_percentile_sorted(values, p) for p in percentiles]
+            # Bucket boundaries are positions in the sorted column
+            cuts = [0] + [bisect_left(values, edge) for edge in bin_edges[1:]] + [count]
+            counts = [hi - lo for lo, hi in zip(cuts, cuts[1:])]
+
+    if not count:
+        return {"count": 0, "mean_hours": None, "percentiles": {p: None for p in percentiles},
+                "histogram": [(lo, hi, 0) for lo, hi in zip(bin_edges, list(bin_edges[1:]) + [None])]}
+    return {
+        "count": count,
+        "mean_hours": round(mean, 2),
+        "percentiles": {p: round(v, 2) for p, v in zip(percentiles, points)},
+        "histogram": [(lo, hi, n) for lo, hi, n in zip(bin_edges, list(bin_edges[1:]) + [None], counts)],
     }
+
+def load_durations(date_from=None, date_to=None, equipment_type=None):
+    """
+    Returns (equipment_types, hours) as two parallel columns for completed
+    requests, NumPy arrays when available and lists otherwise.
+    """
+    where = ["r.status_id = 5", "r.completion_date IS NOT NULL"]
+    params = []
+    if date_from is not None:
+        where.append("r.completion_date >= ?")
+        params.append(_as_date_text(date_from))
+    if date_to is not None:
+        where.append("r.completion_date < ?")
+        params.append(_as_date_text(date_to))
+    if equipment_type is not None:
+        where.append("e.type = ?")
+        params.append(equipment_type)
+    query = f"""
+        SELECT e.type, (julianday(r.completion_date) - julianday(r.creation_date)) * 24.0 AS hours
+        FROM requests r
+        JOIN equipment e ON e.id = r.equipment_id
+        WHERE {" AND ".join(where)}
+    """
+    with connection() as conn:
+        rows = conn.execute(query, tuple(params)).fetchall()
+    rows = [row for row in rows if row[1] is not None]  # unparseable dates
+    types = [row[0] for row in rows]
+    hours = [row[1] for row in rows]
+    if HAS_NUMPY:
+        import numpy as np
+        return np.array(types, dtype=object), np.array(hours, dtype=float)
+    return types, hours
+
+def duration_report(date_from=None, date_to=None, equipment_type=None,
+                    percentiles=DEFAULT_PERCENTILES, bin_edges=SLA_BIN_EDGES_HOURS):
+    """
+    Repair time distribution at hour resolution: {"overall": ..., "by_equipment_type": {type: ...}}
+    where each entry is a duration_distribution result.
+    """
+    types, hours = load_durations(date_from, date_to, equipment_type)
+    report = {"overall": duration_distribution(hours, percentiles, bin_edges), "by_equipment_type": {}}
+    if HAS_NUMPY:
+        import numpy as np
+        if len(types):
+            names, codes = np.unique(types.astype(str), return_inverse=True)
+            for index, name in enumerate(names):
+                report["by_equipment_type"][str(name)] = duration_distribution(hours[codes == index], percentiles, bin_edges)
+    else:
+        grouped = {}
+        for eq_type, h in zip(types, hours):
+            grouped.setdefault(eq_type, []).append(h)
+        for name in sorted(grouped):
+            report["by_equipment_type"][name] = duration_distribution(grouped[name], percentiles, bin_edges)
+    return report
+
+def record_completion(conn, request_id, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) one completed request from the
+    materialized statistics. Must run in the transaction that changes the
+    request's status, while its completion_date is the one being counted.
+    """
+    conn.execute("""
+        INSERT INTO request_stats (id, completed_count, total_duration_days)
+        SELECT 1, ?, ? * coalesce(max(0, CAST(julianday(completion_date) - julianday(creation_date) AS INTEGER)), 0)
+        FROM requests WHERE id = ?
+        ON CONFLICT (id) DO UPDATE SET
+            completed_count = completed_count + excluded.completed_count,
+            total_duration_days = total_duration_days + excluded.total_duration_days
+    """, (sign, sign, request_id))
+    conn.execute("""
+        INSERT INTO request_stats_problems (problem_description, completed_count)
+        SELECT problem_description, ? FROM requests WHERE id = ?
+        ON CONFLICT (problem_description) DO UPDATE SET
+            completed_count = completed_count + excluded.completed_count
+    """, (sign, request_id))
+    if sign < 0:
+        conn.execute("""
+            DELETE FROM request_stats_problems
+            WHERE completed_count <= 0
+              AND problem_description = (SELECT problem_description FROM requests WHERE id = ?)
+        """, (request_id,))
+
+# Dimensions time_in_status can group by; s is a status span clipped to the
+# period. Status and specialist group by id and are labelled with names.
+SPAN_DIMENSIONS = {
+    "status": "s.status_id",
+    "request": "s.request_id",
+    "specialist": "rs.specialist_id",
+    "month": "strftime('%Y-%m', s.started)",
+    "day": "date(s.started)",
+}
+
+# Every status except Completed; requests in these have an open span
+OPEN_STATUS_IDS = (1, 2, 3, 4, 6)
+
+def record_status_change(conn, request_id, status_id, changed_by=None, changed_at=None):
+    """
+    Appends a status change to request_status_history, closing the span of
+    the previous status. Must run in the transaction that changes the
+    request's status. Returns False when the request is already in status_id.
+    """
+    if changed_at is None:
+        changed_at = datetime.now()
+    changed_at = _as_date_text(changed_at)
+    last = conn.execute("""
+        SELECT status_id, changed_at FROM request_status_history
+        WHERE request_id = ? ORDER BY changed_at DESC, id DESC LIMIT 1
+    """, (request_id,)).fetchone()
+    if last and last[0] == status_id:
+        return False
+    previous_status_id, previous_changed_at = last if last else (None, None)
+    if previous_changed_at and changed_at < previous_changed_at:
+        changed_at = previous_changed_at  # clock skew between workstations
+    conn.execute("""
+        INSERT INTO request_status_history
+            (request_id, status_id, changed_at, changed_by, previous_status_id, previous_changed_at, previous_hours)
+        VALUES (?, ?, ?, ?, ?, ?, (julianday(?) - julianday(?)) * 24.0)
+    """, (request_id, status_id, changed_at, changed_by, previous_status_id, previous_changed_at,
+          changed_at, previous_changed_at))
+    return True
+
+def time_in_status(group_by=("status",), request_id=None, specialist_id=None, status_id=None,
+                   date_from=None, date_to=None, include_open=True, now=None):
+    """
+    Aggregates how long requests spent in each status, from request_status_history.
+
+    A span is the time between entering a status and leaving it; with
+    include_open the current status of every unfinished request counts up
+    to `now`. Spans are clipped to [date_from, date_to). group_by is a
+    sequence of SPAN_DIMENSIONS keys ("month"/"day" use the clipped span
+    start); a request with several specialists counts once for each of
+    them. Returns one dict per group with span_count and total/average/max
+    hours; "status" and "specialist" groups carry both the id and the name.
+    """
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    unknown = [name for name in group_by if name not in SPAN_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown time-in-status dimension(s): {', '.join(unknown)}")
+    params = {
+        "request_id": request_id, "specialist_id": specialist_id, "status_id": status_id,
+        "date_from": _as_date_text(date_from) if date_from is not None else None,
+        "date_to": _as_date_text(date_to) if date_to is not None else None,
+        "now": _as_date_text(now if now is not None else datetime.now()),
+    }
+    clipped_from = "max({}, :date_from)" if date_from is not None else "{}"
+    clipped_to = "min({}, :date_to)" if date_to is not None else "{}"
+
+    with connection() as conn:
+        # Closed spans: one history row each, with the length stored
+        closed_where = ["h.previous_status_id IS NOT NULL"]
+        if request_id is not None:
+            closed_where.append("h.request_id = :request_id")
+        if status_id is not None:
+            closed_where.append("h.previous_status_id = :status_id")
+        if date_from is not None:
+            closed_where.append("h.changed_at > :date_from")
+        if date_to is not None:
+            # Spans that overlap date_to end within the longest recorded span,
+            # which bounds the changed_at index range from both sides
+            longest = conn.execute("""
+                SELECT max((SELECT max(h.previous_hours) FROM request_status_history h
+                            WHERE h.previous_status_id = st.id))
+                FROM statuses st
+            """).fetchone()[0] or 0
+            params["longest"] = f"+{longest + 1 / 3600:.6f} hours"
+            closed_where.append("h.previous_changed_at < :date_to")
+            closed_where.append("h.changed_at < datetime(:date_to, :longest)")
+        closed_hours = "h.previous_hours"
+        if date_from is not None or date_to is not None:
+            inside = [c for c, bound in (("h.previous_changed_at >= :date_from", date_from),
+                                         ("h.changed_at <= :date_to", date_to)) if bound is not None]
+            closed_hours = f"""CASE WHEN {" AND ".join(inside)} THEN h.previous_hours
+                ELSE (julianday({clipped_to.format("h.changed_at")}) - julianday({clipped_from.format("h.previous_changed_at")})) * 24.0 END"""
+        sources = [f"""
+            SELECT h.request_id AS request_id, h.previous_status_id AS status_id,
+                   {clipped_from.format("h.previous_changed_at")} AS started, {closed_hours} AS hours
+            FROM request_status_history h
+            WHERE {" AND ".join(closed_where)}
+        """]
+
+        # Open spans: the current status of unfinished requests, since their latest change
+        open_spans = None
+        if include_open and (date_from is None or params["now"] > params["date_from"]):
+            open_where = [f"r.status_id IN ({', '.join(str(s) for s in OPEN_STATUS_IDS)})"]
+            if request_id is not None:
+                open_where.append("r.id = :request_id")
+            if status_id is not None:
+                open_where.append("r.status_id = :status_id")
+            span_where = ["open_spans.started < :now"]
+            if date_to is not None:
+                span_where.append("open_spans.started < :date_to")
+            open_spans = f"""
+                open_spans AS MATERIALIZED (
+                    SELECT r.id AS request_id, r.status_id AS status_id,
+                           (SELECT h.changed_at FROM request_status_history h
+                            WHERE h.request_id = r.id ORDER BY h.changed_at DESC, h.id DESC LIMIT 1) AS started
+                    FROM requests r
+                    WHERE {" AND ".join(open_where)}
+                )
+            """
+            sources.append(f"""
+                SELECT open_spans.request_id, open_spans.status_id, {clipped_from.format("open_spans.started")} AS started,
+                       (julianday({clipped_to.format(":now")}) - julianday({clipped_from.format("open_spans.started")})) * 24.0 AS hours
+                FROM open_spans
+                WHERE {" AND ".join(span_where)}
+            """)
+
+        joins = ""
+        where = ""
+        if "specialist" in group_by:
+            joins = "JOIN request_specialists rs ON rs.request_id = s.request_id"
+            if specialist_id is not None:
+                where = "WHERE rs.specialist_id = :specialist_id"
+        elif specialist_id is not None:
+            where = """WHERE EXISTS (SELECT 1 FROM request_specialists rs
+                                     WHERE rs.request_id = s.request_id AND rs.specialist_id = :specialist_id)"""
+        columns = [f"{SPAN_DIMENSIONS[name]} AS {name}" for name in group_by]
+        positions = ", ".join(str(i + 1) for i in range(len(group_by)))
+        grouping = f" GROUP BY {positions}" if group_by else ""
+        # Each source is aggregated on its own, then the partial groups are merged
+        branches = [f"""
+            SELECT {", ".join(columns + ["count(*) AS spans", "sum(s.hours) AS total", "max(s.hours) AS longest"])}
+            FROM ({source}) s {joins} {where}{grouping}
+        """ for source in sources]
+        query = f"""
+            SELECT {", ".join(list(group_by) + ["sum(spans)", "sum(total)", "max(longest)"])}
+            FROM ({" UNION ALL ".join(branches)})
+        """
+        if open_spans:
+            # Materialized so the latest-change lookup runs once per request
+            query = f"WITH {open_spans} {query}"
+        if group_by:
+            query += f" GROUP BY {positions} ORDER BY {positions}"
+        rows = conn.execute(query, params).fetchall()
+
+        labels = {}
+        if "status" in group_by:
+            labels["status"] = dict(conn.execute("SELECT id, name FROM statuses").fetchall())
+        if "specialist" in group_by:
+            ids = sorted({row[group_by.index("specialist")] for row in rows})
+            labels["specialist"] = dict(conn.execute(
+                f"SELECT id, full_name FROM users WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()) if ids else {}
+
+    results = []
+    for row in rows:
+        count, total, longest = row[len(group_by):]
+        if not count:
+            continue  # total row over an empty selection
+        item = {}
+        for name, value in zip(group_by, row):
+            if name in labels:
+                item[f"{name}_id"] = value
+                item[name] = labels[name].get(value)
+            else:
+                item[name] = value
+        item.update({
+            "span_count": count,
+            "total_hours": round(total, 2),
+            "average_hours": round(total / count, 2),
+            "max_hours": round(longest, 2),
+        })
+        results.append(item)
+    return results
+
+def backfill_status_history(db_name=None):
+    """Adds initial history rows for requests that have none (e.g. after a bulk import)."""
+    def work(conn):
+        for statement in STATUS_HISTORY_BACKFILL:
+            conn.execute(statement)
+    run_in_transaction(work, db_name)
+
+def rebuild_statistics(db_name=None):
+    """Recomputes the materialized statistics from scratch (e.g. after a bulk import)."""
+    def work(conn):
+        for statement in STATISTICS_REBUILD:
+            conn.execute(statement)
+    run_in_transaction(work, db_name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair request statistics")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the materialized statistics")
+    parser.add_argument("--db", default=None, help="database file (default: repair_system.db)")
+    parser.add_argument("--group-by", default="", help=f"comma-separated dimensions: {', '.join(DIMENSIONS)}")
+    parser.add_argument("--from", dest="date_from", default=None, help="completed on or after (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", default=None, help="completed before (YYYY-MM-DD)")
+    parser.add_argument("--equipment-type", default=None)
+    parser.add_argument("--specialist-id", type=int, default=None)
+    parser.add_argument("--client-id", type=int, default=None)
+    parser.add_argument("--durations", action="store_true", help="print the repair time distribution report")
+    parser.add_argument("--time-in-status", default=None, metavar="DIMENSIONS",
+                        help=f"print time spent per status, grouped by: {', '.join(SPAN_DIMENSIONS)}")
+    args = parser.parse_args()
+    if args.db:
+        import database
+        database.DB_NAME = args.db
+    if args.rebuild:
+        rebuild_statistics()
+        print("Statistics rebuilt.")
+    if args.durations:
+        print(duration_report(args.date_from, args.date_to, args.equipment_type))
+    elif args.time_in_status:
+        group_by = [name.strip() for name in args.time_in_status.split(",") if name.strip()]
+        for row in time_in_status(group_by, specialist_id=args.specialist_id,
+                                  date_from=args.date_from, date_to=args.date_to):
+            print(row)
+    elif args.group_by or args.date_from or args.date_to or args.equipment_type or args.specialist_id or args.client_id:
+        group_by = [name.strip() for name in args.group_by.split(",") if name.strip()]
+        for row in aggregate_statistics(args.date_from, args.date_to, args.equipment_type,
+                                        args.specialist_id, args.client_id, group_by):
+            print(row)
+    else:
+        print(calculate_statistics())
@@ -1,5 +1,5 @@
 import sqlite3
-from database import DB_NAME
+from database import DB_NAME, SCHEMA_VERSION, apply_migrations
 
 def migrate():
     conn = sqlite3.connect(DB_NAME)
@@ -18,6 +18,13 @@ def migrate():
         else:
             print("Column help_needed already exists.")
             
+        applied = apply_migrations(conn)
+        conn.commit()
+        if applied:
+            print(f"Applied schema migrations: {applied}")
+        else:
+            print(f"Schema is up to date (version {SCHEMA_VERSION}).")
+            
     except Exception as e:
         print(f"Migration failed: {e}")
     finally:
@@ -54,8 +54,7 @@ class TestAssignmentRequirements(unittest.TestCase):
         self.assertIsNotNone(req_num)
         
         # Verify created
-        requests = RequestService.get_requests("Operator", operator.id)
-        req = next(r for r in requests if r.request_number == req_num)
+        req = next(r for r in RequestService.iter_requests("Operator", operator.id) if r.request_number == req_num)
         self.assertEqual(req.status_name, "New")
         print("✓ Request Creation Verified")
         
@@ -68,7 +67,7 @@ class TestAssignmentRequirements(unittest.TestCase):
         
         # Verify Status Change (New -> Registered/Assigned)
         # Note: Logic in assign_specialist updates status to Registered
-        req = RequestService.get_requests("Manager", manager.id, None)[0] # Reload
+        req = RequestService.get_requests_page("Manager", manager.id, None, page_size=1).items[0] # Reload
         # In service: "UPDATE requests SET status_id = ? WHERE id = ? AND status_id = ?" (STATUS_REGISTERED)
         # However, getting exact request might be tricky if multiple, assuming first/last created
         
@@ -92,7 +91,7 @@ class TestAssignmentRequirements(unittest.TestCase):
         RequestService.extend_deadline(req.id, 5)
         
         # Verify
-        req_updated = RequestService.get_requests("Quality Manager", qm.id, None)[0]
+        req_updated = RequestService.get_requests_page("Quality Manager", qm.id, None, page_size=1).items[0]
         # Compare dates roughly (parsing string)
         d1 = datetime.strptime(old_deadline, "%Y-%m-%d %H:%M:%S")
         d2 = datetime.strptime(req_updated.deadline_date, "%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,131 @@
+"""
+Scrollable list that only keeps widgets for the rows on screen.
+
+Rows have a fixed height, so the position of row i is i * row_height and the
+scroll region is computed instead of measured. The list owns a small pool of
+row widgets (the visible rows plus `overscan` on each side); scrolling moves
+pooled widgets to the newly visible rows and refills them with bind_row().
+
+    rows = VirtualList(parent, create_row=lambda master: Card(master),
+                       bind_row=lambda card, item: card.show(item), row_height=170)
+    rows.set_items(requests)
+    rows.append_items(more_requests)
+"""
+import tkinter as tk
+from tkinter import ttk
+
+OVERSCAN = 2      # Rows rendered above and below the viewport
+SCROLL_STEP = 20  # Pixels per scroll unit (mouse wheel notch, arrow click)
+
+def visible_range(offset, viewport_height, count, row_height, overscan=OVERSCAN):
+    """[first, last) indexes of the rows to render for a viewport whose top is
+    `offset` pixels into the list."""
+    if count <= 0 or row_height <= 0:
+        return 0, 0
+    offset = max(offset, 0)
+    first = max(0, int(offset // row_height) - overscan)
+    last = min(count, int((offset + max(viewport_height, 0)) // row_height) + 1 + overscan)
+    return first, max(first, last)
+
+class VirtualList(ttk.Frame):
+    def __init__(self, parent, create_row, bind_row, row_height, gap=0, overscan=OVERSCAN,
+                 on_near_end=None, background=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.row_height = row_height
+        self.gap = gap
+        self.overscan = overscan
+        self.on_near_end = on_near_end
+        self.items = []
+        self._bound = {}  # item index -> (widget, canvas window id)
+        self._free = []   # hidden (widget, canvas window id) ready for reuse
+
+        canvas_options = {"highlightthickness": 0, "yscrollincrement": SCROLL_STEP}
+        if background:
+            canvas_options["bg"] = background
+        self.canvas = tk.Canvas(self, **canvas_options)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_view_changed)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.bind("<Configure>", self._on_configure)
+
+        self.empty_label = None
+
+    def set_items(self, items, keep_position=False):
+        """Replaces the rows; the view goes back to the top unless keep_position."""
+        self.items = list(items)
+        for index in list(self._bound):
+            self._release(index)
+        self._update_scrollregion()
+        if not keep_position:
+            self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def append_items(self, items):
+        self.items.extend(items)
+        self._update_scrollregion()
+        self.refresh()
+
+    def show_empty(self, text, **label_options):
+        """Text shown in place of the rows while the list is empty."""
+        if self.empty_label is None:
+            self.empty_label = ttk.Label(self.canvas, **label_options)
+        self.empty_label.configure(text=text)
+        self.refresh()
+
+    def scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def widget_count(self):
+        """Row widgets alive right now (bound and pooled)."""
+        return len(self._bound) + len(self._free)
+
+    def refresh(self):
+        """Binds pooled widgets to the rows in (or near) the viewport."""
+        if self.empty_label is not None:
+            if self.items:
+                self.empty_label.place_forget()
+            else:
+                self.empty_label.place(relx=0.5, y=20, anchor="n")
+
+        offset = self.canvas.canvasy(0)
+        first, last = visible_range(offset, self.canvas.winfo_height(), len(self.items),
+                                    self.row_height, self.overscan)
+        for index in [i for i in self._bound if not first <= i < last]:
+            self._release(index)
+        width = self.canvas.winfo_width()
+        for index in range(first, last):
+            if index in self._bound:
+                continue
+            if self._free:
+                widget, window = self._free.pop()
+            else:
+                widget = self.create_row(self.canvas)
+                window = self.canvas.create_window(0, 0, window=widget, anchor="nw")
+            self.bind_row(widget, self.items[index])
+            self.canvas.coords(window, 0, index * self.row_height)
+            self.canvas.itemconfigure(window, width=width, height=self.row_height - self.gap)
+            self._bound[index] = (widget, window)
+
+        if self.on_near_end and self.items and last >= len(self.items):
+            self.on_near_end()
+
+    def _release(self, index):
+        widget, window = self._bound.pop(index)
+        # Parked above the scroll region, where the view never reaches
+        self.canvas.coords(window, 0, -2 * self.row_height)
+        self._free.append((widget, window))
+
+    def _update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, 0, len(self.items) * self.row_height))
+
+    def _on_view_changed(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def _on_configure(self, event):
+        for _, window in list(self._bound.values()) + self._free:
+            self.canvas.itemconfigure(window, width=event.width)
+        self.refresh()